@@ -51,7 +51,11 @@ from bpy.props import EnumProperty, StringProperty, BoolProperty, IntProperty, F
 
 import contour_utilities
 import general_utilities
-from contour_classes import ContourCutLine, ExistingVertList, CutLineManipulatorWidget, ContourCutSeries, ContourStatePreserver
+from contour_classes import ContourCutLine, ExistingVertList, CutLineManipulatorWidget, ContourCutSeries, ContourStatePreserver, LiveStroke, set_cut_source
+from contour_performance import FrameBudgetGovernor, ContourJobScheduler, EventCoalescer
+from contour_undo import UndoStore, restore_paths
+from contour_journal import SessionJournal, journal_filepath, read_journal, rebuild_paths
+from contour_bvh import bvh_from_bmesh
 
 from lib import common_drawing
 
@@ -61,13 +65,16 @@ AL = general_utilities.AddonLocator()
 # A place to store stokes for later
 global contour_cache
 contour_cache = {}
-contour_undo_cache = []
+contour_undo_cache = UndoStore()
 
 # Store any temporary triangulated objects
 # Store the bmesh to prevent recalcing bmesh each time :-)
 global contour_mesh_cache
 contour_mesh_cache = {}
 
+# Scheduler key of the job releasing high res loops, see release_high_res
+release_key = (None, 'RELEASE_HIGH_RES')
+
 
 def object_validation(ob):
     me = ob.data
@@ -94,6 +101,83 @@ def write_mesh_cache(orig_ob, tmp_ob, bme):
     contour_mesh_cache['valid'] = object_validation(orig_ob)
     contour_mesh_cache['bme'] = bme
     contour_mesh_cache['tmp'] = tmp_ob
+    write_bvh_cache(bme)
+
+
+def write_bvh_cache(bme):
+    '''
+    Triangle BVH of the cached bmesh for batched ray casts and
+    closest point queries.  It is plain numpy arrays, so unlike the
+    bmesh and tmp object it needs no cleaning up
+    '''
+    start = time.time()
+    bvh = bvh_from_bmesh(bme)
+    contour_mesh_cache['bvh'] = bvh
+    print('built bvh of %i triangles (%0.1f MB) in %f' % (len(bvh), bvh.nbytes() / 2**20, time.time() - start))
+
+
+def write_proxy_cache(context, form, bme, ratio):
+    '''
+    A decimated copy of the form, cut instead of the full
+    resolution mesh while a cut is being dragged around
+    '''
+    settings = context.user_preferences.addons[AL.FolderName].preferences
+    if settings.debug > 1:
+        print('writing proxy cache')
+    global contour_mesh_cache
+    clear_proxy_cache()
+
+    me = bpy.data.meshes.new('tmp_recontour_proxy')
+    bme.to_mesh(me)
+
+    proxy = bpy.data.objects.new('ContourPROXY', me)
+    mod = proxy.modifiers.new('Decimate', type='DECIMATE')
+    mod.ratio = ratio
+    mod.use_collapse_triangulate = True
+
+    # Same as the tmp object, it has to be in the scene
+    # to evaluate the modifier and for ray casting
+    context.scene.objects.link(proxy)
+    context.scene.update()
+    proxy_me = proxy.to_mesh(scene=context.scene, apply_modifiers=True, settings='PREVIEW')
+    proxy.modifiers.remove(mod)
+    proxy.data = proxy_me
+    bpy.data.meshes.remove(me)
+
+    proxy.update_tag()
+    context.scene.update()
+    context.scene.objects.unlink(proxy)
+    proxy.matrix_world = form.matrix_world
+
+    proxy_bme = bmesh.new()
+    proxy_bme.from_mesh(proxy_me)
+
+    if settings.debug > 1:
+        print('proxy has %i of %i faces' % (len(proxy_bme.faces), len(bme.faces)))
+    contour_mesh_cache['proxy'] = proxy
+    contour_mesh_cache['proxy_bme'] = proxy_bme
+    contour_mesh_cache['proxy_ratio'] = ratio
+
+
+def clear_proxy_cache():
+    global contour_mesh_cache
+
+    if 'proxy_bme' in contour_mesh_cache and contour_mesh_cache['proxy_bme']:
+        contour_mesh_cache['proxy_bme'].free()
+        del contour_mesh_cache['proxy_bme']
+
+    if 'proxy' in contour_mesh_cache and contour_mesh_cache['proxy']:
+        old_obj = contour_mesh_cache['proxy']
+        old_me = old_obj.data
+        old_obj.user_clear()
+        if old_obj and old_obj.name in bpy.data.objects:
+            bpy.data.objects.remove(old_obj)
+        if old_me and old_me.name in bpy.data.meshes:
+            bpy.data.meshes.remove(old_me)
+        del contour_mesh_cache['proxy']
+
+    if 'proxy_ratio' in contour_mesh_cache:
+        del contour_mesh_cache['proxy_ratio']
 
 
 def clear_mesh_cache():
@@ -101,9 +185,14 @@ def clear_mesh_cache():
 
     global contour_mesh_cache
 
+    clear_proxy_cache()
+
     if 'valid' in contour_mesh_cache and contour_mesh_cache['valid']:
         del contour_mesh_cache['valid']
 
+    if 'bvh' in contour_mesh_cache:
+        del contour_mesh_cache['bvh']
+
     if 'bme' in contour_mesh_cache and contour_mesh_cache['bme']:
         bme_old = contour_mesh_cache['bme']
         bme_old.free()
@@ -296,6 +385,63 @@ class ContourToolsAddonPreferences(AddonPreferences):
         default=True,
         )
 
+    use_proxy_cut = BoolProperty(
+        name="Coarse Preview",
+        description="Cut a decimated copy of the form while dragging a loop, and refine against the full mesh on release",
+        default=True,
+        )
+
+    proxy_ratio = FloatProperty(
+        name="Preview Ratio",
+        description="Fraction of the faces kept in the decimated preview form",
+        default=0.2,
+        min=0.01,
+        max=1,
+        )
+
+    use_time_slicing = BoolProperty(
+        name="Time Sliced Updates",
+        description="Spread big updates (segment counts, smoothing, merging strokes) over several frames instead of freezing",
+        default=True,
+        )
+
+    use_live_stroke = BoolProperty(
+        name="Live Strokes",
+        description="Ray cast and simplify guide strokes while they are drawn, and preview where the rings will go",
+        default=True,
+        )
+
+    job_budget = IntProperty(
+        name="Update Budget (ms)",
+        description="Time spent on time sliced updates per timer tick",
+        default=40,
+        min=5,
+        max=500,
+        )
+
+    use_frame_budget = BoolProperty(
+        name="Frame Budget",
+        description="Automatically reduce overlay quality (occlusion, backbone, follow lines) when drawing and updating gets too slow",
+        default=True,
+        )
+
+    frame_budget = IntProperty(
+        name="Budget (ms)",
+        description="Time allowed per frame for drawing and updating before quality is reduced",
+        default=33,
+        min=5,
+        max=200,
+        )
+
+    high_res_policy = EnumProperty(
+        items=[('KEEP', 'Keep', 'Keep every high res loop in memory'),
+               ('ZLIB', 'Compress', 'Compress the high res loops of cuts that are not being edited'),
+               ('REGENERATE', 'Regenerate', 'Drop the high res loops of cuts that are not being edited and cut them again when needed')],
+        name="High Res Loops",
+        description="What to do with the full resolution cross section of cuts which aren't being edited",
+        default='ZLIB',
+        )
+
     # TODO  Theme this out nicely :-) 
     widget_color = FloatVectorProperty(name="Widget Color", description="Choose Widget color", min=0, max=1, default=(0,0,1), subtype="COLOR")
     widget_color2 = FloatVectorProperty(name="Widget Color", description="Choose Widget color", min=0, max=1, default=(1,0,0), subtype="COLOR")
@@ -357,6 +503,21 @@ class ContourToolsAddonPreferences(AddonPreferences):
         max=250,
         )
 
+    vertex_placement = EnumProperty(
+        items=[('FIXED', 'Fixed', 'Every ring of a series gets the same vertex count'),
+               ('ADAPTIVE', 'Adaptive', 'Each ring gets the fewest vertices, up to the series count, that follow its shape')],
+        name="Vertex Placement",
+        default='FIXED',
+        )
+
+    vertex_error = FloatProperty(
+        name="Vertex Error",
+        description="Adaptive vertex counts: how far a ring may miss its cross section, as a fraction of its size",
+        default=.01,
+        min=.001,
+        max=.2,
+        )
+
     ring_count = IntProperty(
         name="Ring Count",
         description="The Number of Segments Per Guide Stroke",
@@ -365,6 +526,21 @@ class ContourToolsAddonPreferences(AddonPreferences):
         max=100,
         )
 
+    ring_placement = EnumProperty(
+        items=[('UNIFORM', 'Uniform', 'Space the rings evenly along the guide stroke'),
+               ('ADAPTIVE', 'Adaptive', 'More rings where the stroke bends or the form changes thickness')],
+        name="Ring Placement",
+        default='UNIFORM',
+        )
+
+    ring_error = FloatProperty(
+        name="Ring Error",
+        description="Adaptive placement: how far the rings may miss the form between them, as a fraction of its radius",
+        default=.05,
+        min=.005,
+        max=.5,
+        )
+
     cyclic = BoolProperty(
         name="Cyclic",
         description="Make contour loops cyclic",
@@ -375,6 +551,11 @@ class ContourToolsAddonPreferences(AddonPreferences):
         description="Recover strokes from last session",
         default=False)
 
+    use_journal = BoolProperty(
+        name="Session Journal",
+        description="Keep a journal of the session on disk so Recover also works after a crash",
+        default=True)
+
     recover_clip = IntProperty(
         name="Recover Clip",
         description="Number of cuts to leave out, usually set to 0 or 1",
@@ -409,7 +590,7 @@ class ContourToolsAddonPreferences(AddonPreferences):
 
     cull_factor = IntProperty(
         name="Cull Factor",
-        description="Fraction of screen drawn points to throw away. Bigger = less detail",
+        description="Minimum spacing in pixels between drawn points that are kept. Bigger = less detail",
         default=4,
         min=1,
         max=10,
@@ -438,11 +619,12 @@ class ContourToolsAddonPreferences(AddonPreferences):
         max=100,
         )
 
-    undo_depth = IntProperty(
-        name="Undo Depth",
-        default=10,
-        min=0,
-        max=100,
+    undo_budget = FloatProperty(
+        name="Undo Memory",
+        description="Megabytes of undo history to keep, the oldest steps are dropped first",
+        default=32,
+        min=1,
+        max=1024,
         )
 
     
@@ -458,6 +640,22 @@ class ContourToolsAddonPreferences(AddonPreferences):
         row = layout.row()
         row.prop(self, "use_x_ray", "Enable X-Ray at Mesh Creation")
 
+        row = layout.row(align=True)
+        row.prop(self, "use_proxy_cut")
+        row.prop(self, "proxy_ratio")
+
+        row = layout.row(align=True)
+        row.prop(self, "use_time_slicing")
+        row.prop(self, "job_budget")
+
+        row = layout.row(align=True)
+        row.prop(self, "use_frame_budget")
+        row.prop(self, "frame_budget")
+
+        row = layout.row()
+        row.prop(self, "high_res_policy")
+        row.prop(self, "use_live_stroke")
+
         # Theme testing
         row = layout.row(align=True)
         row.prop(self, "theme", "Theme")
@@ -560,10 +758,16 @@ class CGCOOKIE_OT_retopo_contour_panel(bpy.types.Panel):
 
         col.operator("cgcookie.retop_contour", icon='IPO_LINEAR')
         col.prop(cgc_contour, "vertex_count")
+        col.prop(cgc_contour, "vertex_placement", text="")
+        if cgc_contour.vertex_placement == 'ADAPTIVE':
+            col.prop(cgc_contour, "vertex_error")
 
         col = layout.column()
         col.label("Guide Mode:")
         col.prop(cgc_contour, "ring_count")
+        col.prop(cgc_contour, "ring_placement", text="")
+        if cgc_contour.ring_placement == 'ADAPTIVE':
+            col.prop(cgc_contour, "ring_error")
 
         # Commenting out for now until this is further improved and made to work again ###
         # row = box.row()
@@ -578,6 +782,15 @@ class CGCOOKIE_OT_retopo_contour_panel(bpy.types.Panel):
         if cgc_contour.recover:
             row.prop(cgc_contour, "recover_clip")
 
+        row = layout.row()
+        row.prop(cgc_contour, "use_journal")
+
+        row = layout.row()
+        row.prop(cgc_contour, "undo_budget")
+
+        col = layout.column()
+        col.label("Undo: %0.1f MB in %i steps" % (contour_undo_cache.nbytes / 2**20, len(contour_undo_cache)))
+
         row = layout.row()
         row.operator("cgcookie.clear_cache", text = "Clear Cache", icon = 'CANCEL')
 
@@ -611,14 +824,15 @@ class CGCOOKIE_OT_retopo_cache_clear(bpy.types.Operator):
 def retopo_draw_callback(self, context):
 
     settings = context.user_preferences.addons[AL.FolderName].preferences
+    start = time.time()
 
     stroke_color = settings.theme_colors_active[settings.theme]
 
     if (self.post_update or self.modal_state == 'NAVIGATING') and context.space_data.use_occlude_geometry:
         for path in self.cut_paths:
-            path.update_visibility(context, self.original_form)
+            path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
             for cut_line in path.cuts:
-                cut_line.update_visibility(context, self.original_form)
+                cut_line.update_visibility(context, self.original_form, occlude=self.governor.occlude)
 
         self.post_update = False
 
@@ -642,14 +856,27 @@ def retopo_draw_callback(self, context):
         # Draw guide line
         common_drawing.draw_polyline_from_points(context, self.draw_cache, stroke_color, 2, "GL_LINE_STIPPLE")
 
+        if self.live_stroke:
+            self.live_stroke.draw(context, stroke_color)
+
     if len(self.cut_paths):
+        extras = self.governor.draw_extras
         for path in self.cut_paths:
-            path.draw(context, path=True, nodes=settings.show_nodes, rings=True, follows=True, backbone=settings.show_backbone)
+            path.draw(context, path=True, nodes=settings.show_nodes and extras, rings=True, follows=True, backbone=settings.show_backbone and extras)
+
+    # Series still being built by the scheduler
+    for path in self.scheduler.previews():
+        path.draw(context, path=False, nodes=False, rings=True, follows=False, backbone=False)
 
     if len(self.snap_circle):
         # Draw snap circle
         contour_utilities.draw_polyline_from_points(context, self.snap_circle, self.snap_color, 2, "GL_LINE_SMOOTH")
 
+    self.governor.record(start)
+    if self.governor.update(settings):
+        # Visibility needs to catch up with the new quality level
+        self.post_update = True
+
 
 class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
     '''Draw Perpendicular Strokes to Retopologize Cylindrical Forms'''
@@ -843,36 +1070,108 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                                     feature_factor=settings.feature_factor)
 
 
-        path.ray_cast_path(context, self.original_form)
+        if self.live_stroke:
+            # Most of the casting happened while drawing
+            self.live_stroke.finish(context)
+            path.take_live_stroke(self.live_stroke)
+        else:
+            path.ray_cast_path(context, self.original_form)
+
         if len(path.raw_world) == 0:
             print('NO RAW PATH')
             return None
+
         path.find_knots()
 
         if self.snap != [] and not self.force_new:
             merge_series = self.snap[0]
             merge_ring = self.snap[1]
 
-            path.snap_merge_into_other(merge_series, merge_ring, context, self.original_form, self.bme)
+            self.start_job(context, (merge_series, 'MERGE'),
+                           path.iter_snap_merge_into_other(merge_series, merge_ring, context, self.original_form, self.bme),
+                           self.finish_new_path, (context, merge_series), preview=path, desc='MERGE STROKE')
 
             return merge_series
 
-        path.smooth_path(context, ob = self.original_form)
-        path.create_cut_nodes(context)
-        path.snap_to_object(self.original_form, raw=False, world=False, cuts=True)
-        path.cuts_on_path(context, self.original_form, self.bme)
-        path.connect_cuts_to_make_mesh(self.original_form)
-        path.backbone_from_cuts(context, self.original_form, self.bme)
-        path.update_visibility(context, self.original_form)
-        if path.cuts:
-            # TODO: should this ever be empty?
-            path.cuts[-1].do_select(settings)
-        
+        path.process_stroke(context, self.original_form)
         self.cut_paths.append(path)
 
+        self.start_job(context, (path, 'NEW_PATH'),
+                       path.iter_cuts_on_path(context, self.original_form, self.bme),
+                       self.finish_new_path, (context, path, True), desc='NEW STROKE')
+
         return path
 
 
+    def finish_new_path(self, context, path, connect=False):
+        if connect:
+            path.connect_cuts_to_make_mesh(self.original_form)
+            path.backbone_from_cuts(context, self.original_form, self.bme)
+            path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
+
+        if path == self.selected_path and path.cuts:
+            # TODO: should this ever be empty?
+            self.selected = path.cuts[-1]
+            self.selected.do_select(self.settings)
+
+
+    def start_job(self, context, key, steps, on_finish=None, finish_args=(), preview=None, desc=''):
+        '''
+        hands a generator of per cut steps to the scheduler, which chips
+        away at it from the TIMER event.  key is (path, kind), a new job
+        of the same kind on the same path replaces the old one.
+        If time slicing is off, the steps just get run right here
+        '''
+        if not self.settings.use_time_slicing:
+            for step in steps:
+                pass
+            if on_finish:
+                on_finish(*finish_args)
+            return
+
+        # Different kinds of edit on the same path don't replace each other
+        if any(job.key[0] == key[0] and job.key != key for job in self.scheduler.jobs):
+            self.scheduler.finish(skip=(release_key,))
+
+        self.scheduler.submit(key, steps, on_finish=on_finish, finish_args=finish_args, preview=preview, desc=desc)
+        if not self._timer:
+            self._timer = context.window_manager.event_timer_add(0.1, context.window)
+
+
+    def apply_path_segments(self, context, path):
+        path.create_cut_nodes(context, ob = self.original_form)
+        path.snap_to_object(self.original_form, raw = False, world = False, cuts = True)
+        self.start_job(context, (path, 'PATH_SEGMENTS'),
+                       path.iter_cuts_on_path(context, self.original_form, self.bme),
+                       self.finish_path_segments, (context, path), desc='PATH SEGMENTS')
+
+
+    def apply_ring_segments(self, context, path):
+        self.start_job(context, (path, 'RING_SEGMENTS'),
+                       path.iter_resample_rings(),
+                       self.finish_ring_segments, (context, path), desc='RING SEGMENTS')
+
+
+    def finish_path_segments(self, context, path):
+        path.connect_cuts_to_make_mesh(self.original_form)
+        path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
+        path.backbone_from_cuts(context, self.original_form, self.bme)
+        #selected will hold old reference because all cuts are recreated (dumbly, it should just be the in between ones)
+        if path == self.selected_path and path.cuts:
+            self.selected = path.cuts[-1]
+
+
+    def finish_ring_segments(self, context, path):
+        path.backbone_from_cuts(context, self.original_form, self.bme)
+        path.connect_cuts_to_make_mesh(self.original_form)
+        path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
+
+
+    def finish_smoothing(self, context, path):
+        path.connect_cuts_to_make_mesh(self.original_form)
+        path.backbone_from_cuts(context, self.original_form, self.bme)
+
+
     def click_new_cut(self, context, settings, event):
 
         new_cut = ContourCutLine(event.mouse_region_x, event.mouse_region_y)
@@ -932,7 +1231,7 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                 if path.insert_new_cut(context, self.original_form, self.bme, self.selected, search=settings.search_factor):
                     # The cut belongs to the series now
                     path.connect_cuts_to_make_mesh(self.original_form)
-                    path.update_visibility(context, self.original_form)
+                    path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
                     path.seg_lock = True
                     path.do_select(settings)
                     path.unhighlight(settings)
@@ -955,7 +1254,7 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
         path.segments = 1
         path.ring_segments = len(self.selected.verts_simple)
         path.connect_cuts_to_make_mesh(self.original_form)
-        path.update_visibility(context, self.original_form)
+        path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
 
         for other_path in self.cut_paths:
             other_path.deselect(settings)
@@ -1015,33 +1314,82 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
         return {'FINISHED'}
 
 
-    def widget_transform(self, context, settings, event):
+    def widget_transform(self, context, mouse_x, mouse_y, shift):
+        # The widget may have been let go before the coalescer caught up
+        if not self.cut_line_widget:
+            return
 
-        self.cut_line_widget.user_interaction(context, event.mouse_region_x, event.mouse_region_y, shift=event.shift)
+        self.cut_line_widget.user_interaction(context, mouse_x, mouse_y, shift=shift)
+        self.recut_selected(context, coarse=True)
 
-        self.selected.cut_object(context, self.original_form, self.bme)
-        self.selected.simplify_cross(self.selected_path.ring_segments)
+        self.temporary_message_start(context, 'WIDGET_TRANSFORM: ' + str(self.cut_line_widget.transform_mode))    
+
+
+    def hotkey_transform(self, context, mouse_x, mouse_y):
+        if not self.cut_line_widget:
+            return
+
+        self.cut_line_widget.user_interaction(context, mouse_x, mouse_y)
+        self.recut_selected(context, coarse=True)
+
+
+    def recut_selected(self, context, coarse=False):
+        '''
+        re-slices the selected loop after its plane moved
+        coarse:  slice the decimated proxy (if there is one) and skip the
+        fine alignment, needs_refine will remind us to do it properly
+        once the mouse stops or the transform ends
+        '''
+        if coarse and self.proxy_form:
+            self.selected.cut_object_proxy(context, self.proxy_form, self.proxy_bme)
+            self.needs_refine = True
+            self.last_move_time = time.time()
+        else:
+            self.selected.cut_object(context, self.original_form, self.bme, warm=True)
+            self.needs_refine = False
+
+        self.selected_path.resample_cut(self.selected)
         self.selected.update_com()
-        self.selected_path.align_cut(self.selected, mode='BETWEEN', fine_grain=True)
+        self.selected_path.align_cut(self.selected, mode='BETWEEN', fine_grain=not self.needs_refine)
 
-        self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-        self.selected_path.update_visibility(context, self.original_form)
+        self.update_path_preview(context, self.selected_path)
 
-        self.temporary_message_start(context, 'WIDGET_TRANSFORM: ' + str(self.cut_line_widget.transform_mode))    
+
+    def update_path_preview(self, context, path):
+        '''
+        reconnects the path and updates its visibility, or puts
+        it off until the transform is over if the frame budget
+        governor says we can't afford it
+        '''
+        if self.governor.defer_follows and self.modal_state in {'WIDGET_TRANSFORM', 'HOTKEY_TRANSFORM'}:
+            if path not in self.deferred_paths:
+                self.deferred_paths.append(path)
+            return
+
+        path.connect_cuts_to_make_mesh(self.original_form)
+        path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
+
+
+    def flush_deferred_paths(self, context):
+        for path in self.deferred_paths:
+            if path in self.cut_paths:
+                path.connect_cuts_to_make_mesh(self.original_form)
+                path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
+        self.deferred_paths = []
 
 
     def guide_arrow_shift(self, context, event):
         if event.type == 'LEFT_ARROW':         
             for cut in self.selected_path.cuts:
                 cut.shift += 0.05
-                cut.simplify_cross(self.selected_path.ring_segments)
+                self.selected_path.resample_cut(cut, refit=False)
         else:
             for cut in self.selected_path.cuts:
                 cut.shift += -0.05
-                cut.simplify_cross(self.selected_path.ring_segments)
+                self.selected_path.resample_cut(cut, refit=False)
 
         self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-        self.selected_path.update_visibility(context, self.original_form)  
+        self.selected_path.update_visibility(context, self.original_form, occlude=self.governor.occlude)  
 
 
     def loop_arrow_shift(self, context, event):    
@@ -1051,10 +1399,10 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
         else:
             self.selected.shift += -0.05
 
-        self.selected.simplify_cross(self.selected_path.ring_segments)
+        self.selected_path.resample_cut(self.selected, refit=False)
         self.selected_path.connect_cuts_to_make_mesh(self.original_form)
         self.selected_path.update_backbone(context, self.original_form, self.bme, self.selected, insert=False)
-        self.selected_path.update_visibility(context, self.original_form)
+        self.selected_path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
 
         self.temporary_message_start(context, self.mode +': Shift ' + str(self.selected.shift))
 
@@ -1072,11 +1420,11 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
             act = 'BACKWARD'
  
         self.selected_path.align_cut(self.selected, mode=act, fine_grain=True)
-        self.selected.simplify_cross(self.selected_path.ring_segments)
+        self.selected_path.resample_cut(self.selected, refit=False)
 
         self.selected_path.connect_cuts_to_make_mesh(self.original_form)
         self.selected_path.update_backbone(context, self.original_form, self.bme, self.selected, insert=False)
-        self.selected_path.update_visibility(context, self.original_form)
+        self.selected_path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
         self.temporary_message_start(context, 'Align Loop: %s' % act)
 
 
@@ -1113,29 +1461,158 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
         if not self._timer:
             self._timer = context.window_manager.event_timer_add(0.1, context.window)
         
-        context.area.header_text_set(text = message)    
+        context.area.header_text_set(text = message + self.governor.describe())
+
+
+    def header_message(self):
+        if self.mode == 'GUIDE':
+            message = self.guide_msg
+        else:
+            message = self.loop_msg
+
+        full, held = self.high_res_memory
+        if full:
+            message += '  |  HIGH RES: %0.1f of %0.1f MB' % (held / 2**20, full / 2**20)
+
+        return message + self.governor.describe()
 
 
     def modal(self, context, event):
+        # Everything the modal does gets charged to the frame budget
+        start = time.time()
+        ret = self.handle_event(context, event)
+        self.governor.record(start)
+
+        if self.coalescer.busy() and not self._timer and not ret & {'FINISHED', 'CANCELLED'}:
+            self._timer = context.window_manager.event_timer_add(0.1, context.window)
+
+        idle = event.value in {'PRESS', 'RELEASE'} and self.modal_state == 'WAITING' and not self.editing()
+
+        # Once per idle period, after an edit or a change of selection
+        if self.selected is not self.release_selected:
+            self.release_due = True
+        if (idle and self.release_due and self.settings.high_res_policy != 'KEEP' and
+            not ret & {'FINISHED', 'CANCELLED'}):
+            self.release_high_res(context)
+
+        # Journal every finished edit, the writing happens off in its own thread
+        if self.journal:
+            if {'FINISHED'} == ret or idle:
+                self.journal.record_paths(self.cut_paths)
+
+            if ret & {'FINISHED', 'CANCELLED'}:
+                self.journal.close()
+
+        return ret
+
+
+    def release_high_res(self, context):
+        '''
+        compress or drop the high res loops of every cut except the
+        one being edited.  REGENERATE re-slices each cut to check it
+        comes back the same, so it's done a cut per step from the
+        TIMER event like any other recompute.  A release job that
+        is still going is replaced, the cuts may have changed since
+        '''
+        self.release_due = False
+        self.release_selected = self.selected
+
+        cuts = [cut for path in self.cut_paths for cut in path.cuts
+                if cut != self.selected and not cut.high_res_released()]
+        if cuts:
+            self.start_job(context, release_key, self.iter_release_high_res(cuts),
+                           on_finish=self.count_high_res, desc='HIGH RES LOOPS')
+        else:
+            self.count_high_res()
+
+
+    def iter_release_high_res(self, cuts):
+        for i, cut in enumerate(cuts):
+            # it may have been picked up again since it was queued
+            if cut != self.selected:
+                cut.release_verts(self.settings.high_res_policy)
+            yield (i + 1, len(cuts))
+
+
+    def count_high_res(self):
+        full = held = 0
+        for path in self.cut_paths:
+            for cut in path.cuts:
+                f, h = cut.high_res_nbytes()
+                full += f
+                held += h
+
+        if self.settings.debug > 1 and (full, held) != self.high_res_memory:
+            print('high res loops: %i bytes held of %i' % (held, full))
+        self.high_res_memory = (full, held)
+
+
+    def editing(self):
+        '''
+        True while a recompute job is running, releasing
+        high res loops doesn't count
+        '''
+        return any(job.key != release_key for job in self.scheduler.jobs)
+
+
+    def handle_event(self, context, event):
         context.area.tag_redraw()
         settings = context.user_preferences.addons[AL.FolderName].preferences
 
+        # Catch up on the latest transform or segment change, about once
+        # a frame.  The TIMER keeps ticking while anything is pending so
+        # the last of a burst still lands when the input stops
+        if self.coalescer.busy() and (event.type == 'TIMER' or self.coalescer.due(self.governor.budget)):
+            self.coalescer.flush(context)
+
+        if self.governor.changed:
+            self.governor.changed = False
+            self.temporary_message_start(context, self.mode + ': FRAME BUDGET')
+
+        if self.deferred_paths and not (self.governor.defer_follows and
+                                        self.modal_state in {'WIDGET_TRANSFORM', 'HOTKEY_TRANSFORM'}):
+            self.flush_deferred_paths(context)
+
         if event.type == 'Z' and event.ctrl and event.value == 'PRESS':
             self.temporary_message_start(context, "Undo Action")
             self.undo_action()
 
+        else:
+            # Anything other than more of the same input sees the latest state
+            if (self.coalescer.busy() and
+                event.type not in {'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'NUMPAD_PLUS', 'NUMPAD_MINUS'}):
+                self.coalescer.flush(context)
+
+            # Running jobs have to finish before anything else touches the cuts,
+            # except for segment changes which will just replace them.  Releasing
+            # high res loops carries on, a released loop comes back when it's read
+            if (self.editing() and event.value == 'PRESS' and
+                event.type not in {'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'NUMPAD_PLUS', 'NUMPAD_MINUS'}):
+                self.scheduler.finish(skip=(release_key,))
+
         # Check messages
         if event.type == 'TIMER':
             now = time.time()
-            if now - self.msg_start_time > self.msg_duration:
+
+            # Chip away at any time sliced updates
+            if self.scheduler.busy():
+                spent = self.scheduler.run(settings.job_budget / 1000)
+                self.governor.discount(spent)
+                self.msg_start_time = now
+                context.area.header_text_set(text=self.scheduler.describe() + self.governor.describe())
+
+            # The mouse stopped moving, replace the coarse preview with the real cut
+            if self.needs_refine and now - self.last_move_time > self.refine_delay:
+                self.recut_selected(context)
+                if self.journal:
+                    self.journal.mark_dirty()
+                self.release_due = True
+            if now - self.msg_start_time > self.msg_duration and not self.coalescer.busy():
                 if self._timer:
                     context.window_manager.event_timer_remove(self._timer)
                     self._timer = None
 
-                if self.mode == 'GUIDE':
-                    context.area.header_text_set(text=self.guide_msg)
-                else:
-                    context.area.header_text_set(text=self.loop_msg)
+                context.area.header_text_set(text=self.header_message())
 
         if self.modal_state == 'NAVIGATING':
 
@@ -1170,6 +1647,7 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
 
                     context.area.header_text_set()
                     contour_utilities.callback_cleanup(self,context)
+                    self.scheduler.cancel_all()
                     if self._timer:
                         context.window_manager.event_timer_remove(self._timer)
 
@@ -1187,7 +1665,7 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                         context.window_manager.event_timer_remove(self._timer)
                         self._timer = None
 
-                    context.area.header_text_set(text=self.guide_msg)
+                    context.area.header_text_set(text=self.header_message())
 
                 elif event.type == 'N' and event.value == 'PRESS':
                     self.force_new = self.force_new != True
@@ -1321,7 +1799,7 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                         if len(self.selected_path.cuts) > 1 or (len(self.selected_path.cuts) == 1 and self.selected_path.existing_head):
                             self.selected_path.remove_cut(context, self.original_form, self.bme, self.selected)
                             self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                            self.selected_path.update_visibility(context, self.original_form)
+                            self.selected_path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
                             self.selected_path.backbone_from_cuts(context, self.original_form, self.bme)
 
                         else:
@@ -1365,11 +1843,8 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
 
                                 print(new_shift - new_bulk_shift - new_fine_shift)
                                 cut.shift = new_shift
-                                cut.simplify_cross(self.selected_path.ring_segments)
 
-                            self.selected_path.backbone_from_cuts(context, self.original_form, self.bme)    
-                            self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                            self.selected_path.update_visibility(context, self.original_form)
+                            self.coalescer.push((self.selected_path, 'RING_SEGMENTS'), self.apply_ring_segments, self.selected_path)
 
                             self.temporary_message_start(context, self.mode +': RING SEGMENTS %i' %self.selected_path.ring_segments)
                             self.msg_start_time = time.time()
@@ -1429,15 +1904,8 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                     message  = self.mode + ": " + action + ": X: " +  x + '  Y:  ' +  y
                     self.temporary_message_start(context, message)
 
-                    # Widget.user_interaction
-                    self.cut_line_widget.user_interaction(context, event.mouse_region_x,event.mouse_region_y)
-                    self.selected.cut_object(context, self.original_form, self.bme)
-                    self.selected.simplify_cross(self.selected_path.ring_segments)
-                    self.selected.update_com()
-                    self.selected_path.align_cut(self.selected, mode='BETWEEN', fine_grain=True)
-
-                    self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                    self.selected_path.update_visibility(context, self.original_form)
+                    # Only the latest position matters, recompute at the next redraw
+                    self.coalescer.push('TRANSFORM', self.hotkey_transform, event.mouse_region_x, event.mouse_region_y)
                     return {'RUNNING_MODAL'}
 
 
@@ -1446,6 +1914,8 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                     event.value == 'PRESS'):
                     #confirm transform
                     #recut, align, visibility?, and update the segment
+                    if self.needs_refine:
+                        self.recut_selected(context)
                     self.selected_path.update_backbone(context, self.original_form, self.bme, self.selected, insert=False)
                     self.modal_state = 'WAITING'
                     return {'RUNNING_MODAL'}
@@ -1454,12 +1924,13 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                     event.value == 'PRESS'):
                     self.cut_line_widget.cancel_transform()
                     self.selected.cut_object(context, self.original_form, self.bme)
-                    self.selected.simplify_cross(self.selected_path.ring_segments)
+                    self.needs_refine = False
+                    self.selected_path.resample_cut(self.selected)
                     self.selected_path.align_cut(self.selected, mode='BETWEEN', fine_grain=True)
                     self.selected.update_com()
 
                     self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                    self.selected_path.update_visibility(context, self.original_form)
+                    self.selected_path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
                     self.modal_state = 'WAITING'
                     return {'RUNNING_MODAL'}
             
@@ -1472,7 +1943,8 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                     else:
                         action = 'WIDGET'
 
-                    self.widget_transform(context, settings, event)
+                    # Only the latest position matters, recompute at the next redraw
+                    self.coalescer.push('TRANSFORM', self.widget_transform, event.mouse_region_x, event.mouse_region_y, event.shift)
 
                     return {'RUNNING_MODAL'}
 
@@ -1480,6 +1952,8 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                     #destroy the widget
                     self.cut_line_widget = None
                     self.modal_state = 'WAITING'
+                    if self.needs_refine:
+                        self.recut_selected(context)
                     self.selected_path.update_backbone(context, self.original_form, self.bme, self.selected, insert=False)
 
                     return {'RUNNING_MODAL'}
@@ -1487,11 +1961,12 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                 elif  event.type in {'RIGHTMOUSE', 'ESC'} and event.value == 'PRESS' and self.hot_key:
                     self.cut_line_widget.cancel_transform()
                     self.selected.cut_object(context, self.original_form, self.bme)
-                    self.selected.simplify_cross(self.selected_path.ring_segments)
+                    self.needs_refine = False
+                    self.selected_path.resample_cut(self.selected)
                     self.selected.update_com()
 
                     self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                    self.selected_path.update_visibility(context, self.original_form)
+                    self.selected_path.update_visibility(context, self.original_form, occlude=self.governor.occlude)
 
                 return {'RUNNING_MODAL'}
 
@@ -1523,6 +1998,7 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
 
                     context.area.header_text_set()
                     contour_utilities.callback_cleanup(self,context)
+                    self.scheduler.cancel_all()
                     if self._timer:
                         context.window_manager.event_timer_remove(self._timer)
 
@@ -1560,7 +2036,7 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                         context.window_manager.event_timer_remove(self._timer)
                         self._timer = None
 
-                    context.area.header_text_set(text = self.loop_msg)
+                    context.area.header_text_set(text=self.header_message())
                     return {'RUNNING_MODAL'}
 
                 elif event.type == 'C' and event.value == 'PRESS':
@@ -1594,6 +2070,9 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                     else:
                         self.create_undo_snapshot('DRAW_PATH')
                         self.modal_state = 'DRAWING'
+                        if settings.use_live_stroke:
+                            self.live_stroke = LiveStroke(context, self.original_form, settings.ring_count,
+                                                          settings.cull_factor, settings.feature_factor)
                         self.temporary_message_start(context, 'DRAWING')
 
                     return {'RUNNING_MODAL'}    
@@ -1636,14 +2115,8 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                                 self.selected_path.segments -= 1
 
                         if not self.selected_path.seg_lock:
-                            self.selected_path.create_cut_nodes(context)
-                            self.selected_path.snap_to_object(self.original_form, raw = False, world = False, cuts = True)
-                            self.selected_path.cuts_on_path(context, self.original_form, self.bme)
-                            self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                            self.selected_path.update_visibility(context, self.original_form)
-                            self.selected_path.backbone_from_cuts(context, self.original_form, self.bme)
-                            #selected will hold old reference because all cuts are recreated (dumbly, it should just be the in between ones)
-                            self.selected = self.selected_path.cuts[-1]
+                            self.selected = None
+                            self.coalescer.push((self.selected_path, 'PATH_SEGMENTS'), self.apply_path_segments, self.selected_path)
                             self.temporary_message_start(context, 'PATH SEGMENTS: %i' % self.selected_path.segments)
 
                         else:
@@ -1655,25 +2128,25 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                         if event.shift:
                             self.create_undo_snapshot('SMOOTH')
                             #path.smooth_normals
-                            self.selected_path.average_normals(context, self.original_form, self.bme)
-                            self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                            self.selected_path.backbone_from_cuts(context, self.original_form, self.bme)
+                            self.start_job(context, (self.selected_path, 'SMOOTH'),
+                                           self.selected_path.iter_average_normals(context, self.original_form, self.bme),
+                                           self.finish_smoothing, (context, self.selected_path), desc='SMOOTH')
                             self.temporary_message_start(context, 'Smooth normals based on drawn path')
 
                         elif event.ctrl:
                             self.create_undo_snapshot('SMOOTH')
                             #smooth CoM path
                             self.temporary_message_start(context, 'Smooth normals based on CoM path')
-                            self.selected_path.smooth_normals_com(context, self.original_form, self.bme, iterations = 2)
-                            self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                            self.selected_path.backbone_from_cuts(context, self.original_form, self.bme)
+                            self.start_job(context, (self.selected_path, 'SMOOTH'),
+                                           self.selected_path.iter_smooth_normals_com(context, self.original_form, self.bme, iterations = 2),
+                                           self.finish_smoothing, (context, self.selected_path), desc='SMOOTH')
                         elif event.alt:
                             self.create_undo_snapshot('SMOOTH')
                             #path.interpolate_endpoints
                             self.temporary_message_start(context, 'Smoothly interpolate normals between the endpoints')
-                            self.selected_path.interpolate_endpoints(context, self.original_form, self.bme)
-                            self.selected_path.connect_cuts_to_make_mesh(self.original_form)
-                            self.selected_path.backbone_from_cuts(context, self.original_form, self.bme)
+                            self.start_job(context, (self.selected_path, 'SMOOTH'),
+                                           self.selected_path.iter_interpolate_endpoints(context, self.original_form, self.bme),
+                                           self.finish_smoothing, (context, self.selected_path), desc='SMOOTH')
 
                         else:
                             half = math.floor(len(self.selected_path.cuts)/2)
@@ -1696,6 +2169,10 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                     # Record screen drawing
                     self.draw_cache.append((event.mouse_region_x,event.mouse_region_y))   
 
+                    if self.live_stroke:
+                        self.live_stroke.add_point((event.mouse_region_x,event.mouse_region_y))
+                        self.coalescer.push('LIVE_STROKE', self.live_stroke.update)
+
                     return {'RUNNING_MODAL'}
 
                 if event.type == 'LEFTMOUSE' and event.value == 'RELEASE':
@@ -1718,6 +2195,7 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
                         self.force_new = False
 
                     self.draw_cache = []
+                    self.live_stroke = None
 
                     self.modal_state = 'WAITING'
                     return{'RUNNING_MODAL'}
@@ -1730,37 +2208,49 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
         saves data and operator state snapshot
         for undoing
 
-        TODO:  perhaps pop/append are not fastest way
-        deque?
-        prepare a list and keep track of which entity to
-        replace?
+        Rings and series which haven't changed since the last
+        snapshot are shared with it instead of copied again.
+        The oldest snapshots are dropped once the history
+        goes over the undo memory budget.
         '''
 
-        repeated_actions = {'LOOP_SHIFT', 'PATH_SHIFT', 'PATH_SEGMENTS', 'LOOP_SEGMENTS'}
+        # Whatever comes next changes the series, the journal has to look again
+        # and the high res loops have to be released again once we're idle
+        if self.journal:
+            self.journal.mark_dirty()
+        self.release_due = True
+
+        repeated_actions = {'LOOP_SHIFT', 'PATH_SHIFT', 'PATH_SEGMENTS', 'LOOP_SEGMENTS', 'RING_SEGMENTS'}
 
         if action in repeated_actions:
-            if action == contour_undo_cache[-1][2]:
+            if action == contour_undo_cache.last_action():
                 print('repeatable...dont take snapshot')
                 return
 
         print('undo: ' + action)    
-        cut_data = copy.deepcopy(self.cut_paths)
         # Perhaps I don't even need to copy this?
         state = copy.deepcopy(ContourStatePreserver(self))
-        contour_undo_cache.append((cut_data, state, action))
-
-        if len(contour_undo_cache) > self.settings.undo_depth:
-            contour_undo_cache.pop(0)
+        contour_undo_cache.push(self.cut_paths, state, action, self.settings.undo_budget * 2**20)
             
 
     def undo_action(self):
 
+        # Whatever is still being computed belongs to the state we are leaving
+        self.coalescer.discard()
+        self.scheduler.cancel_all()
+
         if len(contour_undo_cache) > 0:
             cut_data, op_state, action = contour_undo_cache.pop()
 
-            self.cut_paths = cut_data
+            self.cut_paths = restore_paths(cut_data)
             op_state.push_state(self)
 
+            if self.journal:
+                self.journal.mark_dirty()
+
+        # the release job was cancelled with everything else
+        self.release_due = True
+
 
     def invoke(self, context, event):
         # HINT you are in contours code
@@ -1782,10 +2272,21 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
         self.cut_paths = []
         # A list to store screen coords when drawing
         self.draw_cache = []
+        # Casts and simplifies the stroke being drawn as it comes in
+        self.live_stroke = None
 
         # TODO Settings harmony CODE REVIEW
         self.settings = settings
 
+        # Watches draw and update times, and trades quality for speed
+        self.governor = FrameBudgetGovernor()
+        # Paths waiting on a follow line rebuild the governor put off
+        self.deferred_paths = []
+        # Time sliced recomputation driven by the TIMER event
+        self.scheduler = ContourJobScheduler()
+        # Latest pending transform/segment updates, run once per redraw
+        self.coalescer = EventCoalescer()
+
         # Default verts in a loop (spans)
         self.segments = settings.vertex_count
         # Default number of loops in a segment
@@ -1824,18 +2325,19 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
             self.existing_loops = []
             if len(ed_inds):
                 vert_loops = contour_utilities.edge_loops_from_bmedges(self.dest_bme, ed_inds)
-
-                if len(vert_loops) > 1:
-                    self.report({'WARNING'}, 'Only one edge loop will be used for extension')
                 print('there are %i edge loops selected' % len(vert_loops))
 
-                # For loop in vert_loops:
-                # Until multi loops are supported, do this    
-                loop = vert_loops[0]
-                if loop[-1] != loop[0] and len(list(set(loop))) != len(loop):
-                    self.report({'WARNING'},'Edge loop selection has extra parts!  Excluding this loop')
+                # Chains only share verts where the selection branches
+                vert_count = {}
+                for loop in vert_loops:
+                    for i in set(loop):
+                        vert_count[i] = vert_count.get(i, 0) + 1
+
+                for loop in vert_loops:
+                    if any(vert_count[i] > 1 for i in loop):
+                        self.report({'WARNING'},'Edge loop selection has extra parts!  Excluding this loop')
+                        continue
 
-                else:
                     lverts = [self.dest_bme.verts[i] for i in loop]
 
                     existing_loop =ExistingVertList(context,
@@ -1913,6 +2415,9 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
             self.tmp_ob = contour_mesh_cache['tmp']
             print('loaded old tmp ob in %f' % (time.time() - start))
 
+            if 'bvh' not in contour_mesh_cache:
+                write_bvh_cache(self.bme)
+
             if self.tmp_ob:
                 self.original_form = self.tmp_ob
             else:
@@ -1976,6 +2481,25 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
             write_mesh_cache(target, self.tmp_ob, self.bme)
             print('derived new bme and any triangulations in %f' % (time.time() - start))
 
+        # Decimated copy of the form for coarse cuts while dragging
+        self.proxy_form = None
+        self.proxy_bme = None
+        if settings.use_proxy_cut and len(self.bme.faces) > 5000:
+            if contour_mesh_cache.get('proxy_ratio') != settings.proxy_ratio:
+                write_proxy_cache(context, self.original_form, self.bme, settings.proxy_ratio)
+            self.proxy_form = contour_mesh_cache['proxy']
+            self.proxy_bme = contour_mesh_cache['proxy_bme']
+
+        # Released high res loops get cut again from here
+        set_cut_source(self.original_form, self.bme, settings.new_method, contour_mesh_cache['bvh'])
+        self.high_res_memory = (0, 0)
+        self.release_due = True
+        self.release_selected = None
+
+        self.needs_refine = False
+        self.last_move_time = time.time()
+        self.refine_delay = 0.25
+
         message = "Segments: %i" % self.segments
         context.area.header_text_set(text=message)
  
@@ -2030,11 +2554,30 @@ class CGCOOKIE_OT_retopo_contour(bpy.types.Operator):
         self.guide_msg = 'GUIDE MODE: LMB to Draw or Select, Ctrl/Shift/ALT + S to smooth, WHEEL or +/- to increase/decrease segments, TAB: toggle Loop mode'
         context.area.header_text_set(self.loop_msg)
 
-        if settings.recover and is_valid:
+        validation = repr(object_validation(target))
+        if settings.recover and is_valid and len(contour_undo_cache):
             print('loading cache!')
             self.undo_action()
+
+        elif settings.recover and settings.use_journal:
+            # The undo cache doesn't survive a crash, but the journal does
+            start = time.time()
+            states = read_journal(journal_filepath(target), validation)
+            if states:
+                self.cut_paths = rebuild_paths(context, states, self.original_form, self.bme)
+                print('replayed %i paths from the journal in %f' % (len(self.cut_paths), time.time() - start))
+            contour_undo_cache.clear()
+
         else:
-            contour_undo_cache = []
+            contour_undo_cache.clear()
+
+        self.journal = None
+        if settings.use_journal:
+            self.journal = SessionJournal(journal_filepath(target), validation)
+            if self.journal.start():
+                self.journal.record_paths(self.cut_paths)
+            else:
+                self.journal = None
 
         # Add in the draw callback and modal method
         self._handle = bpy.types.SpaceView3D.draw_handler_add(retopo_draw_callback, (self, context), 'WINDOW', 'POST_PIXEL')
@@ -0,0 +1,379 @@
+'''
+Copyright (C) 2013 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Patrick Moore
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+####packed geometry storage####
+
+from array import array
+from itertools import count
+
+import numpy as np
+from mathutils import Vector
+
+#numpy types matching the array typecodes used here
+dtypes = {'f': np.float32, 'i': np.int32, 'b': np.int8}
+
+#hands out PackedSequence versions, never the same one twice
+versions = count(1)
+
+
+class PackedSequence(object):
+    '''
+    A list look-alike which keeps its items packed in one flat array,
+    stride numbers per item.  Items are unpacked into fresh objects
+    whenever they are read, so mutating an item you got out of one of
+    these does nothing, assign it back instead.  Reading items one at
+    a time is no faster than a list, anything that wants all of them
+    should work on view() instead.
+
+    version changes whenever the sequence does, through its methods or
+    by being assigned to a packed_property, so undo can tell whether
+    it changed without looking at the numbers.  Writing to data or to
+    a view() directly doesn't, call touch() after.
+    '''
+    __slots__ = ('data', 'stride', 'version')
+    typecode = 'f'
+
+    def __init__(self, items = (), stride = 1):
+        self.stride = stride
+        self.version = next(versions)
+        if isinstance(items, PackedSequence) and items.stride == stride and items.typecode == self.typecode:
+            self.data = array(self.typecode, items.data)
+        else:
+            self.data = array(self.typecode)
+            for item in items:
+                self.data.extend(self.pack(item))
+
+    def pack(self, item):
+        return (item,)
+
+    def unpack(self, chunk):
+        return chunk[0]
+
+    def new(self, data):
+        '''
+        an empty sequence like this one, taking over data
+        '''
+        seq = type(self).__new__(type(self))
+        seq.stride = self.stride
+        seq.data = data
+        seq.version = next(versions)
+        return seq
+
+    def touch(self):
+        self.version = next(versions)
+
+    def chunk(self, i):
+        s = self.stride
+        return self.data[i*s:(i+1)*s]
+
+    def chunks(self):
+        '''
+        every item's numbers as a tuple, without slicing the array
+        '''
+        if self.stride == 1:
+            return ((x,) for x in self.data)
+        it = iter(self.data)
+        return zip(*[it] * self.stride)
+
+    def view(self):
+        '''
+        zero copy numpy view of the packed numbers, N x stride.  While
+        a view is alive the sequence can't change length (the array
+        raises BufferError), so don't hold on to one across edits
+        '''
+        return np.frombuffer(self.data, dtype = dtypes[self.typecode]).reshape(-1, self.stride)
+
+    def packed(self, items):
+        '''
+        the packed numbers of items, as an array for splicing in
+        '''
+        if isinstance(items, PackedSequence) and items.stride == self.stride and items.typecode == self.typecode:
+            return array(self.typecode, items.data)
+        data = array(self.typecode)
+        for item in items:
+            data.extend(self.pack(item))
+        return data
+
+    def check_index(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError('%s index out of range' % type(self).__name__)
+        return i
+
+    def __len__(self):
+        return len(self.data) // self.stride
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            s = self.stride
+            if step == 1:
+                return self.new(self.data[start*s:max(start, stop)*s])
+            data = array(self.typecode)
+            for n in range(start, stop, step):
+                data.extend(self.chunk(n))
+            return self.new(data)
+
+        return self.unpack(self.chunk(self.check_index(i)))
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            s = self.stride
+            if step == 1:
+                self.data[start*s:max(start, stop)*s] = self.packed(value)
+            else:
+                items = list(self)
+                items[i] = value
+                self.data = self.new_from(items).data
+            self.touch()
+            return
+
+        i = self.check_index(i)
+        s = self.stride
+        self.data[i*s:(i+1)*s] = array(self.typecode, self.pack(value))
+        self.touch()
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            s = self.stride
+            if step == 1:
+                del self.data[start*s:max(start, stop)*s]
+            else:
+                items = list(self)
+                del items[i]
+                self.data = self.new_from(items).data
+            self.touch()
+            return
+
+        i = self.check_index(i)
+        s = self.stride
+        del self.data[i*s:(i+1)*s]
+        self.touch()
+
+    def __iter__(self):
+        unpack = self.unpack
+        for chunk in self.chunks():
+            yield unpack(chunk)
+
+    def __reversed__(self):
+        for i in range(len(self) - 1, -1, -1):
+            yield self.unpack(self.chunk(i))
+
+    def __contains__(self, value):
+        return any(item == value for item in self)
+
+    def __eq__(self, other):
+        try:
+            if len(self) != len(other):
+                return False
+        except TypeError:
+            return NotImplemented
+        return all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
+
+    __hash__ = None
+
+    def __add__(self, other):
+        seq = self.copy()
+        seq.extend(other)
+        return seq
+
+    def __radd__(self, other):
+        seq = self.new_from(other)
+        seq.extend(self)
+        return seq
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, list(self))
+
+    def new_from(self, items):
+        seq = self.new(array(self.typecode))
+        seq.extend(items)
+        return seq
+
+    def append(self, value):
+        self.data.extend(self.pack(value))
+        self.touch()
+
+    def extend(self, items):
+        self.data.extend(self.packed(items))
+        self.touch()
+
+    def insert(self, i, value):
+        n = len(self)
+        if i < 0:
+            i = max(0, i + n)
+        i = min(i, n)
+        s = self.stride
+        self.data[i*s:i*s] = array(self.typecode, self.pack(value))
+        self.touch()
+
+    def pop(self, i = -1):
+        value = self[i]
+        del self[i]
+        return value
+
+    def reverse(self):
+        if self.stride == 1:
+            self.data.reverse()
+        else:
+            data = array(self.typecode)
+            data.frombytes(self.view()[::-1].tobytes())
+            self.data = data
+        self.touch()
+
+    def index(self, value):
+        for i, item in enumerate(self):
+            if item == value:
+                return i
+        raise ValueError('%r is not in %s' % (value, type(self).__name__))
+
+    def count(self, value):
+        return sum(1 for item in self if item == value)
+
+    def copy(self):
+        return self.new(array(self.typecode, self.data))
+
+    def nbytes(self):
+        return len(self.data) * self.data.itemsize
+
+
+class VectorArray(PackedSequence):
+    '''
+    list of Vectors as packed float32, None is stored as nan
+    (location_3d_to_region_2d gives None for points behind the view)
+    '''
+    __slots__ = ()
+    typecode = 'f'
+
+    def __init__(self, items = (), size = 3):
+        PackedSequence.__init__(self, items, stride = size)
+
+    def pack(self, item):
+        if item is None:
+            return (float('nan'),) * self.stride
+        item = tuple(item)
+        if len(item) != self.stride:
+            raise ValueError('VectorArray of size %i given a vector of size %i' % (self.stride, len(item)))
+        return item
+
+    def unpack(self, chunk):
+        if chunk[0] != chunk[0]:
+            return None
+        return Vector(chunk)
+
+
+class EdgeArray(PackedSequence):
+    '''
+    list of vertex index pairs, read back as tuples
+    '''
+    __slots__ = ()
+    typecode = 'i'
+
+    def __init__(self, items = ()):
+        PackedSequence.__init__(self, items, stride = 2)
+
+    def pack(self, item):
+        return (item[0], item[1])
+
+    def unpack(self, chunk):
+        return tuple(chunk)
+
+
+class FlagArray(PackedSequence):
+    '''
+    list of bools, one byte each
+    '''
+    __slots__ = ()
+    typecode = 'b'
+
+    def __init__(self, items = ()):
+        PackedSequence.__init__(self, items, stride = 1)
+
+    def pack(self, item):
+        return (1 if item else 0,)
+
+    def unpack(self, chunk):
+        return bool(chunk[0])
+
+
+def as_vectors(items):
+    if isinstance(items, VectorArray) and items.stride == 3:
+        return items
+    return VectorArray(items, size = 3)
+
+
+def as_screen_vectors(items):
+    if isinstance(items, VectorArray) and items.stride == 2:
+        return items
+    return VectorArray(items, size = 2)
+
+
+def as_edges(items):
+    if isinstance(items, EdgeArray):
+        return items
+    return EdgeArray(items)
+
+
+def as_flags(items):
+    if isinstance(items, FlagArray):
+        return items
+    return FlagArray(items)
+
+
+def packed_property(slot, convert):
+    '''
+    attribute which converts whatever gets assigned to it, so
+    code handing it plain lists keeps working.  Assigning counts as
+    a change, even if it's the same sequence back again
+    '''
+    def fget(self):
+        return getattr(self, slot)
+
+    def fset(self, value):
+        value = convert(value)
+        value.touch()
+        setattr(self, slot, value)
+
+    return property(fget, fset)
+
+
+def from_bytes(seq, raw):
+    '''
+    a sequence like seq holding the packed numbers in raw,
+    the inverse of seq.data.tobytes()
+    '''
+    data = array(seq.typecode)
+    data.frombytes(raw)
+    return seq.new(data)
@@ -0,0 +1,638 @@
+'''
+Copyright (C) 2013 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Patrick Moore
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+####surface queries####
+
+'''
+A bounding volume hierarchy over the triangles of the form, for
+answering ray casts and closest point queries a whole array of
+points at a time.  Nothing in here touches bpy, a TriangleBVH is
+just numpy arrays, so it can be built from anything that gives
+verts and triangles and it can be pickled off to another process.
+
+Everything is in the form's local space, same as ob.ray_cast and
+ob.closest_point_on_mesh.  Face indices are the polygon indices of
+the mesh, not triangle indices, so they can be handed straight to
+the cross section code as seeds.
+
+The tree is built bottom up.  Triangles are sorted along a Morton
+curve, chunked into leaves, and the leaves paired up level by level
+into a balanced binary tree.  That makes the build a sort and a few
+reductions, and because every leaf is at the same depth the queries
+can walk the tree one level at a time for all the points at once.
+'''
+
+import numpy as np
+
+#queries are run in chunks so the (query, node) pairs stay a sane size
+chunk_size = 2048
+
+
+def spread_bits(x):
+    '''
+    puts two zero bits between each of the low 10 bits of x
+    '''
+    x = x.astype(np.uint64) & 0x3ff
+    x = (x | (x << 16)) & 0x30000ff
+    x = (x | (x << 8)) & 0x300f00f
+    x = (x | (x << 4)) & 0x30c30c3
+    x = (x | (x << 2)) & 0x9249249
+    return x
+
+
+def morton_codes(pts):
+    lo = pts.min(axis = 0)
+    size = pts.max(axis = 0) - lo
+    size[size == 0] = 1
+    q = np.clip((pts - lo) / size * 1023, 0, 1023).astype(np.uint64)
+    return spread_bits(q[:,0]) | (spread_bits(q[:,1]) << 1) | (spread_bits(q[:,2]) << 2)
+
+
+def box_dist2(pts, mins, maxs):
+    '''
+    squared distance from each point to its box, 0 inside
+    '''
+    d = np.maximum(np.maximum(mins - pts, pts - maxs), 0)
+    return (d * d).sum(axis = 1)
+
+
+def ray_box(origins, inv_dirs, mins, maxs, max_dists):
+    '''
+    slab test, True where the ray passes through the box
+    somewhere between 0 and max_dist
+    '''
+    t1 = (mins - origins) * inv_dirs
+    t2 = (maxs - origins) * inv_dirs
+    t_near = np.minimum(t1, t2).max(axis = 1)
+    t_far = np.maximum(t1, t2).min(axis = 1)
+    return (t_far >= np.maximum(t_near, 0)) & (t_near <= max_dists)
+
+
+def plane_box(pt, no, mins, maxs):
+    '''
+    True where the plane through pt with normal no passes through
+    the box, ie the box corners aren't all on one side
+    '''
+    centers = (mins + maxs) / 2
+    reach = np.dot(maxs - centers, np.abs(no))
+    return np.abs(np.dot(centers - pt, no)) <= reach
+
+
+def ray_triangles(origins, dirs, v0, e1, e2):
+    '''
+    Moller-Trumbore for arrays of ray/triangle pairs.
+    returns the distance along each ray, inf for a miss
+    '''
+    p = np.cross(dirs, e2)
+    det = (e1 * p).sum(axis = 1)
+    ok = np.abs(det) > 1e-12
+    inv_det = np.zeros_like(det)
+    inv_det[ok] = 1 / det[ok]
+
+    s = origins - v0
+    u = (s * p).sum(axis = 1) * inv_det
+    q = np.cross(s, e1)
+    v = (dirs * q).sum(axis = 1) * inv_det
+    t = (e2 * q).sum(axis = 1) * inv_det
+
+    hit = ok & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+def closest_on_triangles(pts, a, b, c):
+    '''
+    closest point on each triangle to each point, for arrays of
+    point/triangle pairs.  Voronoi region test from Ericson's
+    Real-Time Collision Detection, done for every pair at once
+    '''
+    ab = b - a
+    ac = c - a
+    ap = pts - a
+    bp = pts - b
+    cp = pts - c
+
+    d1 = (ab * ap).sum(axis = 1)
+    d2 = (ac * ap).sum(axis = 1)
+    d3 = (ab * bp).sum(axis = 1)
+    d4 = (ac * bp).sum(axis = 1)
+    d5 = (ab * cp).sum(axis = 1)
+    d6 = (ac * cp).sum(axis = 1)
+
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        #inside the face, then the edge and vertex regions.  Later
+        #assignments win, so they go in reverse order of Ericson's tests
+        denom = va + vb + vc
+        v = vb / denom
+        w = vc / denom
+        out = a + ab * v[:,None] + ac * w[:,None]
+
+        region = (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)
+        w = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        out[region] = (b + (c - b) * w[:,None])[region]
+
+        region = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+        w = d2 / (d2 - d6)
+        out[region] = (a + ac * w[:,None])[region]
+
+        region = (d6 >= 0) & (d5 <= d6)
+        out[region] = c[region]
+
+        region = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+        v = d1 / (d1 - d3)
+        out[region] = (a + ab * v[:,None])[region]
+
+        region = (d3 >= 0) & (d4 <= d3)
+        out[region] = b[region]
+
+        region = (d1 <= 0) & (d2 <= 0)
+        out[region] = a[region]
+
+    return out
+
+
+def best_per_query(queries, dists, n):
+    '''
+    index into queries/dists of the smallest distance for each
+    query, and the distances.  -1 and inf for queries with nothing
+    '''
+    best = np.full(n, -1, dtype = np.int64)
+    best_dist = np.full(n, np.inf)
+    if not len(queries):
+        return best, best_dist
+
+    order = np.lexsort((dists, queries))
+    qs = queries[order]
+    first = np.ones(len(qs), dtype = bool)
+    first[1:] = qs[1:] != qs[:-1]
+    winners = order[first]
+    winners = winners[np.isfinite(dists[winners])]
+
+    best[queries[winners]] = winners
+    best_dist[queries[winners]] = dists[winners]
+    return best, best_dist
+
+
+class TriangleBVH(object):
+    '''
+    verts:  N x 3 vertex coords
+    tris:  M x 3 vertex indices
+    tri_face:  polygon index for each triangle, defaults to the triangle index
+    tri_normal:  normal to report for each triangle, eg the polygon
+    normal so both halves of a quad agree.  Defaults to the triangle's own
+    '''
+    def __init__(self, verts, tris, tri_face = None, tri_normal = None, leaf_size = 4):
+        self.desc = 'TRIANGLE_BVH'
+        verts = np.asarray(verts, dtype = np.float64).reshape(-1, 3)
+        tris = np.asarray(tris, dtype = np.int64).reshape(-1, 3)
+        n = len(tris)
+
+        if tri_face is None:
+            tri_face = np.arange(n)
+        tri_face = np.asarray(tri_face, dtype = np.int64)
+        self.n_faces = int(tri_face.max()) + 1 if n else 0
+
+        a, b, c = verts[tris[:,0]], verts[tris[:,1]], verts[tris[:,2]]
+        if tri_normal is None:
+            tri_normal = np.cross(b - a, c - a)
+        tri_normal = np.array(tri_normal, dtype = np.float64).reshape(-1, 3)
+        lens = np.sqrt((tri_normal**2).sum(axis = 1))
+        tri_normal[lens > 0] /= lens[lens > 0][:,None]
+
+        order = np.argsort(morton_codes((a + b + c) / 3), kind = 'mergesort') if n else np.arange(0)
+        self.a = a[order]
+        self.b = b[order]
+        self.c = c[order]
+        self.e1 = self.b - self.a
+        self.e2 = self.c - self.a
+        self.tri_face = tri_face[order]
+        self.tri_normal = tri_normal[order]
+        self.tris = tris[order]
+        self.n_verts = len(verts)
+
+        #vert -> triangle and face -> triangle lookups for walking
+        #the surface, only made the first time a walk needs them
+        self.vert_tris = None
+        self.vert_start = None
+        self.face_tri = None
+
+        self.leaf_size = leaf_size
+        self.leaf_start = np.arange(0, n, leaf_size)
+        self.leaf_count = np.minimum(leaf_size, n - self.leaf_start)
+
+        #levels[0] is the root, levels[-1] the leaves
+        self.levels = []
+        if n:
+            tri_min = np.minimum(np.minimum(self.a, self.b), self.c)
+            tri_max = np.maximum(np.maximum(self.a, self.b), self.c)
+            mins = np.minimum.reduceat(tri_min, self.leaf_start, axis = 0)
+            maxs = np.maximum.reduceat(tri_max, self.leaf_start, axis = 0)
+            self.levels.append((mins, maxs))
+            while len(mins) > 1:
+                k = len(mins) // 2
+                pmins = np.minimum(mins[0:2*k:2], mins[1:2*k:2])
+                pmaxs = np.maximum(maxs[0:2*k:2], maxs[1:2*k:2])
+                if len(mins) % 2:
+                    pmins = np.vstack((pmins, mins[-1:]))
+                    pmaxs = np.vstack((pmaxs, maxs[-1:]))
+                mins, maxs = pmins, pmaxs
+                self.levels.append((mins, maxs))
+            self.levels.reverse()
+
+    def __len__(self):
+        return len(self.a)
+
+    def nbytes(self):
+        arrays = [self.a, self.b, self.c, self.e1, self.e2, self.tri_face, self.tri_normal,
+                  self.tris, self.leaf_start, self.leaf_count]
+        if self.vert_tris is not None:
+            arrays += [self.vert_tris, self.vert_start, self.face_tri]
+        for mins, maxs in self.levels:
+            arrays += [mins, maxs]
+        return sum(arr.nbytes for arr in arrays)
+
+    def children(self, queries, nodes, level):
+        '''
+        (query, child) pairs for every child of the given nodes
+        '''
+        n_children = len(self.levels[level + 1][0])
+        queries = np.repeat(queries, 2)
+        kids = (2 * nodes[:,None] + np.array((0, 1))).ravel()
+        keep = kids < n_children
+        return queries[keep], kids[keep]
+
+    def leaf_triangles(self, queries, leaves):
+        '''
+        (query, triangle) pairs for every triangle in the given leaves
+        '''
+        counts = self.leaf_count[leaves]
+        total = counts.sum()
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(queries, counts), np.repeat(self.leaf_start[leaves], counts) + offsets
+
+    def ray_cast(self, origins, directions, max_dist = np.inf):
+        '''
+        origins, directions:  N x 3, directions need not be normalized
+        max_dist:  scalar or N array, measured along the normalized direction
+
+        returns hit locations, normals, face indices and distances.
+        Misses have face index -1 and distance inf
+        '''
+        origins = np.asarray(origins, dtype = np.float64).reshape(-1, 3)
+        dirs = np.array(directions, dtype = np.float64).reshape(-1, 3)
+        lens = np.sqrt((dirs**2).sum(axis = 1))
+        dirs[lens > 0] /= lens[lens > 0][:,None]
+        max_dist = np.broadcast_to(np.asarray(max_dist, dtype = np.float64), (len(origins),))
+
+        n = len(origins)
+        locs = np.zeros((n, 3))
+        normals = np.zeros((n, 3))
+        faces = np.full(n, -1, dtype = np.int64)
+        dists = np.full(n, np.inf)
+        if not n or not len(self):
+            return locs, normals, faces, dists
+
+        for s in range(0, n, chunk_size):
+            sl = slice(s, s + chunk_size)
+            o, d, md = origins[sl], dirs[sl], max_dist[sl]
+            with np.errstate(divide = 'ignore'):
+                inv = 1 / np.where(d == 0, 1e-30, d)
+
+            queries = np.arange(len(o))
+            nodes = np.zeros(len(o), dtype = np.int64)
+            for level, (mins, maxs) in enumerate(self.levels):
+                keep = ray_box(o[queries], inv[queries], mins[nodes], maxs[nodes], md[queries])
+                queries, nodes = queries[keep], nodes[keep]
+                if level < len(self.levels) - 1:
+                    queries, nodes = self.children(queries, nodes, level)
+
+            queries, tris = self.leaf_triangles(queries, nodes)
+            t = ray_triangles(o[queries], d[queries], self.a[tris], self.e1[tris], self.e2[tris])
+            t[t > md[queries]] = np.inf
+
+            best, best_t = best_per_query(queries, t, len(o))
+            hit = best != -1
+            tris = tris[best[hit]]
+            rows = np.arange(s, s + len(o))[hit]
+            locs[rows] = o[hit] + d[hit] * best_t[hit][:,None]
+            normals[rows] = self.tri_normal[tris]
+            faces[rows] = self.tri_face[tris]
+            dists[rows] = best_t[hit]
+
+        return locs, normals, faces, dists
+
+    def ray_cast_segments(self, starts, ends):
+        '''
+        like ob.ray_cast(start, end), the first hit between start and end
+        '''
+        starts = np.asarray(starts, dtype = np.float64).reshape(-1, 3)
+        dirs = np.asarray(ends, dtype = np.float64).reshape(-1, 3) - starts
+        return self.ray_cast(starts, dirs, np.sqrt((dirs**2).sum(axis = 1)))
+
+    def crossing_plane(self, pt, no):
+        '''
+        the triangles (indices into the sorted arrays) the plane
+        through pt with normal no passes through.  Only boxes the plane
+        cuts are opened, so the cost follows the size of the cross
+        section rather than the size of the mesh
+        '''
+        if not len(self):
+            return np.zeros(0, dtype = np.int64)
+        pt = np.asarray(pt, dtype = np.float64)
+        no = np.asarray(no, dtype = np.float64)
+
+        nodes = np.zeros(1, dtype = np.int64)
+        for level, (mins, maxs) in enumerate(self.levels):
+            nodes = nodes[plane_box(pt, no, mins[nodes], maxs[nodes])]
+            if level < len(self.levels) - 1:
+                nodes = self.children(np.zeros(len(nodes), dtype = np.int64), nodes, level)[1]
+
+        tris = self.leaf_triangles(np.zeros(len(nodes), dtype = np.int64), nodes)[1]
+        da = np.dot(self.a[tris] - pt, no)
+        db = np.dot(self.b[tris] - pt, no)
+        dc = np.dot(self.c[tris] - pt, no)
+        lo = np.minimum(np.minimum(da, db), dc)
+        hi = np.maximum(np.maximum(da, db), dc)
+        return tris[(lo <= 0) & (hi >= 0)]
+
+    def faces_crossing_plane(self, pt, no):
+        '''
+        polygon indices of the faces the plane passes through, sorted
+        '''
+        return np.unique(self.tri_face[self.crossing_plane(pt, no)])
+
+    def closest_point(self, points, max_dist = np.inf):
+        '''
+        points:  N x 3
+        returns the closest locations on the surface, normals, face
+        indices and distances.  Points with nothing within max_dist get
+        face index -1 and distance inf
+        '''
+        points = np.asarray(points, dtype = np.float64).reshape(-1, 3)
+        n = len(points)
+        locs = np.zeros((n, 3))
+        normals = np.zeros((n, 3))
+        faces = np.full(n, -1, dtype = np.int64)
+        dists = np.full(n, np.inf)
+        if not n or not len(self):
+            return locs, normals, faces, dists
+
+        for s in range(0, n, chunk_size):
+            p = points[s:s + chunk_size]
+            queries = np.arange(len(p))
+
+            #every box holds at least one triangle, so the distance to
+            #its far corner bounds the answer.  That bound tightens as
+            #we go down and prunes the boxes which are too far away
+            bound = np.full(len(p), np.square(max_dist))
+            nodes = np.zeros(len(p), dtype = np.int64)
+            for level, (mins, maxs) in enumerate(self.levels):
+                pq = p[queries]
+                near = box_dist2(pq, mins[nodes], maxs[nodes])
+                far = (np.maximum(np.abs(pq - mins[nodes]), np.abs(pq - maxs[nodes]))**2).sum(axis = 1)
+                np.minimum.at(bound, queries, far)
+                keep = near <= bound[queries]
+                queries, nodes, near = queries[keep], nodes[keep], near[keep]
+                if level < len(self.levels) - 1:
+                    queries, nodes = self.children(queries, nodes, level)
+
+            #try the nearest leaf first, then only the leaves
+            #that could still have something closer
+            first, first_near = best_per_query(queries, near, len(p))
+            has = first != -1
+            guess_q, guess_tris = self.leaf_triangles(queries[first[has]], nodes[first[has]])
+            pts = closest_on_triangles(p[guess_q], self.a[guess_tris], self.b[guess_tris], self.c[guess_tris])
+            d2 = ((pts - p[guess_q])**2).sum(axis = 1)
+            d2[~np.isfinite(d2)] = np.inf
+            np.minimum.at(bound, guess_q, d2)
+
+            keep = near <= bound[queries]
+            keep[first[has]] = False
+            queries, tris = self.leaf_triangles(queries[keep], nodes[keep])
+            queries = np.concatenate((guess_q, queries))
+            tris = np.concatenate((guess_tris, tris))
+            pts = np.vstack((pts, closest_on_triangles(p[queries[len(guess_q):]], self.a[tris[len(guess_q):]],
+                                                        self.b[tris[len(guess_q):]], self.c[tris[len(guess_q):]])))
+            d2 = ((pts - p[queries])**2).sum(axis = 1)
+            d2[~np.isfinite(d2) | (d2 > bound[queries])] = np.inf
+
+            best, best_d2 = best_per_query(queries, d2, len(p))
+            hit = best != -1
+            rows = np.arange(s, s + len(p))[hit]
+            locs[rows] = pts[best[hit]]
+            normals[rows] = self.tri_normal[tris[best[hit]]]
+            faces[rows] = self.tri_face[tris[best[hit]]]
+            dists[rows] = np.sqrt(best_d2[hit])
+
+        return locs, normals, faces, dists
+
+
+    def build_adjacency(self):
+        '''
+        triangles around each vert, as one array sorted by vert
+        with an offset table, and one triangle for each face
+        '''
+        verts = self.tris.ravel()
+        order = np.argsort(verts, kind = 'mergesort')
+        self.vert_tris = order // 3
+        self.vert_start = np.concatenate(([0], np.cumsum(np.bincount(verts, minlength = self.n_verts))))
+
+        self.face_tri = np.full(self.tri_face.max() + 1 if len(self) else 0, -1, dtype = np.int64)
+        self.face_tri[self.tri_face] = np.arange(len(self))
+
+    def around(self, queries, tris):
+        '''
+        (query, triangle) pairs for every triangle sharing a vert
+        with the given triangles, including themselves
+        '''
+        verts = self.tris[tris].ravel()
+        queries = np.repeat(queries, 3)
+        starts = self.vert_start[verts]
+        counts = self.vert_start[verts + 1] - starts
+        total = counts.sum()
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(queries, counts), self.vert_tris[np.repeat(starts, counts) + offsets]
+
+    def closest_point_walk(self, points, start_faces = None, seed_every = 16, max_steps = 32, escape = 2):
+        '''
+        closest_point for points that are already near the surface and
+        near each other, eg a path being re-snapped after relaxing.
+
+        Each point starts from a face and walks over the triangles
+        around it, one ring at a time, to the nearest one.  That only
+        looks at a handful of triangles per point.  A point falls back
+        to the full closest_point if its walk doesn't settle in
+        max_steps, or settles further than escape times its triangle's
+        size from the surface.  The walk can stop in a local minimum,
+        so every answer is checked against the leaf boxes nearer than
+        it (see closer_in_leaves)
+
+        start_faces:  face index for each point, eg from the last time
+        it was snapped, -1 for unknown.  With None, every seed_every'th
+        point is found the slow way and the ones after it start from it,
+        unless they are too far from it to be worth walking
+
+        returns locations, normals, face indices and distances
+        '''
+        points = np.asarray(points, dtype = np.float64).reshape(-1, 3)
+        n = len(points)
+        if not n or not len(self):
+            return self.closest_point(points)
+        if self.vert_tris is None:
+            self.build_adjacency()
+
+        tris = np.full(n, -1, dtype = np.int64)
+        if start_faces is not None:
+            faces = np.asarray(start_faces, dtype = np.int64).reshape(-1)
+            ok = (faces >= 0) & (faces < len(self.face_tri))
+            tris[ok] = self.face_tri[faces[ok]]
+        else:
+            seeds = np.arange(0, n, seed_every)
+            seed_locs, seed_faces = self.closest_point(points[seeds])[0:3:2]
+            seed_of = np.repeat(np.arange(len(seeds)), seed_every)[:n]
+            tris = self.face_tri[seed_faces[seed_of]]
+            
+            #a point well away from its seed would walk a long way, if
+            #it doesn't get stuck first
+            gap2 = ((points - seed_locs[seed_of])**2).sum(axis = 1)
+            tris[gap2 > escape * escape * self.tri_size2(tris)] = -1
+
+        #anything without a start gets found the slow way
+        lost = tris < 0
+        if lost.any():
+            tris[lost] = self.face_tri[self.closest_point(points[lost])[2]]
+
+        p = points
+        cur = closest_on_triangles(p, self.a[tris], self.b[tris], self.c[tris])
+        cur_d2 = ((cur - p)**2).sum(axis = 1)
+        cur_d2[~np.isfinite(cur_d2)] = np.inf
+
+        active = np.arange(n)
+        for step in range(max_steps):
+            if not len(active):
+                break
+            queries, cands = self.around(active, tris[active])
+            pts = closest_on_triangles(p[queries], self.a[cands], self.b[cands], self.c[cands])
+            d2 = ((pts - p[queries])**2).sum(axis = 1)
+            d2[~np.isfinite(d2)] = np.inf
+
+            best, best_d2 = best_per_query(queries, d2, n)
+            moved = (best != -1) & (best_d2 < cur_d2 * (1 - 1e-12))
+            moved = np.flatnonzero(moved)
+            tris[moved] = cands[best[moved]]
+            cur[moved] = pts[best[moved]]
+            cur_d2[moved] = best_d2[moved]
+            active = moved
+
+        #didn't settle, or settled too far away to check cheaply
+        lost = np.zeros(n, dtype = bool)
+        lost[active] = True
+        lost |= cur_d2 > escape * escape * self.tri_size2(tris)
+
+        #a walk that settled in a local minimum has a closer triangle
+        #in some leaf whose box is nearer than where it stopped
+        check = np.flatnonzero(~lost)
+        closer, closer_tris, closer_d2 = self.closer_in_leaves(p[check], cur_d2[check])
+        found = closer_tris != -1
+        rows = check[found]
+        tris[rows] = closer_tris[found]
+        cur[rows] = closer[found]
+        cur_d2[rows] = closer_d2[found]
+
+        locs = cur
+        normals = self.tri_normal[tris]
+        faces = self.tri_face[tris]
+        dists = np.sqrt(cur_d2)
+        if lost.any():
+            locs[lost], normals[lost], faces[lost], dists[lost] = self.closest_point(points[lost])
+
+        return locs, normals, faces, dists
+
+    def tri_size2(self, tris):
+        '''
+        squared length of the longest edge of each triangle
+        '''
+        return np.maximum(np.maximum((self.e1[tris]**2).sum(axis = 1), (self.e2[tris]**2).sum(axis = 1)),
+                          ((self.c[tris] - self.b[tris])**2).sum(axis = 1))
+
+    def closer_in_leaves(self, points, d2):
+        '''
+        the closest point on the triangles of every leaf whose box is
+        nearer to each point than d2 (squared).  With a good d2 that's
+        the point's own leaf and maybe a neighbour, so this is cheap.
+
+        returns locations, triangles and squared distances, triangle
+        -1 where nothing is closer than d2
+        '''
+        n = len(points)
+        locs = np.zeros((n, 3))
+        tris = np.full(n, -1, dtype = np.int64)
+        dists = np.array(d2, dtype = np.float64)
+        if not n or not len(self):
+            return locs, tris, dists
+
+        queries = np.arange(n)
+        nodes = np.zeros(n, dtype = np.int64)
+        for level, (mins, maxs) in enumerate(self.levels):
+            keep = box_dist2(points[queries], mins[nodes], maxs[nodes]) < dists[queries]
+            queries, nodes = queries[keep], nodes[keep]
+            if level < len(self.levels) - 1:
+                queries, nodes = self.children(queries, nodes, level)
+
+        queries, cands = self.leaf_triangles(queries, nodes)
+        pts = closest_on_triangles(points[queries], self.a[cands], self.b[cands], self.c[cands])
+        cand_d2 = ((pts - points[queries])**2).sum(axis = 1)
+        cand_d2[~np.isfinite(cand_d2)] = np.inf
+
+        best, best_d2 = best_per_query(queries, cand_d2, n)
+        found = np.flatnonzero((best != -1) & (best_d2 < dists * (1 - 1e-12)))
+        locs[found] = pts[best[found]]
+        tris[found] = cands[best[found]]
+        dists[found] = best_d2[found]
+        return locs, tris, dists
+
+
+def bvh_from_bmesh(bme):
+    '''
+    Fan triangulates each face.  Faces are numbered in the order the
+    bmesh holds them, which is the polygon order of the mesh it writes
+    out, and the one ray_cast and closest_point_on_mesh report.
+    '''
+    verts = np.array([v.co[:] for v in bme.verts], dtype = np.float64).reshape(-1, 3)
+    vert_index = {v: i for i, v in enumerate(bme.verts)}
+
+    tris = []
+    tri_face = []
+    tri_normal = []
+    for i, f in enumerate(bme.faces):
+        fv = [vert_index[v] for v in f.verts]
+        no = f.normal[:]
+        for j in range(1, len(fv) - 1):
+            tris.append((fv[0], fv[j], fv[j+1]))
+            tri_face.append(i)
+            tri_normal.append(no)
+
+    if not tris:
+        return TriangleBVH(verts, np.zeros((0, 3)))
+    return TriangleBVH(verts, tris, tri_face, tri_normal)
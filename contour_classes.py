@@ -24,6 +24,7 @@ Created by Patrick Moore
 import copy
 import math
 import time
+import zlib
 from mathutils import Vector, Quaternion
 from mathutils.geometry import intersect_point_line, intersect_line_plane
 
@@ -33,13 +34,63 @@ import blf
 import bmesh
 from bpy_extras.view3d_utils import location_3d_to_region_2d, region_2d_to_vector_3d, region_2d_to_location_3d, region_2d_to_origin_3d
 
+import numpy as np
+
 import contour_utilities, general_utilities
+from contour_kdtree import KDTree
+from contour_arrays import packed_property, as_vectors, as_screen_vectors, as_edges, as_flags, VectorArray, EdgeArray, from_bytes
 
 #from development.cgc-retopology import contour_utilities
 
 #Make the addon name and location accessible
 AL = general_utilities.AddonLocator()
 
+#the form and bmesh released high res loops get re-sliced from,
+#and the TriangleBVH of the form for batched surface queries.
+#set by the operator, see ContourCutLine.release_verts
+cut_source = {}
+
+def set_cut_source(ob, bme, method, bvh = None):
+    cut_source.clear()
+    ring_trees.clear()
+    if ob and bme:
+        cut_source.update(ob = ob, bme = bme, method = method, bvh = bvh)
+
+def form_bvh(ob):
+    '''
+    the cached TriangleBVH for ob, None if ob isn't the form
+    being cut (eg the proxy) or there isn't one
+    '''
+    if cut_source and cut_source['ob'] == ob:
+        return cut_source['bvh']
+    return None
+
+#KDTrees of ring verts_simple, by id(ring) with a checksum of the
+#verts so a tree is only rebuilt when its ring has changed.  Kept
+#here and not on the rings so undo never has to copy them
+ring_trees = {}
+
+def ring_tree(ring):
+    '''
+    the KDTree of ring.verts_simple, built the first time it's asked
+    for and again whenever the verts change
+    '''
+    verts = ring.verts_simple
+    data = getattr(verts, 'data', None)
+    if data is None:
+        data = contour_utilities.vert_array(verts).astype(np.float32).tobytes()
+    key = (len(verts), zlib.crc32(data))
+    
+    cached = ring_trees.get(id(ring))
+    if cached and cached[0] == key:
+        return cached[1]
+    
+    if len(ring_trees) > 64:
+        ring_trees.clear()
+    tree = KDTree(contour_utilities.vert_array(verts))
+    ring_trees[id(ring)] = (key, tree)
+    return tree
+
 class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, SegmentCuts, SegmentCutSeries?
     def __init__(self, context, raw_points,
                  segments = 5,  #TODO:  Rename for nomenclature consistency
@@ -64,6 +115,7 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         
         self.raw_screen = [] # raycast -> raw_world
         self.raw_world = []  #smoothed -> world_path
+        self.raw_faces = []  #face under each raw_world point, where the snapping walks start
         self.world_path = []  #the data we use the most
         
         
@@ -78,17 +130,22 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         self.verts = []
         self.edges = []
         self.faces = []
+        #follow lines are paths through self.verts (ranges, or index pairs
+        #across the transition rings), and follow_vis goes by vert index
         self.follow_lines = []
         self.follow_vis = []
         
-        #toss a bunch of raw pixel data
-        for i, v in enumerate(raw_points):
-            if not math.fmod(i, cull_factor):
-                self.raw_screen.append(v)
+        #assigned the first time the series is written to the session journal
+        self.journal_id = None
+        
+        #toss raw pixel data that's closer together than we care about
+        self.raw_screen = contour_utilities.thin_screen_points(raw_points, cull_factor)
 
         ####PROCESSIG CONSTANTS###
         self.segments = segments
         self.ring_segments = ring_segments
+        #with adaptive vertex counts, ring_segments is the most a ring gets
+        self.vert_tolerance = settings.vertex_error if settings.vertex_placement == 'ADAPTIVE' else 0
         self.cull_factor = cull_factor
         self.smooth_factor = smooth_factor
         self.feature_factor = feature_factor
@@ -115,113 +172,116 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
     def ray_cast_path(self,context, ob):
         region = context.region
         rv3d = context.space_data.region_3d
-        mx = ob.matrix_world
         settings = context.user_preferences.addons[AL.FolderName].preferences
-        rc = contour_utilities.ray_cast_region2d
-        hits = [rc(region,rv3d,v,ob,settings)[1] for v in self.raw_screen]
-        self.raw_world = [mx*hit[0] for hit in hits if hit[2] != -1]
+        hits, normals, faces = contour_utilities.ray_cast_region2d_batch(region, rv3d, self.raw_screen, ob, settings, form_bvh(ob))
+        self.raw_world = [Vector(v) for v in hits[faces != -1]]
+        self.raw_faces = faces[faces != -1].tolist()
         
         if settings.debug > 1:
             print('ray_cast_path missed %d/%d points' % (len(self.raw_screen) - len(self.raw_world), len(self.raw_screen)))
         
-    def smooth_path(self,context, ob = None):
+    def take_live_stroke(self, live):
+        '''
+        use the casting a finished LiveStroke already did, in place
+        of ray_cast_path.  Its knots are only good for the preview,
+        find_knots still has to run over the whole stroke
+        '''
+        self.raw_screen = live.raw_screen
+        self.raw_world = live.raw_world
+        self.raw_faces = live.raw_faces
         
-        #clear the world path if need be
-        self.world_path = []
+    def smooth_path(self,context, ob = None):
+        '''
+        relaxes raw_world into world_path, the knots stay put.
+        Relaxing only nudges the points along the surface, so they are
+        snapped back once at the end rather than every iteration.
         
-        if ob:
-            mx = ob.matrix_world
-            imx = mx.inverted()
-            
+        returns world_path as an N x 3 array and the faces under
+        it (None without ob) for the stages after this one
+        '''
+        raw = np.array(self.raw_world, dtype = np.float64).reshape(-1, 3)
+        pinned = np.zeros(len(raw), dtype = bool)
         if len(self.knots) > 2:
-            
-            #split the raw
-            segments = []
-            for i in range(0,len(self.knots) - 1):
-                segments.append([self.raw_world[m] for m in range(self.knots[i],self.knots[i+1])])
-                
-        else:
-            segments = [[v.copy() for v in self.raw_world]]
+            pinned[[k for k in self.knots if k < len(raw)]] = True
         
-        for segment in segments:
-            for n in range(self.smooth_factor - 1):
-                contour_utilities.relax(segment)
-                
-                #resnap so we don't loose the surface
-                if ob:
-                    for i, vert in enumerate(segment):
-                        snap = ob.closest_point_on_mesh(imx * vert)
-                        segment[i] = mx * snap[0]
-            
-            self.world_path.extend(segment)
-
-        #resnap everthing we can to get normals an stuff
-        #TODO do this the last time on the smooth factor duh
-        self.snap_to_object(ob)
+        world = contour_utilities.relax_array(raw, iterations = self.smooth_factor - 1, pinned = pinned)
         
-    def snap_to_object(self,ob, raw = True, world = True, cuts = True):
+        faces = None
+        if ob:
+            starts = self.raw_faces if len(self.raw_faces) == len(raw) else None
+            world, normals, faces = contour_utilities.snap_path_world(ob, world, form_bvh(ob), starts)
         
-        mx = ob.matrix_world
-        imx = mx.inverted()
+        self.world_path = [Vector(v) for v in world]
+        return world, faces
+    
+    def process_stroke(self, context, ob):
+        '''
+        smooth_path, create_cut_nodes and snap_to_object(cuts only)
+        in one pass.  The path goes from stage to stage as an array,
+        and each cut point walks onto the surface from the face of the
+        path point it was placed next to.
+        '''
+        world, faces = self.smooth_path(context, ob = ob)
+        nodes, inds = self.create_cut_nodes(context, world = world, ob = ob, fit = True)
+        self.snap_to_object(ob, raw = False, world = False, cuts = True, cut_faces = faces[inds])
+        
+    def snap_to_object(self,ob, raw = True, world = True, cuts = True, cut_faces = None):
+        '''
+        cut_faces:  a face near each cut point to start snapping from
+        '''
+        bvh = form_bvh(ob)
+        closest = contour_utilities.snap_path_world
         if raw and len(self.raw_world):
-            for i, vert in enumerate(self.raw_world):
-                snap = ob.closest_point_on_mesh(imx * vert)
-                self.raw_world[i] = mx * snap[0]
-                
+            locs = closest(ob, self.raw_world, bvh)[0]
+            self.raw_world = [Vector(v) for v in locs]
                 
         if world and len(self.world_path):
-            #self.path_normals = []
-            #self.path_seeds = []
-            for i, vert in enumerate(self.world_path):
-                snap = ob.closest_point_on_mesh(imx * vert)
-                self.world_path[i] = mx * snap[0]
-                #self.path_normals.append(mx.to_3x3() * snap[1])
-                #self.path_seeds.append(snap[2])
+            locs = closest(ob, self.world_path, bvh)[0]
+            self.world_path = [Vector(v) for v in locs]
                 
         if cuts and len(self.cut_points):
-            self.cut_point_normals = []
-            self.cut_point_seeds = []
-            for i, vert in enumerate(self.cut_points):
-                snap = ob.closest_point_on_mesh(imx * vert)
-                self.cut_points[i] = mx * snap[0]
-                self.cut_point_normals.append(mx.to_3x3() * snap[1])
-                self.cut_point_seeds.append(snap[2])
+            locs, normals, faces = closest(ob, self.cut_points, bvh, cut_faces)
+            self.cut_points = [Vector(v) for v in locs]
+            self.cut_point_normals = [Vector(no) for no in normals]
+            self.cut_point_seeds = [int(f) for f in faces]
     
     def snap_end_to_existing(self,existing_loop):
+        '''
+        snaps the tip or the tail of the path, whichever is nearer, to
+        the closest vert of existing_loop if it's within a few of its
+        edge lengths
+        '''
+        verts = existing_loop.verts_simple
+        if not len(verts) or not len(self.raw_world):
+            return
+        
+        loop_length = contour_utilities.get_path_length(verts)
+        thresh = 3 * loop_length/len(verts)
         
-        #TODO make sure
-        loop_length = contour_utilities.get_path_length(existing_loop.verts_simple)
-        thresh = 3 * loop_length/len(existing_loop.verts_simple)
+        inds, dists = ring_tree(existing_loop).find_n([self.raw_world[0], self.raw_world[-1]], 1)
+        tip_dist, tail_dist = dists[:,0]
         
         snap_tip = None
         snap_tail = None
-        
-        for v in existing_loop.verts_simple:
-            tip_v = v - self.raw_world[0]
-            tail_v = v - self.raw_world[-1]
-            
-            if tip_v.length < thresh:
-                snap_tip = existing_loop.verts_simple.index(v)
-                thresh = tip_v.length
-                
-            if tail_v.length < thresh:
-                snap_tail = existing_loop.verts_simple.index(v)
-                thresh = tail_v.length
+        if tip_dist < thresh and tip_dist <= tail_dist:
+            snap_tip = int(inds[0,0])
+        elif tail_dist < thresh:
+            snap_tail = int(inds[1,0])
 
-        if snap_tip:
+        if snap_tip is not None:
             self.existing_head = existing_loop
-            v0 = existing_loop.verts_simple[snap_tip]
+            v0 = verts[snap_tip]
         else:
             v0 = self.raw_world[0]
             
-        if snap_tail:
+        if snap_tail is not None:
             self.existing_tail = existing_loop
-            v1 = existing_loop.verts_simple[snap_tail]
+            v1 = verts[snap_tail]
         else:
             v1 = self.raw_world[-1]
         
-        if snap_tip or snap_tail:
-            self.ring_segments = len(existing_loop.verts_simple)   
+        if snap_tip is not None or snap_tail is not None:
+            self.ring_segments = len(verts)   
             self.raw_world = contour_utilities.fit_path_to_endpoints(self.raw_world, v0, v1)
                                  
     def find_knots(self):
@@ -237,46 +297,95 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         
             self.knots = contour_utilities.simplify_RDP(self.raw_world, error)
         
-    def create_cut_nodes(self,context, knots = False):
+    def create_cut_nodes(self,context, knots = False, world = None, ob = None, fit = False):
         '''
         Creates evenly spaced points along the cut path to generate
-        contour cuts on.
+        contour cuts on.  With adaptive ring placement and the form
+        in ob, they are spaced by ring_density instead.
+        
+        world:  world_path as an array, if the caller already has it
+        fit:  adaptive only, let the allowed error pick self.segments
+        
+        returns the cut points as an array, and the index of the
+        path point each one comes after
         '''
-        self.cut_points = [] 
-        if self.segments <= 1:
-            self.cut_points = [self.world_path[0],self.world_path[-1]]
-            return
+        settings = context.user_preferences.addons[AL.FolderName].preferences
+        if world is None:
+            world = np.array(self.world_path, dtype = np.float64).reshape(-1, 3)
+        
+        cumulative = contour_utilities.cumulative_lengths(world)
+        path_length = cumulative[-1] if len(cumulative) else 0
+        if self.segments <= 1 or path_length == 0:
+            inds = np.array([0, len(world) - 1])
+            self.cut_points = [Vector(world[0]), Vector(world[-1])]
+            return world[inds], inds
         
-        path_length = contour_utilities.get_path_length(self.world_path)
-        if path_length == 0:
-            self.cut_points = [self.world_path[0], self.world_path[-1]]
-            return
         cut_spacing = path_length/self.segments
         
-        if len(self.knots) > 2 and knots:
-            segments = []
-            for i in range(0,len(self.knots) - 1):
-                segments.append(self.world_path[self.knots[i]:self.knots[i+1]+1])
-            
-                  
+        density = None
+        if ob and settings.ring_placement == 'ADAPTIVE':
+            density = self.ring_density(context, ob, world, cumulative)
+        
+        if density is not None:
+            #even steps through the integrated density
+            rings = np.concatenate(([0], np.cumsum(.5 * (density[:-1] + density[1:]) * np.diff(cumulative))))
+            if fit and not self.seg_lock:
+                self.segments = int(min(max(round(rings[-1]), 3), 100))
+            targets = np.interp(np.linspace(0, rings[-1], self.segments + 1), rings, cumulative)
+            
+        elif len(self.knots) > 2 and knots:
+            #evenly spaced within each stretch between knots
+            targets = [0]
+            for k0, k1 in zip(self.knots[:-1], self.knots[1:]):
+                l0, l1 = cumulative[k0], cumulative[min(k1, len(world) - 1)]
+                n_segments = max(1, math.ceil((l1 - l0)/cut_spacing))
+                targets.extend(np.linspace(l0, l1, n_segments + 1)[1:])
+            targets = np.array(targets)
         else:
-            segments = [self.world_path]
-            
+            targets = np.linspace(0, path_length, self.segments + 1)
         
-        for i, segment in enumerate(segments):
-            segment_length = contour_utilities.get_path_length(segment)
-            n_segments = math.ceil(segment_length/cut_spacing)
-            vs = contour_utilities.space_evenly_on_path(segment, [[0,1],[1,2]], n_segments, 0, debug = False)[0]
-            if i > 0:
-                self.cut_points.extend(vs[1:len(vs)])
-            else:
-                self.cut_points.extend(vs[:len(vs)])
+        nodes, inds = contour_utilities.points_along_path(world, cumulative, targets)
+        self.cut_points = [Vector(v) for v in nodes]
+        return nodes, inds
+    
+    def ring_density(self, context, ob, world, cumulative):
+        '''
+        contour_utilities.ring_density along world from the bend of
+        the path and the thickness of the form under it.  None if the
+        thickness can't be measured, eg the stroke is on an open mesh
+        '''
+        settings = context.user_preferences.addons[AL.FolderName].preferences
+        if len(world) < 3:
+            return None
+        
+        radii = .5 * contour_utilities.surface_thickness(ob, world, form_bvh(ob))
+        measured = np.isfinite(radii)
+        if not measured.any():
+            return None
+        radii = np.interp(cumulative, cumulative[measured], radii[measured])
+        
+        #both are noisy from point to point, average them over a few
+        curvature = contour_utilities.smooth_samples(contour_utilities.path_curvature(world, cumulative), 5)
+        radii = contour_utilities.smooth_samples(radii, 9)
+        
+        return contour_utilities.ring_density(cumulative, curvature, radii, settings.ring_error, self.ring_segments)
             
     def cuts_on_path(self,context,ob,bme):
+        for step in self.iter_cuts_on_path(context, ob, bme):
+            pass
         
+    def iter_cuts_on_path(self,context,ob,bme):
+        '''
+        generator version of cuts_on_path, makes one cut each time
+        it is advanced so the job scheduler can spread the work out.
+        The follow lines are cleared so the partial series draws
+        sensibly until it is connected again
+        '''
         settings = context.user_preferences.addons[AL.FolderName].preferences
         
         self.cuts = []
+        self.follow_lines = []
+        self.follow_vis = []
         
         if not len(self.cut_points) or len(self.cut_points) < 3:
             return
@@ -326,7 +435,7 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
                        
             cut.plane_no = final_no
             cut.cut_object(context, ob, bme)
-            cut.simplify_cross(self.ring_segments)
+            self.resample_cut(cut)
             
             if (i == 0 and not self.existing_head) or (i == 1 and self.existing_head):
                 #make sure the first loop is right handed
@@ -346,6 +455,8 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
 
             if i > 0:
                 self.align_cut(cut, mode='BEHIND', fine_grain='TRUE')
+            
+            yield (i + 1, len(self.cut_points))
                 
         if self.existing_head:
             self.existing_head.align_to_other(self.cuts[0])
@@ -365,13 +476,15 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         
         if len(self.cuts) == 0:
             return
-            
+        
+        #seed faces and surface normals under every cut in one go
+        snaps = contour_utilities.closest_points_world(ob, [cut.verts_simple[0] for cut in self.cuts], form_bvh(ob))
+        
         for i, cut in enumerate(self.cuts):
             
             pt = cut.verts_simple[0]
-            snap = ob.closest_point_on_mesh(ob.matrix_world.inverted() * pt)
-            seed = snap[2]
-            surface_no = ob.matrix_world.inverted().transposed() * snap[1]
+            seed = int(snaps[2][i])
+            surface_no = Vector(snaps[1][i])
             
             
             if i == 0:
@@ -569,14 +682,19 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
             self.backbone.append(vertebra3d)
            
     def smooth_normals_com(self,context,ob,bme,iterations = 5):
+        for step in self.iter_smooth_normals_com(context, ob, bme, iterations):
+            pass
         
-        com_path = []
+    def iter_smooth_normals_com(self,context,ob,bme,iterations = 5):
+        '''
+        generator version of smooth_normals_com, re-slices one cut per step
+        '''
         normals = []
         
         for cut in self.cuts:
             if not cut.plane_com:
                 cut.update_com()
-            com_path.append(cut.plane_com)
+        com_path = [cut.plane_com for cut in self.cuts]
         
         for i, com in enumerate(com_path):
             if i == 0:
@@ -609,16 +727,24 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         for i, cut in enumerate(self.cuts):
             cut.plane_no = normals[i]
             cut.cut_object(context, ob,  bme)
-            cut.simplify_cross(self.ring_segments)
+            self.resample_cut(cut)
             if i == 0 and self.existing_head:
                 self.cuts[0].align_to_other(self.existing_head)
             if i > 0:
                 self.align_cut(cut, mode='BEHIND', fine_grain='TRUE')
             cut.update_com()
             cut.generic_3_axis_from_normal()
+            
+            yield (i + 1, len(self.cuts))
                
     def average_normals(self,context,ob,bme):
+        for step in self.iter_average_normals(context, ob, bme):
+            pass
         
+    def iter_average_normals(self,context,ob,bme):
+        '''
+        generator version of average_normals, re-slices one cut per step
+        '''
         if self.seg_lock:
             self.cut_points = [cut.verts_simple[0] for cut in self.cuts]
         
@@ -643,23 +769,32 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         for i, cut in enumerate(self.cuts):
             cut.plane_no = avg_normal
             cut.cut_object(context, ob,  bme)
-            cut.simplify_cross(self.ring_segments)
+            self.resample_cut(cut)
             if i == 0 and self.existing_head:
                 self.cuts[0].align_to_other(self.existing_head)
             if i > 0:
                 self.align_cut(cut, mode='BEHIND', fine_grain='TRUE')
             cut.update_com()
             cut.generic_3_axis_from_normal()
+            
+            yield (i + 1, len(self.cuts))
          
     def interpolate_endpoints(self,context,ob,bme,cut1 = None, cut2 = None):
         '''
         will interpolate normals between the endpoints of the CutSeries
         or between two selected cuts
         
+        '''
+        for step in self.iter_interpolate_endpoints(context, ob, bme, cut1, cut2):
+            pass
+        
+    def iter_interpolate_endpoints(self,context,ob,bme,cut1 = None, cut2 = None):
+        '''
+        generator version of interpolate_endpoints, re-slices one cut per step
         '''
         if len(self.cuts) < 3:
             print('not valid for interpolation')
-            return False
+            return
         
         if cut1 and cut2 and cut1 in self.cuts and cut2 in self.cuts:
             start = self.cuts.index(cut1)
@@ -690,7 +825,7 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
             print((i+1)/(end-start))
             self.cuts[start + i+1].plane_no = no_initial.lerp(no_final, (i+1)/(end-start))
             self.cuts[start + i+1].cut_object(context, ob,  bme)
-            self.cuts[start + i+1].simplify_cross(self.ring_segments)
+            self.resample_cut(self.cuts[start + i+1])
             
 
                     
@@ -698,13 +833,36 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
                 self.align_cut(self.cuts[start + i+1], mode='BEHIND', fine_grain='TRUE')
             self.cuts[start + i+1].update_com()
             
+            yield (i + 1, interps)
+            
         
         self.align_cut(self.cuts[end-1], mode='BEHIND', fine_grain='TRUE')
         self.align_cut(self.cuts[end], mode='BEHIND', fine_grain='TRUE')
     
+    def resample_cut(self, cut, refit = True):
+        '''
+        simplify_cross at ring_segments, or with adaptive vertex counts
+        the fewest up to ring_segments which stay within vert_tolerance.
+        refit = False keeps the count the cut has, eg when shifting it
+        '''
+        if not self.vert_tolerance:
+            cut.simplify_cross(self.ring_segments)
+        elif refit or not len(cut.eds_simple):
+            cut.fit_cross(self.ring_segments, self.vert_tolerance)
+        else:
+            cut.simplify_cross(len(cut.eds_simple))
+    
+    def iter_resample_rings(self):
+        '''
+        re-simplifies every cut at the current ring_segments, one cut per step
+        '''
+        for i, cut in enumerate(self.cuts):
+            self.resample_cut(cut)
+            yield (i + 1, len(self.cuts))
+    
     def clean_cuts(self):
         for cut in self.cuts:
-            if not len(cut.verts) or not len(cut.verts_simple):
+            if not cut.high_res_count() or not len(cut.verts_simple):
                 self.cuts.remove(cut)
                 print('##################################')
                 print('##################################')
@@ -735,40 +893,17 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
             self.follow_lines = []
             return
         
-        imx = ob.matrix_world.inverted()
-        n_rings = len(self.cuts)
+        imx = np.array(ob.matrix_world.inverted())
         
-        if self.existing_head != None:
-            n_rings += 1
-        if self.existing_tail != None:
-            n_rings += 1
-            
+        rings = self.all_rings()
+        counts = [len(ring.verts_simple) for ring in rings]
+        starts = [0]
+        for n in counts[:-1]:
+            starts.append(starts[-1] + n)
         
-        if len(self.cuts):
-            n_lines = len(self.cuts[0].verts_simple)
-        elif self.existing_head:
-            n_lines = len(self.existing_head.verts_simple)
-        
-        if self.existing_head != None:
-            for v in self.existing_head.verts_simple:
-                total_verts.append(imx * v)
-                    
-        #work out the connectivity edges
-        for i, cut_line in enumerate(self.cuts):
-            for v in cut_line.verts_simple:
-                total_verts.append(imx * v)
-            for ed in cut_line.eds_simple:
-                total_edges.append((ed[0]+i*n_lines,ed[1]+i*n_lines))
-            
-            if i < n_rings - 1:
-                #make connections between loops
-                for j in range(0,n_lines):
-                    total_edges.append((i*n_lines + j, (i+1)*n_lines + j))
-
-        if self.existing_tail != None:
-            for v in self.existing_tail.verts_simple:
-                total_verts.append(imx * v)
-                
+        #every ring's verts, head to tail, straight out of their buffers
+        coords = np.concatenate([contour_utilities.vert_array(ring.verts_simple) for ring in rings])
+        total_verts.extend(Vector(v) for v in contour_utilities.transform_points(imx, coords))
         
         if len(self.cuts):        
             cyclic = 0 in self.cuts[0].eds_simple[-1]
@@ -777,65 +912,83 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         elif self.existing_tail:
             cyclic = 0 in self.existing_tail.eds_simple[-1]
         
-        #work out the connectivity faces:
-        for j in range(0,n_rings - 1):
-            for i in range(0,n_lines-1):
-                ind0 = j * n_lines + i
-                ind1 = j * n_lines + (i + 1)
-                ind2 = (j + 1) * n_lines + (i + 1)
-                ind3 = (j + 1) * n_lines + i
-                total_faces.append((ind0,ind1,ind2,ind3))
+        #the existing loops' own edges are already in the mesh
+        for r, ring in enumerate(rings):
+            if ring is not self.existing_head and ring is not self.existing_tail:
+                total_edges.extend((ed[0] + starts[r], ed[1] + starts[r]) for ed in ring.eds_simple)
+        
+        #work out the connectivity between loops
+        links = []
+        for r in range(0, len(rings) - 1):
+            n_lines = counts[r]
+            i0 = starts[r]
+            i1 = starts[r + 1]
+            
+            if counts[r + 1] != n_lines:
+                #transition ring, zip the two counts together
+                faces, strip = contour_utilities.stitch_loops(coords[i0:i1], coords[i1:i1 + counts[r + 1]], cyclic)
+                total_faces.extend(tuple(i0 + i for i in face) for face in faces)
+                total_edges.extend((i0 + a, i0 + b) for a, b in strip)
+                links.extend((i0 + a, i0 + b) for a, b in strip)
+                continue
+            
+            for j in range(0,n_lines):
+                total_edges.append((i0 + j, i1 + j))
+            
+            for j in range(0,n_lines-1):
+                total_faces.append((i0 + j, i0 + j + 1, i1 + j + 1, i1 + j))
             
             if cyclic:
-                ind0 = (j + 1) * n_lines - 1
-                ind1 = j * n_lines + int(math.fmod((j+1)*n_lines, n_lines))
-                ind2 = ind0 + 1
-                ind3 = ind0 + n_lines
-                total_faces.append((ind0,ind1,ind2,ind3))
-                
-        
-        #assert all(len(cut.verts_simple) == n_lines for cut in self.cuts)
+                total_faces.append((i0 + n_lines - 1, i0, i1, i1 + n_lines - 1))
         
+        #the nth vert of every ring in each stretch of rings with the
+        #same count, and two vert lines across the transitions
         self.follow_lines = []
-        for i in range(0,n_lines):
-            tmp_line = []
-            
-            if self.existing_head:
-                tmp_line.append(self.existing_head.verts_simple[i])
-            
-            for cut_line in self.cuts:
-                tmp_line.append(cut_line.verts_simple[i])
-                
-            if self.existing_tail:
-                tmp_line.append(self.existing_tail.verts_simple[i])
-                
-            self.follow_lines.append(tmp_line)
+        r0 = 0
+        for r in range(1, len(rings) + 1):
+            if r < len(rings) and counts[r] == counts[r0]:
+                continue
+            n = counts[r0]
+            self.follow_lines.extend(range(starts[r0] + i, starts[r0] + i + n * (r - r0), n) for i in range(n))
+            r0 = r
+        self.follow_lines.extend(links)
 
 
         self.verts = total_verts
         self.faces = total_faces
         self.edges = total_edges
         
-    def update_visibility(self, context, ob):    
+    def all_rings(self):
+        '''
+        the cuts, with the existing loops at either end
+        '''
+        rings = self.cuts[:]
+        if self.existing_head != None:
+            rings.insert(0, self.existing_head)
+        if self.existing_tail != None:
+            rings.append(self.existing_tail)
+        return rings
+        
+    def update_visibility(self, context, ob, occlude = True):
+        '''
+        occlude:  False skips the ray casting and marks everything
+        visible, used when the frame budget is tight
+        '''
         region = context.region  
         rv3d = context.space_data.region_3d
         
         #update the individual rings
         for cut in self.cuts:
-            cut.update_visibility(context, ob)
+            cut.update_visibility(context, ob, occlude = occlude)
             
         if self.existing_head:
-            self.existing_head.update_visibility(context, ob)
+            self.existing_head.update_visibility(context, ob, occlude = occlude)
         if self.existing_tail:
-            self.existing_tail.update_visibility(context, ob)
+            self.existing_tail.update_visibility(context, ob, occlude = occlude)
         
-        #update connecting edges between ring
-        if context.space_data.use_occlude_geometry:
-            rv3d = context.space_data.region_3d
-            is_vis = contour_utilities.ray_cast_visible
-            self.follow_vis = [is_vis(vert_list, ob, rv3d) for vert_list in self.follow_lines]
-        else:
-            self.follow_vis = [[True]*len(vert_list) for vert_list in self.follow_lines]
+        #the connecting edges run through the rings' verts, so
+        #they are as visible as the rings are
+        self.follow_vis = [vis for ring in self.all_rings() for vis in ring.verts_simple_visible]
             
     def insert_new_cut(self,context, ob, bme, new_cut, search = 5):
         '''
@@ -864,7 +1017,7 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
             
             self.cuts.append(new_cut)
             self.world_path.append(new_cut.verts_simple[0])
-            if self.ring_segments != len(new_cut.verts_simple): #TODO: Nomenclature consistency
+            if self.ring_segments != len(new_cut.verts_simple) and not self.vert_tolerance: #TODO: Nomenclature consistency
                 self.ring_segments = len(new_cut.verts_simple)
                 
             self.segments = 1
@@ -948,7 +1101,7 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
                     new_cut.verts = contour_utilities.list_shift(new_cut.verts,-1)
                     
                 #make sure the new cut has the appropriate number of cuts
-                new_cut.simplify_cross(self.ring_segments)    
+                self.resample_cut(new_cut)    
 
                 #align the cut, update the backbone etc
                 self.align_cut(new_cut, mode = 'BEHIND', fine_grain = True)
@@ -962,83 +1115,78 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
                 return False
         
         
-        if self.existing_head and self.cuts:
-            if settings.debug > 1: print('True: self.existing_head and self.cuts')
+        #every gap the new cut could go in, between the existing head
+        #and the first cut and then between the cuts in order, is
+        #tested at once. The first one the new cut crosses wins
+        rings = ([self.existing_head] if self.existing_head else []) + self.cuts
+        A = np.array([ring.plane_com for ring in rings[:-1]], dtype = np.float64)
+        B = np.array([ring.plane_com for ring in rings[1:]], dtype = np.float64)
+        no_A = np.array([ring.plane_no for ring in rings[:-1]], dtype = np.float64)
+        no_B = np.array([ring.plane_no for ring in rings[1:]], dtype = np.float64)
+        
+        C, crossed = contour_utilities.line_plane_crossings(A, B, new_cut.plane_com, new_cut.plane_no)
+        crossed &= ((C - A) * no_A).sum(axis = 1) > 0
+        crossed &= ((C - B) * no_B).sum(axis = 1) < 0
+        crossed &= contour_utilities.points_inside_loops(C, [new_cut.verts_simple], [new_cut.plane_no], [new_cut.plane_com], threshold = .01, bbox = True)[:,0]
+        
+        gaps = np.nonzero(crossed)[0]
+        gap = int(gaps[0]) - (self.existing_head != None) if len(gaps) else None
+        if settings.debug > 1: print('crossed gaps = ' + str(gaps))
+        
+        if gap == -1:
+            print('found an intersection between existing head and first loop')
             
             A = self.existing_head.plane_com  #the center of the head
             B = self.cuts[0].plane_com  #the first cut
-            C = intersect_line_plane(A,B,new_cut.plane_com, new_cut.plane_no) #the intersection of a the line between the head and first cut
             
-            test1 = self.existing_head.plane_no.dot(C-A) > 0
-            test2 = self.cuts[0].plane_no.dot(C-B) < 0
-            if C and test1 and test2:
-                if settings.debug > 1: print('True: C and test1 and test2')
-                valid = contour_utilities.point_inside_loop_almost3D(C, new_cut.verts_simple, new_cut.plane_no, new_cut.plane_com, threshold = .01, bbox = True)
-                if valid:
-                    print('found an intersection between existing head and first loop')
+            #check the plane normal
+            if new_cut.plane_no.dot(B-A) < 0:
+                new_cut.plane_no = -1 * new_cut.plane_no
             
-                    #check the plane normal
-                    if new_cut.plane_no.dot(B-A) < 0:
-                        new_cut.plane_no = -1 * new_cut.plane_no
-                    
-                    #check the spin    
-                    spin = contour_utilities.discrete_curl(new_cut.verts_simple, new_cut.plane_no)
-                    if spin < 0:
-                        new_cut.verts.reverse()
-                        new_cut.verts = contour_utilities.list_shift(new_cut.verts,-1)
-                       
-                        
-                    self.cuts.insert(0, new_cut)
-                    self.segments += 1
-                    
-                    new_cut.simplify_cross(self.ring_segments)
-                    self.align_cut(new_cut, mode = 'BETWEEN', fine_grain = True)
-                    self.backbone_from_cuts(context, ob, bme)
-                    #self.update_backbone(context, ob, bme, new_cut, insert = True)
-                    return True
-            if settings.debug > 1: print('falling through')
+            #check the spin    
+            spin = contour_utilities.discrete_curl(new_cut.verts_simple, new_cut.plane_no)
+            if spin < 0:
+                new_cut.verts.reverse()
+                new_cut.verts = contour_utilities.list_shift(new_cut.verts,-1)
+               
+                
+            self.cuts.insert(0, new_cut)
+            self.segments += 1
+            
+            self.resample_cut(new_cut)
+            self.align_cut(new_cut, mode = 'BETWEEN', fine_grain = True)
+            self.backbone_from_cuts(context, ob, bme)
+            #self.update_backbone(context, ob, bme, new_cut, insert = True)
+            return True
         
-        if settings.debug > 1: print('checking between cuts')
-        #Assume the cuts in the series are in order
-        #Check in between all the cuts
-        for i in range(0,len(self.cuts) -1):
+        if gap is not None:
+            i = gap
+            print('found an intersection at the %i loop' % i)
+            
             A = self.cuts[i].plane_com
             B = self.cuts[i+1].plane_com
             
-            C = intersect_line_plane(A,B,new_cut.plane_com, new_cut.plane_no)
+            if new_cut.plane_no.dot(B-A) < 0:
+                
+                new_cut.plane_no = -1 * new_cut.plane_no
+                
+            spin = contour_utilities.discrete_curl(new_cut.verts_simple, new_cut.plane_no)
+            if spin < 0:
+                new_cut.verts_simple.reverse()
+                new_cut.verts.reverse()
+                new_cut.verts = contour_utilities.list_shift(new_cut.verts,-1)
+                new_cut.verts_simple = contour_utilities.list_shift(new_cut.verts_simple,-1)
+                
+            self.cuts.insert(i+1, new_cut)
+            self.segments += 1
             
-            test1 = self.cuts[i].plane_no.dot(C-A) > 0
-            test2 = self.cuts[i+1].plane_no.dot(C-B) < 0
+            self.resample_cut(new_cut)
+            self.align_cut(new_cut, mode = 'BETWEEN', fine_grain = True)
+            self.update_backbone(context, ob, bme, new_cut, insert = True)
+            return True
             
-            if C and test1 and test2:
-                valid = contour_utilities.point_inside_loop_almost3D(C, new_cut.verts_simple, new_cut.plane_no, new_cut.plane_com, threshold = .01, bbox = True)
-                if valid:
-                    print('found an intersection at the %i loop' % i)
-                    
-                    if new_cut.plane_no.dot(B-A) < 0:
-                        
-                        new_cut.plane_no = -1 * new_cut.plane_no
-                        
-                    spin = contour_utilities.discrete_curl(new_cut.verts_simple, new_cut.plane_no)
-                    if spin < 0:
-                        new_cut.verts_simple.reverse()
-                        new_cut.verts.reverse()
-                        new_cut.verts = contour_utilities.list_shift(new_cut.verts,-1)
-                        new_cut.verts_simple = contour_utilities.list_shift(new_cut.verts_simple,-1)
-                        
-                    self.cuts.insert(i+1, new_cut)
-                    self.segments += 1
-                    #add an element to the visibility list
-                    for vis in self.follow_vis:
-                        vis.insert(i+1, True)
-                    
-                    new_cut.simplify_cross(self.ring_segments)
-                    self.align_cut(new_cut, mode = 'BETWEEN', fine_grain = True)
-                    self.update_backbone(context, ob, bme, new_cut, insert = True)
-                    return True
-                
-            #Check the enpoints
-            #TODO: Unless there is an existing vert loop endpoint
+        #Check the enpoints
+        #TODO: Unless there is an existing vert loop endpoint
             
         
         if len(self.cuts) > 1:
@@ -1085,7 +1233,7 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
                     
                     self.cuts.insert(0, new_cut)
                     self.segments += 1
-                    new_cut.simplify_cross(self.ring_segments)
+                    self.resample_cut(new_cut)
                     self.align_cut(new_cut, mode = 'AHEAD', fine_grain = True)
                     self.update_backbone(context, ob, bme, new_cut, insert = True)
                     return True
@@ -1124,7 +1272,7 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
                 
                 self.cuts.append(new_cut)
                 self.segments += 1
-                new_cut.simplify_cross(self.ring_segments)
+                self.resample_cut(new_cut)
                 self.align_cut(new_cut, mode = 'BEHIND', fine_grain = True)
                 self.update_backbone(context, ob, bme, new_cut, insert = True)
                 return True
@@ -1275,18 +1423,25 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         
         Prerequisites: ray_cast_path, find knots, smooth path
         '''
+        for step in self.iter_snap_merge_into_other(merge_series, merge_ring, context, ob, bme):
+            pass
+        
+    def iter_snap_merge_into_other(self, merge_series, merge_ring, context, ob, bme):
+        '''
+        generator version of snap_merge_into_other, the new cuts are made
+        one per step, the merge itself happens all at once at the end
+        '''
         
         #find closest point in snap ring to beginning of path
         #by default, only originating extensions are eligible
         #not paths which are drawn and terminate on a snap
         #ring
         
-        dists = [(self.raw_world[0] - v).length for v in merge_ring.verts_simple]
-        best_index = dists.index(min(dists))
+        best_index = ring_tree(merge_ring).find(self.raw_world[0])[0]
     
         #snap the world path to that vert
         self.raw_world = contour_utilities.fit_path_to_endpoints(self.raw_world, merge_ring.verts_simple[best_index], self.raw_world[-1])
-        self.smooth_path(context, ob = ob)
+        world, faces = self.smooth_path(context, ob = ob)
         self.ring_segments = merge_series.ring_segments
         
         if merge_ring.desc == 'EXISTING_VERT_LIST':
@@ -1314,13 +1469,12 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
         path_length = contour_utilities.get_path_length(self.world_path)
         self.segments  = math.ceil(path_length/segment_width)
     
-        self.create_cut_nodes(context, knots = False)
-        
-        
-                
-        
-        self.snap_to_object(ob, raw = False, world = False, cuts = True)
-        self.cuts_on_path(context,ob,bme)
+        #adaptive placement spaces them like a new stroke, otherwise
+        #they match the spacing of the series being merged into
+        nodes, inds = self.create_cut_nodes(context, knots = False, world = world, ob = ob, fit = True)
+        self.snap_to_object(ob, raw = False, world = False, cuts = True, cut_faces = faces[inds])
+        for step in self.iter_cuts_on_path(context,ob,bme):
+            yield step
         self.cuts.pop(0)
         
         #if one existing cut....can go either way
@@ -1417,34 +1571,168 @@ class ContourCutSeries(object):  #TODO:  nomenclature consistency. Segment, Segm
                                                           (.2,.2,1, 1), 
                                                           3)   
         if self.follow_lines != [] and settings.show_edges:
-            if not context.space_data.use_occlude_geometry:
-                
-                for follow in self.follow_lines:
-                    contour_utilities.draw_polyline_from_3dpoints(context, follow, 
-                                                          mesh_color, 
-                                                          self.line_thickness,"GL_LINE_STIPPLE")
-
-            else:
-                
-                for i, line in enumerate(self.follow_lines):
-                    for n in range(0,len(line)-1):
-                        if self.follow_vis[i][n] and self.follow_vis[i][n+1]:
-                            contour_utilities.draw_polyline_from_3dpoints(context, [line[n],line[n+1]], 
-                                                          mesh_color, 
-                                                          self.line_thickness,"GL_LINE_STIPPLE")
-
-            # Do the fill for vis-faces
-            fl,fv = self.follow_lines, self.follow_vis
-            leni,lenj = len(fl),len(fl[0])
-            quad_pts = []
-            i1 = leni-1
-            for i0 in range(leni):
-                for j0 in range(lenj-1):
-                    j1 = j0 + 1
-                    if fv[i0][j0] and fv[i1][j0] and fv[i1][j1] and fv[i0][j1]:
-                        quad_pts += [fl[i0][j0], fl[i1][j0], fl[i1][j1], fl[i0][j1]]
-                i1 = i0
-            contour_utilities.draw_quads_from_3dpoints(context, quad_pts, (mesh_color[0],mesh_color[1],mesh_color[2],mesh_color[3]*0.2))
+            #project every ring's verts once, the follow lines and
+            #fill index into them.  If the rings' counts changed since
+            #they were connected (eg updates deferred while transforming)
+            #the indices are stale, so leave them until the next connect
+            coords = np.concatenate([contour_utilities.vert_array(ring.verts_simple) for ring in self.all_rings()])
+            if len(coords) == len(self.verts):
+                screen = contour_utilities.location_3d_to_region_2d_batch(context.region, context.space_data.region_3d, coords)
+                if context.space_data.use_occlude_geometry and len(self.follow_vis) == len(coords):
+                    vis = self.follow_vis
+                else:
+                    vis = [True] * len(coords)
+                
+                for line in self.follow_lines:
+                    if not context.space_data.use_occlude_geometry:
+                        contour_utilities.draw_polyline_from_points(context, screen[list(line)], 
+                                                              mesh_color, 
+                                                              self.line_thickness,"GL_LINE_STIPPLE")
+                        continue
+                    
+                    for a, b in zip(line[:-1], line[1:]):
+                        if vis[a] and vis[b]:
+                            contour_utilities.draw_polyline_from_points(context, screen[[a, b]], 
+                                                              mesh_color, 
+                                                              self.line_thickness,"GL_LINE_STIPPLE")
+    
+                # Do the fill for vis-faces
+                quad_pts = []
+                for face in self.faces:
+                    if all(vis[i] for i in face):
+                        quad = [screen[i] for i in face]
+                        quad_pts += quad + quad[-1:] * (4 - len(quad))  #triangles from the transition rings
+                contour_utilities.draw_quads_from_points(context, quad_pts, (mesh_color[0],mesh_color[1],mesh_color[2],mesh_color[3]*0.2))
+
+
+
+class LiveStroke(object):
+    '''
+    The ray casting and knot finding of a guide stroke, done while it
+    is still being drawn so there is little left to do on release.
+    Points are thinned the same way ContourCutSeries does and cast in
+    batches as they come in.  Where the cut nodes would go if the
+    stroke ended now is kept up to date for a preview, along with
+    rough knots from an online RDP.  Those never split the stroke the
+    way find_knots does over the whole of it, so they are only drawn,
+    the series finds its own knots once the stroke is done.
+    
+    The rings themselves aren't sliced early, their spacing depends
+    on the length of the whole stroke so none of them are final
+    until it's done.
+    '''
+    def __init__(self, context, ob, segments, cull_factor, feature_factor):
+        self.desc = 'LIVE_STROKE'
+        self.ob = ob
+        self.segments = segments
+        self.cull_factor = cull_factor
+        self.feature_factor = feature_factor
+        
+        self.raw_screen = []  #thinned screen points
+        self.pending = []  #thinned but not cast yet
+        self.last = None  #the newest point, thinned away or not, a stroke always ends on it
+        
+        self.raw_world = []
+        self.raw_faces = []
+        self.world = np.zeros((0,3))
+        self.knots = [0]
+        
+        self.preview = []  #world locations of the cut nodes so far
+    
+    def add_point(self, co):
+        self.last = co
+        if self.raw_screen:
+            x, y = self.raw_screen[-1]
+            if math.hypot(co[0] - x, co[1] - y) < self.cull_factor:
+                return
+        self.raw_screen.append(co)
+        self.pending.append(co)
+    
+    def update(self, context):
+        '''
+        cast whatever came in since last time
+        '''
+        if not self.pending:
+            return
+        
+        settings = context.user_preferences.addons[AL.FolderName].preferences
+        region = context.region
+        rv3d = context.space_data.region_3d
+        hits, normals, faces = contour_utilities.ray_cast_region2d_batch(region, rv3d, self.pending, self.ob, settings, form_bvh(self.ob))
+        self.pending = []
+        
+        hit = faces != -1
+        if not hit.any():
+            return
+        self.raw_world.extend(Vector(v) for v in hits[hit])
+        self.raw_faces.extend(faces[hit].tolist())
+        self.world = np.vstack((self.world, hits[hit]))
+        
+        self.extend_knots()
+        self.update_preview()
+    
+    def extend_knots(self):
+        '''
+        Online RDP, for the preview.  The stretch since the last knot is
+        checked against the chord to the newest point, and the furthest
+        point becomes a knot once it's far enough off.  The error is a
+        fraction of the bbox diagonal of the stroke so far.
+        '''
+        if len(self.world) < 3:
+            return
+        error = np.sqrt(((self.world.max(axis = 0) - self.world.min(axis = 0))**2).sum()) / self.feature_factor
+        
+        while len(self.world) - self.knots[-1] >= 3:
+            span = self.world[self.knots[-1]:]
+            alti = contour_utilities.point_line_distances(span[1:-1], span[0], span[-1])
+            i = np.argmax(alti)
+            if alti[i] < error:
+                break
+            self.knots.append(self.knots[-1] + 1 + int(i))
+    
+    def update_preview(self):
+        if len(self.world) < 2:
+            self.preview = []
+            return
+        cumulative = contour_utilities.cumulative_lengths(self.world)
+        targets = np.linspace(0, cumulative[-1], max(self.segments, 1) + 1)
+        nodes = contour_utilities.points_along_path(self.world, cumulative, targets)[0]
+        self.preview = [Vector(v) for v in nodes]
+    
+    def finish(self, context):
+        '''
+        the end of the stroke is always kept, then the last few
+        points are cast.  Afterwards raw_screen, raw_world and raw_faces
+        are what ray_cast_path would give.  knots are still only the
+        preview ones
+        '''
+        if self.last != None and (not self.raw_screen or tuple(self.raw_screen[-1]) != tuple(self.last)):
+            self.raw_screen.append(self.last)
+            self.pending.append(self.last)
+        self.update(context)
+        
+        if len(self.raw_world) > 1 and self.knots[-1] != len(self.raw_world) - 1:
+            self.knots.append(len(self.raw_world) - 1)
+    
+    def draw(self, context, color):
+        '''
+        a tick across the stroke where each ring would go, and a
+        dot on each knot so far
+        '''
+        region = context.region
+        rv3d = context.space_data.region_3d
+        if len(self.knots) > 1:
+            contour_utilities.draw_3d_points(context, [self.raw_world[k] for k in self.knots if k < len(self.raw_world)], color, 4)
+        pts = [location_3d_to_region_2d(region, rv3d, v) for v in self.preview]
+        for i, pt in enumerate(pts):
+            if pt == None:
+                continue
+            a = pts[max(i - 1, 0)]
+            b = pts[min(i + 1, len(pts) - 1)]
+            if a == None or b == None or (b - a).length == 0:
+                continue
+            perp = Vector((a[1] - b[1], b[0] - a[0])).normalized() * 10
+            contour_utilities.draw_polyline_from_points(context, [pt - perp, pt + perp], color, 2, "GL_LINE_SMOOTH")
                 
 class ContourControlPoint(object):
     
@@ -1499,43 +1787,29 @@ class ExistingVertList(object):
         self.vert_inds_unsorted = [vert.index for vert in verts]
         
         if key_type == 'EDGES':
-            edge_keys = [[ed.verts[0].index, ed.verts[1].index] for ed in keys]
-            remaining_keys = [i for i in range(1,len(edge_keys))]
-            vert_inds_sorted = [edge_keys[0][0], edge_keys[0][1]]
-        
-            iterations = 0
-            max_iters = math.factorial(len(remaining_keys))
-            while len(remaining_keys) > 0 and iterations < max_iters:
-                print(remaining_keys)
-                iterations += 1
-                for key_index in remaining_keys:
-                    l = len(vert_inds_sorted) -1
-                    key_set = set(edge_keys[key_index])
-                    last_v = {vert_inds_sorted[l]}
-                    if  key_set & last_v:
-                        vert_inds_sorted.append(int(list(key_set - last_v)[0]))
-                        remaining_keys.remove(key_index)
-                        break
+            edge_keys = [(ed.verts[0].index, ed.verts[1].index) for ed in keys]
+            loops = contour_utilities.chain_edge_loops(edge_keys)
+            if len(loops) > 1:
+                print('%i separate edge chains, only using the first' % len(loops))
+            vert_inds_sorted, cyclic = loops[0]
                     
         elif key_type == 'INDS':
             
             vert_inds_sorted = keys
         
-        if vert_inds_sorted[0] == vert_inds_sorted[-1]:
-            cyclic = True
-            vert_inds_sorted.pop() #clean out that last vert!
-            
-        else:
-            cyclic = False
+            if vert_inds_sorted[0] == vert_inds_sorted[-1]:
+                cyclic = True
+                vert_inds_sorted.pop() #clean out that last vert!
+                
+            else:
+                cyclic = False
             
         self.eds_simple = [[i,i+1] for i in range(0,len(vert_inds_sorted)-1)]
         if cyclic:
             self.eds_simple.append([len(vert_inds_sorted)-1,0])
-            
-        self.verts_simple = []
-        for i in vert_inds_sorted:
-            v = verts[self.vert_inds_unsorted.index(i)]
-            self.verts_simple.append(mx * v.co)
+        
+        by_index = {vert.index: vert for vert in verts}
+        self.verts_simple = [mx * by_index[i].co for i in vert_inds_sorted]
         
         self.verts_simple_visible = [True] * len(self.verts_simple)
          
@@ -1551,8 +1825,7 @@ class ExistingVertList(object):
     def derive_normal(self):
         
         if self.verts_simple != []:
-            #com, normal = contour_utilities.calculate_best_plane(self.verts_simple)
-            com,normal = contour_utilities.calculate_com_normal(self.verts_simple)
+            com, normal, residual = contour_utilities.calculate_best_plane(self.verts_simple)
             
         self.plane_no = normal
         self.plane_com = com
@@ -1572,9 +1845,12 @@ class ExistingVertList(object):
         
 
         
+        cyclic = len(other.eds_simple) and 0 in other.eds_simple[-1]
+        other_verts = contour_utilities.match_loop_count(other.verts_simple, cyclic, len(self.verts_simple))
+        
         ideal_to_com = 0
         for i, v in enumerate(self.verts_simple):
-            connector = v - other.verts_simple[i]  #continue convention of final - initial :: self - other
+            connector = v - other_verts[i]  #continue convention of final - initial :: self - other
             connector.normalize()
             align = connector.dot(delta_com_vect)
             #this shouldnt happen but it appears to be...shrug
@@ -1604,10 +1880,8 @@ class ExistingVertList(object):
             cyclic = False
         
         if len(verts_1) != len(self.verts_simple):
-            #print(len(verts_1))
-            #print(len(self.verts_simple))
-            print('non uniform loops, stopping until your developer gets smarter')
-            return
+            #line up against the other loop respaced to our count
+            verts_1 = contour_utilities.match_loop_count(verts_1, cyclic, len(self.verts_simple))
             
         if cyclic:
             if other.plane_no.dot(self.plane_no) < 0:
@@ -1654,8 +1928,8 @@ class ExistingVertList(object):
                 self.verts_simple.reverse()
                 self.vert_inds_unsorted.reverse()
                 
-    def update_visibility(self,context,ob):
-        if context.space_data.use_occlude_geometry:
+    def update_visibility(self,context,ob, occlude = True):
+        if context.space_data.use_occlude_geometry and occlude:
             #TODO: should the following be uncommented?
             #self.visible_poly = []
             #self.visible_u = []
@@ -1743,8 +2017,27 @@ class ExistingVertList(object):
 
 class ContourCutLine(object): 
     
+    #there can be thousands of these, and the geometry is kept in
+    #packed arrays (see contour_arrays) rather than lists of Vectors
+    __slots__ = ('desc', 'select', 'is_highlighted', 'head', 'tail', 'target', 'updated',
+                 'plane_pt', 'plane_com', 'plane_no', 'plane_x', 'plane_y', 'plane_z',
+                 'vec_x', 'vec_y', 'seed_face_index', 'crossed_faces',
+                 '_verts', '_verts_screen', '_edges', '_verts_simple', '_verts_simple_visible',
+                 '_eds_simple', '_verts_simple_screen',
+                 'shift', 'int_shift', 'feature_resample',
+                 'geom_color', 'line_width', 'undo_record', '_released')
+    
+    verts_screen = packed_property('_verts_screen', as_screen_vectors)
+    verts_simple = packed_property('_verts_simple', as_vectors)
+    verts_simple_visible = packed_property('_verts_simple_visible', as_flags)
+    eds_simple = packed_property('_eds_simple', as_edges)
+    verts_simple_screen = packed_property('_verts_simple_screen', as_screen_vectors)
+    
     def __init__(self, x, y, line_width = 3):
         
+        #high res loop that has been compressed or dropped, see release_verts
+        self._released = None
+        
         self.desc = "CUT_LINE"
         self.select = False
         self.is_highlighted = False
@@ -1771,6 +2064,8 @@ class ContourCutLine(object):
         #self.vec_z is the plane normal
         
         self.seed_face_index = None
+        #faces the last cross section passed through, to warm start the next
+        self.crossed_faces = []
         
         #high res coss section
         #@ resolution of original mesh
@@ -1788,11 +2083,170 @@ class ContourCutLine(object):
         #variable used to shift loop beginning on high res loop
         self.shift = 0
         self.int_shift = 0
+        
+        #set by fit_cross, verts_simple follow the corners of the loop
+        self.feature_resample = False
+        
+        self.undo_record = None
 
+    
+    @property
+    def verts(self):
+        if self._verts is None:
+            self.restore_verts()
+        return self._verts
+    
+    @verts.setter
+    def verts(self, verts):
+        self._verts = as_vectors(verts)
+        self._verts.touch()
+        if getattr(self, '_edges', None) is not None:
+            self._released = None
+    
+    @property
+    def edges(self):
+        if self._edges is None:
+            self.restore_verts()
+        return self._edges
+    
+    @edges.setter
+    def edges(self, edges):
+        self._edges = as_edges(edges)
+        self._edges.touch()
+        if getattr(self, '_verts', None) is not None:
+            self._released = None
+    
+    def release_verts(self, policy):
+        '''
+        Once a cut is done being edited, the high res loop is only
+        needed again if the cut gets re-simplified or realigned.
+        Reading verts or edges brings it back, bit for bit.
+        
+        policy - enum in {'KEEP', 'ZLIB', 'REGENERATE'}
+            ZLIB compresses the packed loop
+            REGENERATE keeps only what's needed to cut it again. If
+            cutting again doesn't give exactly the same loop (eg it
+            was shifted or merged since) it falls back to ZLIB
+        '''
+        if policy == 'KEEP' or self._released or len(self._verts) < 2:
+            return
+        
+        head = (tuple(self._verts[0]), tuple(self._verts[1]))
+        counts = (len(self._verts), len(self._edges))
+        
+        if policy == 'REGENERATE':
+            recipe = self.regeneration_recipe()
+            if recipe:
+                self._released = ('REGENERATE', counts, head, recipe)
+                self._verts = None
+                self._edges = None
+                return
+        
+        payload = (zlib.compress(self._verts.data.tobytes(), 1), zlib.compress(self._edges.data.tobytes(), 1))
+        self._released = ('ZLIB', counts, head, payload)
+        self._verts = None
+        self._edges = None
+        
+    def regeneration_recipe(self):
+        '''
+        cuts the loop again from the current plane and seed, and works
+        out the reversal and rotation that turn it into the loop we
+        have.  Returns None unless the result is identical
+        '''
+        if not cut_source or not self.plane_pt or not self.plane_no or self.seed_face_index == None:
+            return None
+        
+        recipe = (tuple(self.plane_pt), tuple(self.plane_no), self.seed_face_index)
+        verts, edges = self.regenerate(recipe + (False, 0))
+        if verts is None or len(verts) != len(self._verts) or edges.data != self._edges.data:
+            return None
+        
+        #look for our first vert in the new loop, both ways around
+        first = self._verts.data[0:3]
+        for reverse in (False, True):
+            if reverse:
+                verts.reverse()
+            for i in range(len(verts)):
+                if verts.data[3*i:3*i+3] == first:
+                    if contour_utilities.list_shift(verts, i).data == self._verts.data:
+                        return recipe + (reverse, i)
+        return None
+    
+    def regenerate(self, recipe):
+        pt, no, seed, reverse, rotation = recipe
+        ob = cut_source['ob']
+        mx = ob.matrix_world
+        cross = contour_utilities.cross_section_seed(cut_source['bme'], mx, Vector(pt), Vector(no), seed, debug = False, method = cut_source['method'], bvh = cut_source['bvh'])
+        if not cross or not cross[0] or not cross[1]:
+            return None, None
+        
+        verts = VectorArray([mx*v for v in cross[0]])
+        if reverse:
+            verts.reverse()
+        if rotation:
+            verts = contour_utilities.list_shift(verts, rotation)
+        return verts, EdgeArray(cross[1])
+        
+    def restore_verts(self):
+        '''
+        brings back a released high res loop, only filling in
+        verts or edges if they haven't been replaced since
+        '''
+        policy, counts, head, payload = self._released
+        if policy == 'ZLIB':
+            verts = from_bytes(VectorArray(), zlib.decompress(payload[0]))
+            edges = from_bytes(EdgeArray(), zlib.decompress(payload[1]))
+        else:
+            verts, edges = self.regenerate(payload)
+            if verts is None:
+                print('could not regenerate the high res loop!')
+                verts, edges = VectorArray(), EdgeArray()
+        
+        self._released = None
+        if self._verts is None:
+            self._verts = verts
+        if self._edges is None:
+            self._edges = edges
+    
+    def high_res_released(self):
+        return bool(self._released)
+    
+    def high_res_count(self):
+        '''
+        number of high res verts, without restoring a released loop
+        '''
+        if self._released:
+            return self._released[1][0]
+        return len(self._verts)
+    
+    def high_res_head(self):
+        '''
+        first two high res verts, without restoring a released loop
+        '''
+        if self._released:
+            return [Vector(v) for v in self._released[2]]
+        return list(self._verts[0:2])
+    
+    def high_res_nbytes(self):
+        '''
+        (bytes the high res loop takes when loaded, bytes it takes now)
+        '''
+        if not self._released:
+            n = self._verts.nbytes() + self._edges.nbytes()
+            return n, n
+        
+        policy, counts, head, payload = self._released
+        full = 12 * counts[0] + 8 * counts[1]
+        if policy == 'ZLIB':
+            return full, len(payload[0]) + len(payload[1])
+        return full, 0
         
     def update_screen_coords(self,context):
-        self.verts_screen = [location_3d_to_region_2d(context.region, context.space_data.region_3d, loc) for loc in self.verts]
-        self.verts_simple_screen = [location_3d_to_region_2d(context.region, context.space_data.region_3d, loc) for loc in self.verts_simple]
+        region = context.region
+        rv3d = context.space_data.region_3d
+        for slot, verts in (('_verts_screen', self.verts), ('_verts_simple_screen', self.verts_simple)):
+            coords = contour_utilities.location_3d_to_region_2d_batch(region, rv3d, verts)
+            setattr(self, slot, from_bytes(VectorArray(size = 2), coords.astype(np.float32).tobytes()))
     
     def highlight(self,settings):
         self.is_highlighted = True
@@ -1810,8 +2264,8 @@ class ContourCutLine(object):
         self.unhighlight(settings)
         
         
-    def update_visibility(self,context,ob):
-        if context.space_data.use_occlude_geometry:
+    def update_visibility(self,context,ob, occlude = True):
+        if context.space_data.use_occlude_geometry and occlude:
             rv3d = context.space_data.region_3d
             self.verts_simple_visible  = contour_utilities.ray_cast_visible(self.verts_simple, ob, rv3d)
             #TODO: should the following be uncommented?
@@ -1894,7 +2348,7 @@ class ContourCutLine(object):
             #contour_utilities.draw_points(context, [point1], self.head.color, settings.handle_size)
         
         #draw the raw contour vertices
-        if (self.verts and self.verts_simple == []) or (debug > 0 and settings.show_verts):
+        if (self.high_res_count() and self.verts_simple == []) or (debug > 0 and settings.show_verts):
             
             if three_dimensional:
                 
@@ -2031,10 +2485,9 @@ class ContourCutLine(object):
                     return
                 pt = self.plane_pt
                 
-            hits = [ob.ray_cast(imx * pt, imx * (pt + 5 * y)),
-                    ob.ray_cast(imx * pt, imx * (pt + 5 * x)),
-                    ob.ray_cast(imx * pt, imx * (pt - 5 * y)),
-                    ob.ray_cast(imx * pt, imx * (pt - 5 * x))]
+            targets = [imx * (pt + 5 * y), imx * (pt + 5 * x), imx * (pt - 5 * y), imx * (pt - 5 * x)]
+            locs, normals, faces = contour_utilities.ray_cast_local(ob, [imx * pt] * 4, targets, form_bvh(ob))
+            hits = [(Vector(loc), Vector(no), int(face)) for loc, no, face in zip(locs, normals, faces)]
             
 
             dists = []
@@ -2072,30 +2525,128 @@ class ContourCutLine(object):
         self.tail.world_position = region_2d_to_location_3d(region, rv3d, (self.tail.x, self.tail.y),self.plane_pt)
         
           
-    def cut_object(self,context, ob, bme):
+    def cut_object(self,context, ob, bme, warm = False):
+        '''
+        warm:  if the plane only moved a little, try seeding from the
+        faces the previous loop went through instead of the face under
+        plane_pt.  Falls back to a normal cut if the plane wandered off,
+        or if it looks like the loop split, merged or opened/closed
+        '''
         
         mx = ob.matrix_world
         pt = self.plane_pt
         pno = self.plane_no
-        indx = self.seed_face_index
         
         meth = context.user_preferences.addons[AL.FolderName].preferences.new_method
         if pt and pno:
-            cross = contour_utilities.cross_section_seed(bme, mx, pt, pno, indx, debug = True, method = meth)   
+            if warm and meth and self.crossed_faces and self.edges:
+                was_cyclic = 0 in self.edges[-1]
+                warm_seed = contour_utilities.find_warm_seed(bme, mx, pt, pno, self.crossed_faces)
+                if warm_seed != None:
+                    faces = []
+                    cross = contour_utilities.cross_section_seed(bme, mx, pt, pno, warm_seed, debug = False, method = meth, faces = faces, bvh = form_bvh(ob))
+                    
+                    #a split or merged loop comes back with a very different
+                    #vert count or a COM that jumped, and an opened/closed one
+                    #changes its last edge
+                    if (cross and cross[0] and cross[1] and
+                        (0 in cross[1][-1]) == was_cyclic and
+                        self.same_loop([mx*v for v in cross[0]])):
+                        self.verts = [mx*v for v in cross[0]]
+                        self.edges = cross[1]
+                        self.crossed_faces = faces
+                        self.seed_face_index = warm_seed
+                        return
+            
+            #the widget leaves the seed to us when a warm start was possible
+            if self.seed_face_index == None:
+                snap = ob.closest_point_on_mesh(mx.inverted() * pt)
+                self.plane_pt = mx * snap[0]
+                self.seed_face_index = snap[2]
+                pt = self.plane_pt
+            
+            faces = []
+            cross = contour_utilities.cross_section_seed(bme, mx, pt, pno, self.seed_face_index, debug = True, method = meth, faces = faces, bvh = form_bvh(ob))   
             if cross and cross[0] and cross[1]:
                 self.verts = [mx*v for v in cross[0]]
-                self.edges = cross[1]   
+                self.edges = cross[1]
+                self.crossed_faces = faces
         else:
             self.verts = []
             self.edges = []
+            self.crossed_faces = []
+    
+    def same_loop(self, verts, max_ratio = 1.5, max_drift = .5):
+        '''
+        whether verts (world coords) still look like the loop we have,
+        judged by vert count and how far the COM moved compared to the
+        size of the old loop
+        '''
+        n, m = len(self.verts), len(verts)
+        if not n or max(n, m) > max_ratio * min(n, m):
+            return False
+        
+        old = contour_utilities.vert_array(self.verts)
+        new = contour_utilities.vert_array(verts)
+        com = old.mean(0)
+        size = np.sqrt(((old - com)**2).sum(1).max())
+        return np.sqrt(((new.mean(0) - com)**2).sum()) <= max_drift * size
+        
+    def cut_object_proxy(self, context, proxy, proxy_bme):
+        '''
+        quick and dirty cross section of a decimated copy of the
+        form, for previews while the cut is being dragged around.
+        The seed face is looked up on the proxy, seed_face_index is
+        left alone because it belongs to the full resolution form.
+        crossed_faces would index the proxy, so they are dropped
+        '''
+        mx = proxy.matrix_world
+        pt = self.plane_pt
+        pno = self.plane_no
         
+        meth = context.user_preferences.addons[AL.FolderName].preferences.new_method
+        if pt and pno:
+            snap = proxy.closest_point_on_mesh(mx.inverted() * pt)
+            cross = contour_utilities.cross_section_seed(proxy_bme, mx, pt, pno, snap[2], debug = False, method = meth)   
+            if cross and cross[0] and cross[1]:
+                self.verts = [mx*v for v in cross[0]]
+                self.edges = cross[1]
+        else:
+            self.verts = []
+            self.edges = []
+        self.crossed_faces = []
+            
     def simplify_cross(self,segments):
         if self.verts !=[] and self.edges != []:
-            [self.verts_simple, self.eds_simple] = contour_utilities.space_evenly_on_path(self.verts, self.edges, segments, self.shift)
+            if self.feature_resample:
+                cyclic = 0 in self.edges[-1]
+                self.verts_simple = [Vector(v) for v in contour_utilities.resample_loop(contour_utilities.vert_array(self.verts), cyclic, segments, self.shift)]
+                self.eds_simple = contour_utilities.chain_edges(len(self.verts_simple), cyclic)
+            else:
+                [self.verts_simple, self.eds_simple] = contour_utilities.space_evenly_on_path(self.verts, self.edges, segments, self.shift)
             
             if self.int_shift:
                 self.verts_simple = contour_utilities.list_shift(self.verts_simple, self.int_shift)
             
+            #visibility gets updated later, but it should never be out of step
+            if len(self.verts_simple_visible) != len(self.verts_simple):
+                self.verts_simple_visible = [True] * len(self.verts_simple)
+            
+    def fit_cross(self, max_segments, tolerance):
+        '''
+        simplify_cross with the fewest segments, up to max_segments,
+        that keep verts_simple within tolerance (a fraction of the
+        loop's size) of the full cross section
+        '''
+        if self.verts == [] or self.edges == []:
+            return
+        
+        cyclic = 0 in self.edges[-1]
+        size = contour_utilities.diagonal_verts(self.verts)
+        segments = contour_utilities.fewest_loop_segments(self.verts, cyclic, tolerance * size, max_segments, self.shift)
+        self.feature_resample = True
+        self.simplify_cross(segments)
+        
     def update_com(self):
         if self.verts_simple != []:
             self.plane_com = contour_utilities.get_com(self.verts_simple)
@@ -2104,23 +2655,17 @@ class ContourCutLine(object):
     
     def adjust_cut_to_object_surface(self,ob):
         
-        vecs = []
         rot = ob.matrix_world.to_quaternion()
-        for v in self.verts_simple:
-            closest = ob.closest_point_on_mesh(v)  #this will be in local coords!
-            
-            s_no = closest[1]
-            
-            vecs.append(self.plane_com + s_no)
+        #this will be in local coords!
+        normals = contour_utilities.closest_points_local(ob, self.verts_simple, form_bvh(ob))[1]
         
-        print(self.plane_no)    
-        (com, no) = contour_utilities.calculate_best_plane(vecs)
+        #around a tube the surface normals all lie in the plane
+        #across it, so the plane they span is the one we want
+        #first sanity check...keep normal in same dir
+        print(self.plane_no)
+        (com, no, residual) = contour_utilities.calculate_best_plane(normals, orient = rot.inverted() * self.plane_no)
         
         #TODO add some sanity checks
-    
-        #first sanity check...keep normal in same dir
-        if self.plane_no.dot(rot * no) < 0:
-            no *= -1
         
         self.plane_no = rot * no
         
@@ -2250,9 +2795,12 @@ class ContourCutLine(object):
         
 
         
+        cyclic = len(other.eds_simple) and 0 in other.eds_simple[-1]
+        other_verts = contour_utilities.match_loop_count(other.verts_simple, cyclic, len(self.verts_simple))
+        
         ideal_to_com = 0
         for i, v in enumerate(self.verts_simple):
-            connector = v - other.verts_simple[i]  #continue convention of final - initial :: self - other
+            connector = v - other_verts[i]  #continue convention of final - initial :: self - other
             connector.normalize()
             align = connector.dot(delta_com_vect)
 
@@ -2284,10 +2832,8 @@ class ContourCutLine(object):
             cyclic = False
         
         if len(verts_1) != len(self.verts_simple):
-            #print(len(verts_1))
-            #print(len(self.verts_simple))
-            print('non uniform loops, stopping until your developer gets smarter')
-            return
+            #line up against the other loop respaced to our count
+            verts_1 = contour_utilities.match_loop_count(verts_1, cyclic, len(self.verts_simple))
             
         if cyclic:
             #another test to verify loop direction is to take
@@ -2701,9 +3247,7 @@ class CutLineManipulatorWidget(object):
                     
                     if intersect[0]:
                         proposed_point = intersect[0]
-                        snap = self.ob.closest_point_on_mesh(self.ob.matrix_world.inverted() * proposed_point)
-                        self.cut_line.plane_pt = self.ob.matrix_world * snap[0]
-                        self.cut_line.seed_face_index = snap[2]
+                        self.snap_plane_pt(proposed_point)
                     else:
                         self.cancel_transform()
                         
@@ -2716,9 +3260,7 @@ class CutLineManipulatorWidget(object):
                     
                     if intersect[0]:
                         proposed_point = intersect[0]
-                        snap = self.ob.closest_point_on_mesh(self.ob.matrix_world.inverted() * proposed_point)
-                        self.cut_line.plane_pt = self.ob.matrix_world * snap[0]
-                        self.cut_line.seed_face_index = snap[2]
+                        self.snap_plane_pt(proposed_point)
                     else:
                         self.cancel_transform()
                     
@@ -2754,9 +3296,7 @@ class CutLineManipulatorWidget(object):
                     proposed_point = contour_utilities.intersect_path_plane(self.path_behind, new_com, inter_no, mode = 'FIRST')[0]
                     
                     if proposed_point:
-                        snap = self.ob.closest_point_on_mesh(self.ob.matrix_world.inverted() * proposed_point)
-                        self.cut_line.plane_pt = self.ob.matrix_world * snap[0]
-                        self.cut_line.seed_face_index = snap[2]
+                        self.snap_plane_pt(proposed_point)
                     else:
                         self.cancel_transform()
                     
@@ -2768,9 +3308,7 @@ class CutLineManipulatorWidget(object):
                     proposed_point = contour_utilities.intersect_path_plane(self.path_ahead, self.cut_line.plane_com, self.initial_plane_no, mode = 'FIRST')[0]
                     
                     if proposed_point:
-                        snap = self.ob.closest_point_on_mesh(self.ob.matrix_world.inverted() * proposed_point)
-                        self.cut_line.plane_pt = self.ob.matrix_world * snap[0]
-                        self.cut_line.seed_face_index = snap[2]
+                        self.snap_plane_pt(proposed_point)
                     else:
                         self.cancel_transform()
                     
@@ -2786,9 +3324,7 @@ class CutLineManipulatorWidget(object):
                     
                     proposed_point = contour_utilities.intersect_path_plane(self.path_behind, self.cut_line.plane_com, self.initial_plane_no, mode = 'FIRST')[0]
                 if proposed_point:        
-                    snap = self.ob.closest_point_on_mesh(self.ob.matrix_world.inverted() * proposed_point)
-                    self.cut_line.plane_pt = self.ob.matrix_world * snap[0]
-                    self.cut_line.seed_face_index = snap[2]
+                    self.snap_plane_pt(proposed_point)
                 else:
                     self.cancel_transform()
                 
@@ -2862,9 +3398,7 @@ class CutLineManipulatorWidget(object):
                 new_pt = contour_utilities.intersect_path_plane(self.path_behind, self.initial_com, new_no, mode = 'FIRST')
             
             if new_pt[0]:
-                snap = self.ob.closest_point_on_mesh(self.ob.matrix_world.inverted() * new_pt[0])
-                self.cut_line.plane_pt = self.ob.matrix_world * snap[0]
-                self.cut_line.seed_face_index = snap[2] 
+                self.snap_plane_pt(new_pt[0])
             else:
                 self.cancel_transform()
             return {'RECUT'}
@@ -2873,6 +3407,21 @@ class CutLineManipulatorWidget(object):
         print('ERROR: unknown self.transform_mode = "%s"' % self.transform_mode)
         return {'DO_NOTHING'}
 
+    def snap_plane_pt(self, point):
+        '''
+        moves the cut's plane_pt to point.  If the cut can warm start
+        from the faces its last loop crossed, the closest point lookup
+        is skipped and cut_object finds the seed face itself
+        '''
+        if self.cut_line.crossed_faces:
+            self.cut_line.plane_pt = point
+            self.cut_line.seed_face_index = None
+            return
+        
+        snap = self.ob.closest_point_on_mesh(self.ob.matrix_world.inverted() * point)
+        self.cut_line.plane_pt = self.ob.matrix_world * snap[0]
+        self.cut_line.seed_face_index = snap[2]
+    
     def derive_screen(self,context):
         rv3d = context.space_data.region_3d
         view_z = rv3d.view_rotation * Vector((0,0,1))
@@ -0,0 +1,380 @@
+'''
+Copyright (C) 2013 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Patrick Moore
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+####session journal####
+
+import os
+import queue
+import struct
+import tempfile
+import threading
+import zlib
+
+import bpy
+from mathutils import Vector
+
+from contour_classes import ContourCutSeries, ContourCutLine
+import general_utilities
+
+AL = general_utilities.AddonLocator()
+
+'''
+The journal is a flat file of records
+
+    type (1 byte), payload length (4 bytes), payload, crc32 (4 bytes)
+
+HEADER holds the validation of the form the session was cut on.
+PATH holds everything needed to re-cut one series: the counts, the
+guide path and each cut's plane, seed face and shift.  ORDER lists
+the series that exist after an edit, and marks the end of that edit.
+PATH records after the last ORDER belong to an edit which never got
+finished and are ignored, as is anything after a truncated or
+corrupted record.
+'''
+
+HEADER = 1
+PATH = 2
+ORDER = 3
+
+VERSION = 1
+
+record_head = struct.Struct('<BI')
+record_crc = struct.Struct('<I')
+path_head = struct.Struct('<IiiII')  #id, segments, ring_segments, n world path, n cuts
+cut_data = struct.Struct('<3f3fifi3f3f')  #plane pt, plane no, seed, shift, int shift, 1st and 2nd vert
+
+
+def journal_filepath(ob):
+    name = bpy.path.clean_name(ob.name)
+    return os.path.join(tempfile.gettempdir(), 'contour_%s.journal' % name)
+
+
+def frame_record(kind, payload):
+    crc = zlib.crc32(bytes((kind,)) + payload) & 0xffffffff
+    return record_head.pack(kind, len(payload)) + payload + record_crc.pack(crc)
+
+
+def pack_path(path):
+    cuts = [cut for cut in path.cuts if cut.plane_pt and cut.plane_no and cut.high_res_count() > 1]
+    world = [c for v in path.world_path for c in v]
+
+    data = [path_head.pack(path.journal_id, path.segments, path.ring_segments, len(path.world_path), len(cuts)),
+            struct.pack('<%if' % len(world), *world)]
+    for cut in cuts:
+        seed = cut.seed_face_index if cut.seed_face_index != None else -1
+        v0, v1 = cut.high_res_head()
+        data.append(cut_data.pack(*(tuple(cut.plane_pt) + tuple(cut.plane_no) +
+                                    (seed, cut.shift, cut.int_shift) +
+                                    tuple(v0) + tuple(v1))))
+    return b''.join(data)
+
+
+def unpack_path(payload):
+    journal_id, segments, ring_segments, n_world, n_cuts = path_head.unpack_from(payload, 0)
+    offset = path_head.size
+
+    world = struct.unpack_from('<%if' % (3 * n_world), payload, offset)
+    offset += 4 * 3 * n_world
+
+    cuts = []
+    for i in range(n_cuts):
+        c = cut_data.unpack_from(payload, offset)
+        offset += cut_data.size
+        cuts.append({'plane_pt': c[0:3],
+                     'plane_no': c[3:6],
+                     'seed': c[6] if c[6] >= 0 else None,
+                     'shift': c[7],
+                     'int_shift': c[8],
+                     'v0': c[9:12],
+                     'v1': c[12:15]})
+
+    return {'id': journal_id,
+            'segments': segments,
+            'ring_segments': ring_segments,
+            'world_path': [world[i:i+3] for i in range(0, len(world), 3)],
+            'cuts': cuts}
+
+
+def read_records(f):
+    while True:
+        head = f.read(record_head.size)
+        if len(head) < record_head.size:
+            return
+        kind, length = record_head.unpack(head)
+        payload = f.read(length)
+        crc = f.read(record_crc.size)
+        if len(payload) < length or len(crc) < record_crc.size:
+            print('journal: truncated record, stopping')
+            return
+        if record_crc.unpack(crc)[0] != zlib.crc32(bytes((kind,)) + payload) & 0xffffffff:
+            print('journal: corrupt record, stopping')
+            return
+        yield kind, payload
+
+
+def read_journal(filepath, validation):
+    '''
+    returns the series states as of the last finished edit,
+    or None if there is no journal for this form
+    '''
+    if not os.path.exists(filepath):
+        return None
+
+    latest = {}
+    order = None
+    with open(filepath, 'rb') as f:
+        records = read_records(f)
+        for kind, payload in records:
+            if kind != HEADER:
+                return None
+            version = struct.unpack_from('<H', payload, 0)[0]
+            if version != VERSION or payload[2:].decode('utf-8') != validation:
+                print('journal is for a different form or version')
+                return None
+            break
+        else:
+            return None
+
+        for kind, payload in records:
+            if kind == PATH:
+                state = unpack_path(payload)
+                latest[state['id']] = state
+            elif kind == ORDER:
+                n = struct.unpack_from('<I', payload, 0)[0]
+                order = struct.unpack_from('<%iI' % n, payload, 4)
+
+    if order == None:
+        return None
+    return [latest[i] for i in order if i in latest]
+
+
+def rebuild_paths(context, states, ob, bme):
+    '''
+    re-cuts the journaled series against the form
+    '''
+    settings = context.user_preferences.addons[AL.FolderName].preferences
+
+    paths = []
+    for state in states:
+        path = ContourCutSeries(context, [],
+                                segments=state['segments'],
+                                ring_segments=state['ring_segments'],
+                                cull_factor=settings.cull_factor,
+                                smooth_factor=settings.smooth_factor,
+                                feature_factor=settings.feature_factor)
+        path.world_path = [Vector(v) for v in state['world_path']]
+
+        for data in state['cuts']:
+            cut = ContourCutLine(0, 0, line_width=settings.line_thick)
+            cut.head = None
+            cut.tail = None
+            cut.plane_pt = Vector(data['plane_pt'])
+            cut.plane_no = Vector(data['plane_no'])
+            cut.seed_face_index = data['seed']
+            cut.cut_object(context, ob, bme)
+            if len(cut.verts) < 2:
+                print('journal: lost a cut while replaying')
+                continue
+
+            #cross sections always come out in the same order, but the
+            #loop may have been reversed when it was aligned
+            v0, v1 = Vector(data['v0']), Vector(data['v1'])
+            same = (cut.verts[0] - v0).length + (cut.verts[1] - v1).length
+            flipped = (cut.verts[-1] - v0).length + (cut.verts[-2] - v1).length
+            if flipped < same:
+                cut.verts.reverse()
+
+            cut.shift = data['shift']
+            cut.int_shift = data['int_shift']
+            path.resample_cut(cut)
+            cut.update_com()
+            cut.generic_3_axis_from_normal()
+            path.cuts.append(cut)
+
+        if not len(path.cuts):
+            continue
+
+        path.cut_points = [cut.plane_pt.copy() for cut in path.cuts]
+        path.cut_point_seeds = [cut.seed_face_index for cut in path.cuts]
+        path.connect_cuts_to_make_mesh(ob)
+        path.backbone_from_cuts(context, ob, bme)
+        path.update_visibility(context, ob)
+        path.deselect(settings)
+        paths.append(path)
+
+    return paths
+
+
+class SessionJournal(object):
+    '''
+    Appends the series that changed to the journal file.  Records are
+    packed on the main thread, which owns the data, and handed to a
+    background thread which does the writing, syncing and compacting
+    so the ui never waits on the disk.
+
+    Packing reads every cut's high res head, which may have to be
+    uncompressed, so nothing is packed unless the operator has marked
+    the journal dirty since the last record (see mark_dirty).
+    '''
+    def __init__(self, filepath, validation, compact_every = 64):
+        self.desc = 'SESSION_JOURNAL'
+        self.filepath = filepath
+        self.validation = validation
+        self.compact_every = compact_every
+
+        #main thread side
+        self.queue = queue.Queue()
+        self.thread = None
+        self.written = {}  #journal_id -> last payload sent
+        self.order = None
+        self.next_id = 0
+        self.dirty = True
+
+        #writer thread side
+        self.file = None
+        self.latest = {}  #journal_id -> latest PATH payload
+        self.latest_order = b''
+        self.since_compact = 0
+
+    def start(self):
+        '''
+        starts a fresh journal, anything in the old one should
+        already have been replayed
+        '''
+        try:
+            self.file = open(self.filepath, 'wb')
+        except IOError as e:
+            print('could not open contour journal: %s' % e)
+            self.file = None
+            return False
+
+        self.file.write(self.header())
+        self.sync()
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def header(self):
+        payload = struct.pack('<H', VERSION) + self.validation.encode('utf-8')
+        return frame_record(HEADER, payload)
+
+    def mark_dirty(self):
+        '''
+        call from the main thread when an edit starts, eg with the undo
+        snapshot, so the next record_paths packs the series again
+        '''
+        self.dirty = True
+
+    def record_paths(self, paths):
+        '''
+        call from the main thread whenever an edit is finished
+        '''
+        if not self.thread:
+            return
+
+        for path in paths:
+            if path.journal_id != None:
+                self.next_id = max(self.next_id, path.journal_id + 1)
+
+        #only pack when something was edited, or a series is new
+        changed = False
+        if self.dirty or any(path.journal_id == None for path in paths):
+            self.dirty = False
+            for path in paths:
+                if path.journal_id == None:
+                    path.journal_id = self.next_id
+                    self.next_id += 1
+
+                payload = pack_path(path)
+                if self.written.get(path.journal_id) != payload:
+                    self.written[path.journal_id] = payload
+                    self.queue.put((PATH, path.journal_id, payload))
+                    changed = True
+
+        order = [path.journal_id for path in paths]
+        if changed or order != self.order:
+            self.order = order
+            payload = struct.pack('<I%iI' % len(order), len(order), *order)
+            self.queue.put((ORDER, None, payload))
+
+    def close(self):
+        if not self.thread:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    ####writer thread####
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item == None:
+                break
+
+            kind, journal_id, payload = item
+            try:
+                self.file.write(frame_record(kind, payload))
+                if kind == PATH:
+                    self.latest[journal_id] = payload
+                else:
+                    self.latest_order = payload
+                    self.sync()
+                    self.since_compact += 1
+                    if self.since_compact >= self.compact_every:
+                        self.compact()
+
+            except (IOError, OSError) as e:
+                print('contour journal write failed: %s' % e)
+                break
+
+        self.file.close()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def compact(self):
+        '''
+        rewrite the journal with just the latest state of each live
+        series.  The new file is swapped in whole, so a crash in here
+        leaves either the old or the new journal, never half of one
+        '''
+        n = struct.unpack_from('<I', self.latest_order, 0)[0]
+        order = struct.unpack_from('<%iI' % n, self.latest_order, 4)
+        self.latest = {i: self.latest[i] for i in order if i in self.latest}
+
+        tmp_path = self.filepath + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.header())
+            for i in order:
+                if i in self.latest:
+                    f.write(frame_record(PATH, self.latest[i]))
+            f.write(frame_record(ORDER, self.latest_order))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.file.close()
+        os.replace(tmp_path, self.filepath)
+        self.file = open(self.filepath, 'ab')
+        self.since_compact = 0
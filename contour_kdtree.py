@@ -0,0 +1,194 @@
+'''
+Copyright (C) 2013 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Patrick Moore
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+####nearest points####
+
+'''
+A kd tree over a set of points, eg the verts of a ring or of the
+form, for nearest and radius queries a whole array of points at a
+time.  Like the TriangleBVH it's just numpy arrays.
+
+The points are split in half across the longest axis of their box,
+and the halves split again, until the pieces are about leaf_size.
+Every leaf ends up at the same depth, so the tree is stored a level
+at a time and queries walk it a level at a time for all the points
+at once, keeping the (query, node) pairs that could still hold an
+answer.  For nearest queries the far corners of boxes holding enough
+points bound how far away the answer can be, and that bound tightens
+as the walk goes down.
+'''
+
+import numpy as np
+
+#queries are run in chunks so the (query, node) pairs stay a sane size
+chunk_size = 2048
+
+
+class KDTree(object):
+    def __init__(self, points, leaf_size = 8):
+        self.points = np.array(points, dtype = np.float64).reshape(-1, 3)
+        n = len(self.points)
+
+        self.depth = 0
+        while n > leaf_size << self.depth:
+            self.depth += 1
+
+        #split every piece of each level in two, by count
+        order = np.arange(n)
+        bounds = [0, n]
+        for level in range(self.depth):
+            new_bounds = [0]
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                mid = (start + end) // 2
+                if end - start > 1:
+                    pts = self.points[order[start:end]]
+                    axis = (pts.max(axis = 0) - pts.min(axis = 0)).argmax()
+                    order[start:end] = order[start:end][np.argpartition(pts[:,axis], mid - start)]
+                new_bounds += [mid, end]
+            bounds = new_bounds
+
+        self.order = order
+        self.sorted = self.points[order]
+        self.leaf_start = np.array(bounds[:-1], dtype = np.int64)
+
+        #boxes and counts for every level, root first
+        count = np.diff(bounds).astype(np.int64)
+        lo = np.full((len(count), 3), np.inf)
+        hi = np.full((len(count), 3), -np.inf)
+        filled = count > 0
+        if n:
+            #only the leaves with points, so each reduces to the next one's start
+            at = self.leaf_start[filled]
+            lo[filled] = np.minimum.reduceat(self.sorted, at, axis = 0)
+            hi[filled] = np.maximum.reduceat(self.sorted, at, axis = 0)
+
+        self.levels = [(lo, hi, count)]
+        while len(count) > 1:
+            lo = np.minimum(lo[0::2], lo[1::2])
+            hi = np.maximum(hi[0::2], hi[1::2])
+            count = count[0::2] + count[1::2]
+            self.levels.insert(0, (lo, hi, count))
+
+    def __len__(self):
+        return len(self.points)
+
+    def walk(self, queries, bound, k = None):
+        '''
+        the (query, leaf) pairs whose boxes are within bound (squared,
+        one per query) of the query.  With k, bound is tightened on the
+        way down to the far corner of the nearest box holding k points.
+        returns query indices and leaf indices
+        '''
+        q_ind = np.arange(len(queries))
+        node = np.zeros(len(queries), dtype = np.int64)
+        for level, (lo, hi, count) in enumerate(self.levels):
+            q = queries[q_ind]
+            near = (np.maximum(np.maximum(lo[node] - q, q - hi[node]), 0)**2).sum(axis = 1)
+            if k:
+                far = (np.maximum(np.abs(q - lo[node]), np.abs(q - hi[node]))**2).sum(axis = 1)
+                enough = count[node] >= k
+                np.minimum.at(bound, q_ind[enough], far[enough])
+
+            keep = (near <= bound[q_ind]) & (count[node] > 0)
+            q_ind, node = q_ind[keep], node[keep]
+            if level < self.depth:
+                q_ind = np.repeat(q_ind, 2)
+                node = np.repeat(2 * node, 2) + np.tile([0, 1], len(node))
+
+        return q_ind, node
+
+    def leaf_pairs(self, queries, bound, k = None):
+        '''
+        every (query, point) pair for the leaves walk finds.
+        returns query indices, point indices and squared distances
+        '''
+        q_ind, leaf = self.walk(queries, bound, k)
+
+        counts = self.levels[-1][2][leaf]
+        q_ind = np.repeat(q_ind, counts)
+        j = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        slot = np.repeat(self.leaf_start[leaf], counts) + j
+
+        d2 = ((self.sorted[slot] - queries[q_ind])**2).sum(axis = 1)
+        return q_ind, self.order[slot], d2
+
+    def find_n(self, queries, k = 1):
+        '''
+        the k nearest points to each query (fewer if there aren't k)
+        returns indices and distances, Q x k, nearest first.
+        Missing neighbours have index -1 and distance inf
+        '''
+        queries = np.asarray(queries, dtype = np.float64).reshape(-1, 3)
+        inds = np.full((len(queries), k), -1, dtype = np.int64)
+        dists = np.full((len(queries), k), np.inf)
+        if not len(self.points) or not len(queries):
+            return inds, dists
+
+        for c in range(0, len(queries), chunk_size):
+            chunk = queries[c:c+chunk_size]
+            q_ind, p_ind, d2 = self.leaf_pairs(chunk, np.full(len(chunk), np.inf), k)
+
+            #k smallest per query
+            order = np.lexsort((d2, q_ind))
+            q_ind, p_ind, d2 = q_ind[order], p_ind[order], d2[order]
+            starts = np.searchsorted(q_ind, np.arange(len(chunk)))
+            rank = np.arange(len(q_ind)) - starts[q_ind]
+            keep = rank < k
+            inds[c + q_ind[keep], rank[keep]] = p_ind[keep]
+            dists[c + q_ind[keep], rank[keep]] = np.sqrt(d2[keep])
+
+        return inds, dists
+
+    def find(self, query):
+        '''
+        nearest point to one query, returns its index and distance
+        '''
+        inds, dists = self.find_n([query], 1)
+        return int(inds[0,0]), dists[0,0]
+
+    def find_range(self, queries, radius):
+        '''
+        every point within radius of each query.  returns flat query
+        indices, point indices and distances, by query then distance
+        '''
+        queries = np.asarray(queries, dtype = np.float64).reshape(-1, 3)
+        if not len(self.points) or not len(queries):
+            return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64), np.zeros(0)
+
+        q_inds, p_inds, dists = [], [], []
+        r2 = radius * radius
+        for c in range(0, len(queries), chunk_size):
+            chunk = queries[c:c+chunk_size]
+            q_ind, p_ind, d2 = self.leaf_pairs(chunk, np.full(len(chunk), r2))
+            inside = d2 <= r2
+            q_inds.append(c + q_ind[inside])
+            p_inds.append(p_ind[inside])
+            dists.append(np.sqrt(d2[inside]))
+
+        q_ind, p_ind, dist = np.concatenate(q_inds), np.concatenate(p_inds), np.concatenate(dists)
+        order = np.lexsort((dist, q_ind))
+        return q_ind[order], p_ind[order], dist[order]
+
+    def nbytes(self):
+        arrays = [self.points, self.order, self.sorted, self.leaf_start]
+        for level in self.levels:
+            arrays.extend(level)
+        return sum(a.nbytes for a in arrays)
@@ -0,0 +1,309 @@
+'''
+Copyright (C) 2013 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Patrick Moore
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+####interactive performance helpers####
+
+import time
+
+
+class FrameBudgetGovernor(object):
+    '''
+    Watches how long the draw callback and the modal recompute
+    chain take and steps the overlay quality down when a frame
+    goes over budget, then back up once there is headroom again.
+
+    levels:
+        0 FULL           everything is drawn and updated
+        1 NO OCCLUSION   skip the visibility ray casts
+        2 NO EXTRAS      also drop backbone and node drawing
+        3 DEFER FOLLOWS  also postpone follow line rebuilds while transforming
+    '''
+    levels = ('FULL', 'NO OCCLUSION', 'NO EXTRAS', 'DEFER FOLLOWS')
+
+    def __init__(self, budget = 1/30, headroom = .5, smoothing = .3, hold = 10):
+        self.enabled = True
+        self.budget = budget  #seconds per frame
+        self.headroom = headroom  #fraction of the budget we need to be under to step back up
+        self.smoothing = smoothing
+        self.base_hold = hold
+
+        self.level = 0
+        self.changed = False
+
+        #smoothed cost of a whole frame, and whatever
+        #work has been recorded since the last frame
+        self.frame_cost = 0
+        self.pending = 0
+
+        #frames spent under the headroom threshold, and how many
+        #we require before upgrading.  The requirement doubles every
+        #time an upgrade immediately gets knocked back down
+        self.calm_frames = 0
+        self.hold = hold
+        self.frames_since_upgrade = 0
+
+        #frames since we last stepped down.  The smoothed cost still
+        #remembers the dearer mode for a while, so we wait base_hold
+        #frames before judging the cheaper one
+        self.frames_since_downgrade = hold
+
+    @property
+    def occlude(self):
+        return self.level < 1
+
+    @property
+    def draw_extras(self):
+        return self.level < 2
+
+    @property
+    def defer_follows(self):
+        return self.level >= 3
+
+    def record(self, start):
+        '''
+        start is a time.time() stamp taken before the work began
+        the elapsed time gets charged to the current frame
+        '''
+        self.pending += time.time() - start
+
+    def update(self, settings):
+        '''
+        call once per frame, after the draw callback recorded itself
+        returns True if the quality level changed
+        '''
+        self.enabled = settings.use_frame_budget
+        self.budget = settings.frame_budget / 1000
+
+        cost = self.pending
+        self.pending = 0
+        self.frame_cost += self.smoothing * (cost - self.frame_cost)
+        self.frames_since_upgrade += 1
+        self.frames_since_downgrade += 1
+
+        old_level = self.level
+        if not self.enabled:
+            self.level = 0
+
+        elif self.frame_cost > self.budget and self.level < len(self.levels) - 1:
+            if self.frames_since_downgrade >= self.base_hold:
+                if self.frames_since_upgrade < self.hold:
+                    #we just came from here, wait longer next time
+                    self.hold = min(16 * self.base_hold, 2 * self.hold)
+                self.level += 1
+                self.frames_since_downgrade = 0
+            self.calm_frames = 0
+
+        elif self.frame_cost < self.headroom * self.budget and self.level > 0:
+            self.calm_frames += 1
+            if self.calm_frames > self.hold:
+                self.level -= 1
+                self.calm_frames = 0
+                self.frames_since_upgrade = 0
+
+        else:
+            self.calm_frames = 0
+            if self.frames_since_upgrade > 10 * self.hold:
+                self.hold = self.base_hold
+
+        if settings.debug > 1 and self.level != old_level:
+            print('frame budget: %0.1fms spent, quality %s' % (1000 * self.frame_cost, self.levels[self.level]))
+
+        self.changed = self.changed or self.level != old_level
+        return self.level != old_level
+
+    def discount(self, seconds):
+        '''
+        take back time that was recorded but shouldn't count
+        against the frame, eg time sliced background jobs
+        '''
+        self.pending = max(0, self.pending - seconds)
+
+    def describe(self):
+        '''
+        short string for the header, empty at full quality
+        '''
+        if self.level == 0:
+            return ''
+        return '  |  QUALITY: %s (%0.0fms)' % (self.levels[self.level], 1000 * self.frame_cost)
+
+
+class RecomputeJob(object):
+    '''
+    A chunk of work split into small steps.
+    steps is a generator which does one piece of work (usually one
+    cut) each time it is advanced, and may yield (done, total) so we
+    can report progress.
+    '''
+    def __init__(self, key, steps, on_finish = None, finish_args = (), preview = None, desc = ''):
+        self.desc = desc
+        self.key = key
+        self.steps = steps
+        self.on_finish = on_finish  #called with finish_args once the steps run out
+        self.finish_args = finish_args
+        self.preview = preview  #something drawable while the job runs, eg a new cut series
+        self.progress = None
+        self.finished = False
+
+    def step(self):
+        '''
+        advance one step, returns False when there is nothing left
+        '''
+        try:
+            progress = next(self.steps)
+        except StopIteration:
+            self.finished = True
+            return False
+
+        if isinstance(progress, tuple):
+            self.progress = progress
+        return True
+
+
+class ContourJobScheduler(object):
+    '''
+    Runs RecomputeJobs cooperatively from the modal TIMER event so
+    the ui doesn't lock up while a big series is re-sliced.
+
+    Submitting a job with the same key as a running job cancels the
+    old one, it was going to be thrown away anyway.  Anything that
+    reads or edits the data the jobs touch should call finish() first.
+    '''
+    def __init__(self):
+        self.desc = 'JOB_SCHEDULER'
+        self.jobs = []
+
+    def busy(self):
+        return len(self.jobs) > 0
+
+    def submit(self, key, steps, on_finish = None, finish_args = (), preview = None, desc = ''):
+        self.cancel(key)
+        job = RecomputeJob(key, steps, on_finish = on_finish, finish_args = finish_args, preview = preview, desc = desc)
+        self.jobs.append(job)
+        return job
+
+    def cancel(self, key):
+        for job in self.jobs[:]:
+            if job.key == key:
+                job.steps.close()
+                self.jobs.remove(job)
+
+    def cancel_all(self):
+        for job in self.jobs:
+            job.steps.close()
+        self.jobs = []
+
+    def run(self, budget):
+        '''
+        work through the jobs, oldest first, until budget seconds
+        have gone by.  Always does at least one step so even a tiny
+        budget makes progress.
+        returns the time spent
+        '''
+        start = time.time()
+        while self.jobs:
+            job = self.jobs[0]
+            if not job.step():
+                self.jobs.pop(0)
+                if job.on_finish:
+                    job.on_finish(*job.finish_args)
+
+            if time.time() - start > budget:
+                break
+
+        return time.time() - start
+
+    def finish(self, skip = ()):
+        '''
+        run everything to completion right now, except
+        the jobs whose keys are in skip, which carry on
+        '''
+        held = [job for job in self.jobs if job.key in skip]
+        self.jobs = [job for job in self.jobs if job.key not in skip]
+        spent = self.run(float('inf'))
+        self.jobs = held + self.jobs
+        return spent
+
+    def previews(self):
+        return [job.preview for job in self.jobs if job.preview]
+
+    def describe(self):
+        if not self.jobs:
+            return ''
+
+        job = self.jobs[0]
+        msg = 'UPDATING ' + job.desc
+        if job.progress:
+            msg += ' %i/%i' % job.progress
+        if len(self.jobs) > 1:
+            msg += '  (+%i queued)' % (len(self.jobs) - 1)
+        return msg
+
+
+class EventCoalescer(object):
+    '''
+    Fast input (mouse moves while transforming, wheel bursts) can queue
+    up several events before we ever get to draw.  Instead of running
+    the expensive update for each one, callers push the update under a
+    key and only the latest request for each key is kept.  flush() runs
+    them, at most about once a frame, in the order the keys first
+    showed up.  It is called from the modal, never from drawing, and
+    the updates get the context of the event that flushes them.
+    '''
+    def __init__(self):
+        self.desc = 'EVENT_COALESCER'
+        self.order = []
+        self.pending = {}
+        self.dropped = 0
+        self.since = None
+
+    def busy(self):
+        return len(self.order) > 0
+
+    def due(self, interval):
+        '''
+        True once the oldest pending update has waited interval seconds
+        '''
+        return self.busy() and time.time() - self.since >= interval
+
+    def push(self, key, func, *args):
+        '''
+        func will be called as func(context, *args)
+        '''
+        if key in self.pending:
+            self.dropped += 1
+        else:
+            if not self.order:
+                self.since = time.time()
+            self.order.append(key)
+        self.pending[key] = (func, args)
+
+    def discard(self):
+        self.order = []
+        self.pending = {}
+        self.since = None
+
+    def flush(self, context):
+        #calls may push again, so swap everything out first
+        order, pending = self.order, self.pending
+        self.discard()
+        for key in order:
+            func, args = pending[key]
+            func(context, *args)
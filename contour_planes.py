@@ -0,0 +1,105 @@
+'''
+Copyright (C) 2013 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Patrick Moore
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+####best fit planes####
+
+'''
+Least squares planes through sets of points.  The plane goes through
+the centroid and its normal is the eigenvector of the covariance with
+the smallest eigenvalue, which is also the mean squared distance of
+the points from the plane.  Any number of sets are fit at once, packed
+one after the other with a count per set, so it's one pass over the
+points and one batched eigen solve however many there are.
+
+No random sampling or iteration, the same points always give the same
+plane.  The sign of the normal is arbitrary as far as the fit goes,
+so it is made to agree with orient if one is given, and otherwise
+points its largest component positive.
+'''
+
+import numpy as np
+
+
+def fit_planes_packed(points, counts, orient = None):
+    '''
+    points:  N x 3, the sets one after the other
+    counts:  how many points in each set, adding up to N
+    orient:  3 vector or M x 3, normals are flipped to agree with it
+
+    returns centroids (M x 3), unit normals (M x 3) and the rms
+    distance of each set from its plane (M)
+    '''
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 3)
+    counts = np.asarray(counts, dtype = np.int64)
+    n_sets = len(counts)
+    if not n_sets:
+        return np.zeros((0,3)), np.zeros((0,3)), np.zeros(0)
+
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    filled = counts > 0
+
+    #reduceat sums up to the next start, so only the sets with points
+    #go in, each one runs to the start of the next one that has any
+    reduce_at = starts[filled]
+    sizes = counts[filled][:,None]
+
+    coms = np.zeros((n_sets, 3))
+    if len(points):
+        coms[filled] = np.add.reduceat(points, reduce_at, axis = 0) / sizes
+
+    local = points - np.repeat(coms, counts, axis = 0)
+    cov = np.zeros((n_sets, 3, 3))
+    if len(points):
+        outer = local[:,:,None] * local[:,None,:]
+        cov[filled] = np.add.reduceat(outer, reduce_at, axis = 0) / sizes[:,:,None]
+
+    values, vectors = np.linalg.eigh(cov)
+    normals = vectors[:,:,0]
+    residuals = np.sqrt(np.maximum(values[:,0], 0))
+
+    if orient is None:
+        biggest = np.abs(normals).argmax(axis = 1)
+        flip = normals[np.arange(n_sets), biggest] < 0
+    else:
+        flip = (normals * np.asarray(orient, dtype = np.float64)).sum(axis = -1) < 0
+    normals[flip] *= -1
+
+    return coms, normals, residuals
+
+
+def fit_planes(point_sets, orient = None):
+    '''
+    fit_planes_packed for a list of point sets
+    '''
+    counts = [len(pts) for pts in point_sets]
+    if not sum(counts):
+        return fit_planes_packed(np.zeros((0,3)), counts, orient)
+    points = np.concatenate([np.asarray(pts, dtype = np.float64).reshape(-1, 3) for pts in point_sets if len(pts)])
+    return fit_planes_packed(points, counts, orient)
+
+
+def fit_plane(points, orient = None):
+    '''
+    centroid, unit normal and rms distance from the plane of one set
+    '''
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 3)
+    coms, normals, residuals = fit_planes_packed(points, [len(points)], orient)
+    return coms[0], normals[0], residuals[0]
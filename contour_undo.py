@@ -0,0 +1,376 @@
+'''
+Copyright (C) 2013 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Patrick Moore
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+####undo records####
+
+import sys
+from array import array
+from collections import deque
+
+from mathutils import Vector
+
+from contour_arrays import PackedSequence
+
+#never stored, they point back up the tree or at the record itself
+skip_attributes = {'parent', 'undo_record'}
+
+#caches which get rebuilt and aren't worth keeping, the screen coords
+#and visibility depend on the view and crossed_faces only warm starts
+#the next cut
+caches = {'verts_screen', 'verts_simple_screen', '_verts_screen', '_verts_simple_screen', 'follow_vis', 'crossed_faces'}
+
+
+class FrozenVector(tuple):
+    '''
+    a mathutils Vector stored as a plain tuple of floats
+    '''
+    __slots__ = ()
+
+
+class FrozenList(tuple):
+    '''
+    a list stored as a tuple, so we know to hand back a list
+    '''
+    __slots__ = ()
+
+
+class PackedVectors(object):
+    '''
+    a list of same sized Vectors stored as one float32 buffer
+    '''
+    __slots__ = ('size', 'data')
+
+    def __init__(self, vectors):
+        self.size = len(vectors[0])
+        self.data = array('f')
+        for v in vectors:
+            self.data.extend(v)
+
+    def unpack(self):
+        n = self.size
+        data = self.data
+        return [Vector(data[i:i+n]) for i in range(0, len(data), n)]
+
+
+class FrozenBuffer(object):
+    '''
+    a private copy of a PackedSequence
+    '''
+    __slots__ = ('seq',)
+
+    def __init__(self, seq):
+        self.seq = seq.copy()
+
+
+class ObjectRecord(object):
+    '''
+    Immutable copy of one object's attributes.  Nested lists and
+    Vectors are frozen into tuples, nested objects into their own
+    records.  Nothing in here is ever handed out directly, restore()
+    always builds fresh objects, so a record can be shared by as many
+    undo snapshots as we like.
+    '''
+    __slots__ = ('cls', 'fields', 'has_parent', 'nbytes')
+
+    def __init__(self, obj, exclude = ()):
+        self.cls = type(obj)
+        self.has_parent = hasattr(obj, 'parent')
+        fields = []
+        for name, value in attributes(obj):
+            if name in skip_attributes or name in exclude:
+                continue
+            if name in caches:
+                value = value[0:0] if isinstance(value, PackedSequence) else []
+            fields.append((name, freeze(value)))
+        self.fields = tuple(fields)
+
+        #nested records are charged for on their own
+        self.nbytes = sys.getsizeof(self.fields) + sum(frozen_size(value) for name, value in fields)
+
+    def restore(self, parent = None):
+        obj = self.cls.__new__(self.cls)
+        for name, value in self.fields:
+            setattr(obj, name, thaw(value, obj))
+        if self.has_parent:
+            obj.parent = parent
+
+        remember(obj, object_key(obj), self)
+        return obj
+
+
+class SeriesRecord(object):
+    '''
+    A ContourCutSeries is stored as its own attributes plus one record
+    per ring.  The rings change far more often than the series, so they
+    are kept separately and shared independently.
+    '''
+    __slots__ = ('series', 'rings')
+
+    exclude = ('cuts',)
+
+    def __init__(self, path):
+        self.series = record_of(path, exclude = self.exclude)
+        self.rings = tuple(record_of(cut) for cut in path.cuts)
+
+    def restore(self):
+        path = self.series.restore()
+        path.cuts = [ring.restore() for ring in self.rings]
+
+        #the record was taken without the cuts, so the key has to be too
+        remember(path, object_key(path, exclude = self.exclude), self.series)
+        return path
+
+
+def attributes(obj):
+    '''
+    (name, value) for everything set on obj, whether it
+    keeps its attributes in a __dict__ or in __slots__
+    '''
+    if hasattr(obj, '__dict__'):
+        return list(vars(obj).items())
+
+    items = []
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if hasattr(obj, name):
+                items.append((name, getattr(obj, name)))
+    return items
+
+
+def is_object(value):
+    return hasattr(value, '__dict__') or hasattr(type(value), '__slots__')
+
+
+def item_key(item):
+    '''
+    cheap stand in for an element of a list
+    '''
+    if isinstance(item, Vector):
+        return tuple(item)
+    if item is None or isinstance(item, (int, float, str, bool, tuple, range)):
+        return item
+    if isinstance(item, (list, PackedSequence)):
+        return value_key(item)
+    return id(item)
+
+
+def value_key(value):
+    '''
+    Something cheap to compare which changes whenever the value does.
+    Packed sequences carry a version which changes with every edit and
+    is never handed out twice, so a recomputed ring can't be mistaken
+    for an old one.  Plain lists are keyed on their items, they only
+    hold small things, the rings keep their geometry packed.
+    '''
+    if isinstance(value, Vector):
+        return tuple(value)
+    if isinstance(value, PackedSequence):
+        return (PackedSequence, value.version)
+    if isinstance(value, list):
+        return (len(value), hash(tuple(item_key(item) for item in value)))
+    if isinstance(value, tuple):
+        return tuple(item_key(item) for item in value)
+    if is_object(value):
+        return (id(value), object_key(value))
+    return value
+
+
+def object_key(obj, exclude = ()):
+    return tuple((name, value_key(value)) for name, value in attributes(obj)
+                 if name not in skip_attributes and name not in exclude and name not in caches)
+
+
+def record_of(obj, exclude = ()):
+    '''
+    returns the record from the last snapshot if the object
+    hasn't changed since, otherwise makes a new one
+    '''
+    key = object_key(obj, exclude)
+    cached = getattr(obj, 'undo_record', None)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    record = ObjectRecord(obj, exclude)
+    remember(obj, key, record)
+    return record
+
+
+def remember(obj, key, record):
+    '''
+    cache the record on the object, if it has room for it
+    '''
+    try:
+        obj.undo_record = (key, record)
+    except AttributeError:
+        pass
+
+
+def freeze(value):
+    if isinstance(value, Vector):
+        return FrozenVector(value)
+    if (isinstance(value, list) and value and isinstance(value[0], Vector) and
+        all(isinstance(v, Vector) and len(v) == len(value[0]) for v in value)):
+        return PackedVectors(value)
+    if isinstance(value, PackedSequence):
+        return FrozenBuffer(value)
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    if isinstance(value, tuple):
+        return tuple(freeze(item) for item in value)
+    if is_object(value):
+        return record_of(value)
+    return value
+
+
+def thaw(value, parent = None):
+    if isinstance(value, FrozenVector):
+        return Vector(value)
+    if isinstance(value, PackedVectors):
+        return value.unpack()
+    if isinstance(value, FrozenBuffer):
+        return value.seq.copy()
+    if isinstance(value, FrozenList):
+        return [thaw(item, parent) for item in value]
+    if isinstance(value, tuple):
+        return tuple(thaw(item, parent) for item in value)
+    if isinstance(value, ObjectRecord):
+        return value.restore(parent)
+    return value
+
+
+def frozen_size(value):
+    '''
+    approximate bytes held by a frozen value
+    '''
+    if isinstance(value, PackedVectors):
+        return sys.getsizeof(value.data)
+    if isinstance(value, FrozenBuffer):
+        return sys.getsizeof(value.seq.data)
+    if isinstance(value, ObjectRecord):
+        return 0
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(frozen_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def snapshot_paths(paths):
+    '''
+    Only the rings (and series) which changed since the last snapshot
+    are copied, everything else is shared with the previous snapshots.
+    '''
+    return tuple(SeriesRecord(path) for path in paths)
+
+
+def restore_paths(snapshot):
+    return [record.restore() for record in snapshot]
+
+
+def iter_records(snapshot):
+    '''
+    every record a snapshot holds on to, nested records are only
+    ever found directly in a field (control points, existing loops)
+    '''
+    for series_record in snapshot:
+        for record in (series_record.series,) + series_record.rings:
+            yield record
+            for name, value in record.fields:
+                if isinstance(value, ObjectRecord):
+                    yield value
+
+
+class UndoEntry(object):
+    __slots__ = ('snapshot', 'state', 'action', 'records', 'nbytes')
+
+    def __init__(self, snapshot, state, action):
+        self.snapshot = snapshot
+        self.state = state
+        self.action = action
+        self.records = []  #ids of the records this entry is charged for
+        self.nbytes = 0
+
+
+class UndoStore(object):
+    '''
+    Undo snapshots, oldest first.  Each record is charged to the oldest
+    entry still holding it, which is the entry that introduced it, so an
+    entry's size is the delta it added on top of the ones before.
+    Old entries are dropped once the total goes over the memory budget.
+    '''
+    def __init__(self):
+        self.desc = 'UNDO_STORE'
+        self.entries = deque()
+        self.sizes = {}  #id(record) -> bytes, for every charged record
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def last_action(self):
+        if not self.entries:
+            return None
+        return self.entries[-1].action
+
+    def charge(self, entry, record):
+        key = id(record)
+        if key in self.sizes:
+            return
+        self.sizes[key] = record.nbytes
+        entry.records.append(key)
+        entry.nbytes += record.nbytes
+        self.nbytes += record.nbytes
+
+    def release(self, entry):
+        for key in entry.records:
+            self.nbytes -= self.sizes.pop(key)
+        entry.records = []
+        entry.nbytes = 0
+
+    def push(self, paths, state, action, budget):
+        '''
+        budget is in bytes, the newest entry is always kept
+        '''
+        entry = UndoEntry(snapshot_paths(paths), state, action)
+        for record in iter_records(entry.snapshot):
+            self.charge(entry, record)
+        self.entries.append(entry)
+
+        while len(self.entries) > 1 and self.nbytes > budget:
+            self.evict()
+
+    def evict(self):
+        old = self.entries.popleft()
+        self.release(old)
+
+        #anything the old entry introduced which is still shared
+        #now belongs to the next one
+        nxt = self.entries[0]
+        for record in iter_records(nxt.snapshot):
+            self.charge(nxt, record)
+
+    def pop(self):
+        entry = self.entries.pop()
+        self.release(entry)
+        return entry.snapshot, entry.state, entry.action
+
+    def clear(self):
+        self.entries.clear()
+        self.sizes = {}
+        self.nbytes = 0
@@ -24,6 +24,7 @@ import random
 import math
 from collections import deque
 from itertools import chain,combinations
+import numpy as np
 from mathutils import Vector, Matrix, Quaternion
 from mathutils.geometry import intersect_line_plane, intersect_point_line, distance_point_to_plane, intersect_line_line_2d, intersect_line_line
 
@@ -35,6 +36,8 @@ import bmesh
 from bpy_extras import view3d_utils
 from bpy_extras.view3d_utils import location_3d_to_region_2d, region_2d_to_vector_3d, region_2d_to_location_3d, region_2d_to_origin_3d
 
+from contour_planes import fit_plane
+
 
 def callback_register(self, context):
         #if str(bpy.app.build_revision)[2:7].lower == "unkno" or eval(str(bpy.app.build_revision)[2:7]) >= 53207:
@@ -79,6 +82,65 @@ def draw_points(context, points, color, size):
     bgl.glEnd()   
     return
 
+def chain_edge_loops(edge_keys):
+    '''
+    Orders edges, given as (vert index, vert index) pairs, into chains
+    of vert indices.  The vert -> edges map is built once and each chain
+    is walked an edge at a time, so it's linear in the number of edges.
+    Chains stop at verts with more than two of the edges, so a branching
+    selection comes back as separate chains sharing their end verts.
+    
+    returns a list of (vert indices, cyclic), cyclic chains don't
+    repeat their first vert at the end
+    '''
+    vert_edges = {}
+    for i, (v0, v1) in enumerate(edge_keys):
+        vert_edges.setdefault(v0, []).append(i)
+        vert_edges.setdefault(v1, []).append(i)
+    
+    used = [False] * len(edge_keys)
+    
+    def walk(v, i):
+        '''
+        from vert v along edge i, until a vert which isn't in the
+        middle of a chain or an edge which has already been walked
+        '''
+        chain = [v]
+        while not used[i]:
+            used[i] = True
+            v0, v1 = edge_keys[i]
+            v = v1 if v0 == v else v0
+            chain.append(v)
+            eds = vert_edges[v]
+            if len(eds) != 2:
+                break
+            i = eds[1] if eds[0] == i else eds[0]
+        return chain
+    
+    def closed(chain):
+        if len(chain) > 2 and chain[0] == chain[-1]:
+            chain.pop()
+            return chain, True
+        return chain, False
+    
+    loops = []
+    
+    #open chains start and stop at their ends or at branches,
+    #a loop through a branch comes back round to where it started
+    for v, eds in vert_edges.items():
+        if len(eds) == 2:
+            continue
+        for i in eds:
+            if not used[i]:
+                loops.append(closed(walk(v, i)))
+    
+    #whatever is left is closed loops
+    for i, used_edge in enumerate(used):
+        if not used_edge:
+            loops.append(closed(walk(edge_keys[i][0], i)))
+    
+    return loops
+
 def edge_loops_from_bmedges(bmesh, bm_edges):
     """
     Edge loops defined by edges
@@ -90,52 +152,12 @@ def edge_loops_from_bmedges(bmesh, bm_edges):
 
     closed loops have matching start and end values.
     """
-    line_polys = []
-    edges = bm_edges.copy()
-
-    while edges:
-        current_edge = bmesh.edges[edges.pop()]
-        vert_e, vert_st = current_edge.verts[:]
-        vert_end, vert_start = vert_e.index, vert_st.index
-        line_poly = [vert_start, vert_end]
-
-        ok = True
-        while ok:
-            ok = False
-            #for i, ed in enumerate(edges):
-            i = len(edges)
-            while i:
-                i -= 1
-                ed = bmesh.edges[edges[i]]
-                v_1, v_2 = ed.verts
-                v1, v2 = v_1.index, v_2.index
-                if v1 == vert_end:
-                    line_poly.append(v2)
-                    vert_end = line_poly[-1]
-                    ok = 1
-                    del edges[i]
-                    # break
-                elif v2 == vert_end:
-                    line_poly.append(v1)
-                    vert_end = line_poly[-1]
-                    ok = 1
-                    del edges[i]
-                    #break
-                elif v1 == vert_start:
-                    line_poly.insert(0, v2)
-                    vert_start = line_poly[0]
-                    ok = 1
-                    del edges[i]
-                    # break
-                elif v2 == vert_start:
-                    line_poly.insert(0, v1)
-                    vert_start = line_poly[0]
-                    ok = 1
-                    del edges[i]
-                    #break
-        line_polys.append(line_poly)
-
-    return line_polys
+    edge_keys = []
+    for i in bm_edges:
+        v0, v1 = bmesh.edges[i].verts[:]
+        edge_keys.append((v0.index, v1.index))
+    
+    return [chain + chain[:1] if cyclic else chain for chain, cyclic in chain_edge_loops(edge_keys)]
 
 def perp_vector_point_line(pt1, pt2, ptn):
     '''
@@ -173,38 +195,23 @@ def altitude(point1, point2, pointn):
     
     return altitude 
     
-# iterate through verts
-def iterate(points, newVerts, error,method = 1):
+def point_altitudes(points, a, b):
     '''
-    args:
-    points - list of vectors in order representing locations on a curve
-    newVerts - list of indices? (mapping to arg: points) of aready identified "new" verts
-    error - distance obove/below chord which makes vert considered a feature
+    altitude(a, b, pt) for each row of an N x 3 array, the sine of
+    the angle at a times the distance from a
+    '''
+    edge1 = b - a
+    edge2 = points - a
+    len1 = np.sqrt(edge1.dot(edge1))
+    len2 = np.sqrt((edge2**2).sum(axis = 1))
+    if len1 == 0:
+        return len2
     
-    return:
-    new -  list of vertex indicies (mappint to arg points) representing identified feature points
-    or
-    false - no new feature points identified...algorithm is finished.
-    '''
-    new = []
-    for newIndex in range(len(newVerts)-1):
-        bigVert = 0
-        alti_store = 0
-        for i, point in enumerate(points[newVerts[newIndex]+1:newVerts[newIndex+1]]):
-            if method == 1:
-                alti = perp_vector_point_line(points[newVerts[newIndex]], points[newVerts[newIndex+1]], point).length
-            else:
-                alti = altitude(points[newVerts[newIndex]], points[newVerts[newIndex+1]], point)
-                
-            if alti > alti_store:
-                alti_store = alti
-                if alti_store >= error:
-                    bigVert = i+1+newVerts[newIndex]
-        if bigVert:
-            new.append(bigVert)
-    if new == []:
-        return False
-    return new
+    alti = np.zeros(len(points))
+    ok = len2 > 0
+    cos = np.clip(edge2[ok].dot(edge1) / (len2[ok] * len1), -1, 1)
+    alti[ok] = np.sin(np.arccos(cos)) * len2[ok]
+    return alti
 
 #### get SplineVertIndices to keep
 def simplify_RDP(splineVerts, error, method = 1):
@@ -213,24 +220,41 @@ def simplify_RDP(splineVerts, error, method = 1):
     args:
     splineVerts - list of vectors representing locations along the spline/line path
     error - altitude above global/neighbors which allows point to be considered a feature
+    method - 1 measures altitude with the perpendicular to the chord, 2 with the angle at its start
     return:
     newVerts - a list of indicies of the simplified representation of the curve (in order, mapping to arg-splineVerts)
+    
+    Spans are taken off a stack and split at their highest point,
+    with the altitudes of a whole span worked out in one go.  Ties go
+    to the first point, so the knots are the same ones the old round
+    by round version found.
     '''
-
-    start = time.time()
+    points = np.array(splineVerts, dtype = np.float64)
+    n = len(points)
     
     # set first and last vert
-    newVerts = [0, len(splineVerts)-1]
-
-    # iterate through the points
-    new = 1
-    while new != False:
-        new = iterate(splineVerts, newVerts, error, method = method)
-        if new:
-            newVerts += new
-            newVerts.sort()
-            
-    print('finished simplification with method %i in %f seconds' % (method, time.time() - start))
+    newVerts = [0, n-1]
+    
+    stack = [(0, n-1)]
+    while stack:
+        i0, i1 = stack.pop()
+        if i1 - i0 < 2:
+            continue
+        
+        span = points[i0+1:i1]
+        if method == 1:
+            alti = point_line_distances(span, points[i0], points[i1])
+        else:
+            alti = point_altitudes(span, points[i0], points[i1])
+        
+        k = int(np.argmax(alti))
+        if alti[k] > 0 and alti[k] >= error:
+            k += i0 + 1
+            newVerts.append(k)
+            stack.append((k, i1))
+            stack.append((i0, k))
+    
+    newVerts.sort()
     return newVerts
 
 def ray_cast_visible(verts, ob, rv3d):
@@ -294,6 +318,361 @@ def ray_cast_region2d(region, rv3d, screen_coord, ob, settings):
     
     return (ray_vector, hit)
 
+def location_3d_to_region_2d_batch(region, rv3d, verts):
+    '''
+    location_3d_to_region_2d for a whole list of world points at once,
+    with one matrix product.  returns an N x 2 array, points behind
+    the view (None from location_3d_to_region_2d) are nan
+    '''
+    pts = vert_array(verts)
+    prj = np.dot(pts, np.array(rv3d.perspective_matrix)[:,:3].T) + np.array(rv3d.perspective_matrix)[:,3]
+    
+    coords = np.full((len(pts), 2), np.nan)
+    front = prj[:,3] > 0
+    w = prj[front,3]
+    coords[front,0] = region.width / 2 * (1 + prj[front,0] / w)
+    coords[front,1] = region.height / 2 * (1 + prj[front,1] / w)
+    return coords
+
+def region_2d_to_rays(region, rv3d, coords):
+    '''
+    region_2d_to_origin_3d and region_2d_to_vector_3d for a whole
+    list of screen coords at once, with one matrix product.
+    returns world space origins and normalized ray vectors as N x 3 arrays
+    '''
+    coords = np.array(coords, dtype = np.float64).reshape(-1, 2)
+    n = len(coords)
+    
+    ndc = np.empty((n, 4))
+    ndc[:,0] = 2 * coords[:,0] / region.width - 1
+    ndc[:,1] = 2 * coords[:,1] / region.height - 1
+    ndc[:,3] = 1
+    
+    viewinv = np.array(rv3d.view_matrix.inverted())
+    persinv = np.array(rv3d.perspective_matrix.inverted())
+    
+    if rv3d.is_perspective:
+        ndc[:,2] = -.5
+        pts = ndc.dot(persinv.T)
+        eye = viewinv[:3,3]
+        vectors = pts[:,:3] / pts[:,3:] - eye
+        origins = np.tile(eye, (n,1))
+    else:
+        ndc[:,2] = 0
+        vectors = np.tile(-viewinv[:3,2], (n,1))
+        origins = ndc.dot(persinv.T)[:,:3]
+    
+    vectors /= np.sqrt((vectors**2).sum(axis = 1))[:,None]
+    return origins, vectors
+
+def transform_points(mx, pts):
+    '''
+    mx * v for every row of an N x 3 array, mx is a 4x4 array
+    '''
+    return pts.dot(mx[:3,:3].T) + mx[:3,3]
+
+def ray_cast_local(ob, starts, targets, bvh = None):
+    '''
+    casts each start -> target segment (object space, N x 3 arrays)
+    against the object.  With a TriangleBVH of the object they all go
+    in one batch, otherwise one at a time through ob.ray_cast.
+    returns local hits, local normals and face indices, -1 for a miss
+    '''
+    starts = np.asarray(starts, dtype = np.float64).reshape(-1, 3)
+    targets = np.asarray(targets, dtype = np.float64).reshape(-1, 3)
+    if bvh:
+        hits, normals, faces, dists = bvh.ray_cast_segments(starts, targets)
+        return hits, normals, faces
+    
+    n = len(starts)
+    hits = np.zeros((n,3))
+    normals = np.zeros((n,3))
+    faces = np.full(n, -1, dtype = np.int64)
+    
+    cast = ob.ray_cast
+    for i in range(n):
+        loc, no, face = cast(Vector(starts[i]), Vector(targets[i]))
+        if face != -1:
+            hits[i] = loc
+            normals[i] = no
+            faces[i] = face
+    
+    return hits, normals, faces
+
+def closest_points_local(ob, pts, bvh = None):
+    '''
+    ob.closest_point_on_mesh for an N x 3 array of object space points,
+    batched through the TriangleBVH if there is one.
+    returns local locations, local normals and face indices
+    '''
+    pts = np.asarray(pts, dtype = np.float64).reshape(-1, 3)
+    if bvh:
+        locs, normals, faces, dists = bvh.closest_point(pts)
+        return locs, normals, faces
+    
+    n = len(pts)
+    locs = np.zeros((n,3))
+    normals = np.zeros((n,3))
+    faces = np.full(n, -1, dtype = np.int64)
+    
+    closest = ob.closest_point_on_mesh
+    for i in range(n):
+        loc, no, face = closest(Vector(pts[i]))
+        locs[i] = loc
+        normals[i] = no
+        faces[i] = face
+    
+    return locs, normals, faces
+
+def closest_points_world(ob, pts, bvh = None):
+    '''
+    snaps a list of world space points to the surface of ob.
+    returns world locations, world normals and face indices as arrays
+    '''
+    mx = np.array(ob.matrix_world)
+    imx = np.array(ob.matrix_world.inverted())
+    locs, normals, faces = closest_points_local(ob, transform_points(imx, np.array(pts, dtype = np.float64).reshape(-1, 3)), bvh)
+    
+    #normals go by the inverse transpose
+    normals = normals.dot(imx[:3,:3])
+    lens = np.sqrt((normals**2).sum(axis = 1))
+    normals[lens > 0] /= lens[lens > 0][:,None]
+    
+    return transform_points(mx, locs), normals, faces
+
+def snap_path_world(ob, pts, bvh = None, start_faces = None):
+    '''
+    closest_points_world for consecutive points along a path.  With a
+    bvh each point walks the surface from start_faces (or from its
+    neighbours along the path) instead of searching the whole form.
+    returns world locations, world normals and face indices as arrays
+    '''
+    if not bvh:
+        return closest_points_world(ob, pts, bvh)
+    
+    mx = np.array(ob.matrix_world)
+    imx = np.array(ob.matrix_world.inverted())
+    local = transform_points(imx, np.array(pts, dtype = np.float64).reshape(-1, 3))
+    locs, normals, faces, dists = bvh.closest_point_walk(local, start_faces)
+    
+    normals = normals.dot(imx[:3,:3])
+    lens = np.sqrt((normals**2).sum(axis = 1))
+    normals[lens > 0] /= lens[lens > 0][:,None]
+    
+    return transform_points(mx, locs), normals, faces
+
+def ray_cast_region2d_batch(region, rv3d, coords, ob, settings, bvh = None):
+    '''
+    ray_cast_region2d for every point of a stroke.  The rays are built
+    and taken into object space in one go, then cast in one pass.
+    returns world space hits, world space normals and face indices as
+    N x 3, N x 3 and N arrays.  Misses have face index -1.
+    '''
+    origins, vectors = region_2d_to_rays(region, rv3d, coords)
+    
+    #same depths as ray_cast_region2d, see bug #48
+    if rv3d.is_perspective:
+        starts = origins
+        targets = origins + 1000 * vectors
+    else:
+        starts = origins + 1000 * vectors
+        targets = starts - 2000 * vectors
+    
+    mx = np.array(ob.matrix_world)
+    imx = np.array(ob.matrix_world.inverted())
+    hits, normals, faces = ray_cast_local(ob, transform_points(imx, starts), transform_points(imx, targets), bvh)
+    
+    hits = transform_points(mx, hits)
+    
+    #normals go by the inverse transpose
+    normals = normals.dot(imx[:3,:3])
+    lens = np.sqrt((normals**2).sum(axis = 1))
+    normals[lens > 0] /= lens[lens > 0][:,None]
+    
+    if settings.debug > 1:
+        print('batch ray cast %d rays, %d hits' % (len(faces), np.count_nonzero(faces != -1)))
+    
+    return hits, normals, faces
+
+def thin_screen_points(points, spacing):
+    '''
+    drops drawn points closer than spacing pixels to the last point
+    kept, so how dense the input is (tablet vs mouse, fast vs slow
+    strokes) doesn't change the stroke.  The end points are always kept
+    '''
+    if len(points) < 3:
+        return list(points)
+    
+    kept = [points[0]]
+    for v in points[1:-1]:
+        if math.hypot(v[0] - kept[-1][0], v[1] - kept[-1][1]) >= spacing:
+            kept.append(v)
+    kept.append(points[-1])
+    return kept
+
+
+def point_line_distances(points, a, b):
+    '''
+    distance from each row of an N x 3 array to the line through a
+    and b, the same thing perp_vector_point_line(a, b, pt).length gives
+    '''
+    ab = b - a
+    ap = points - a
+    l2 = ab.dot(ab)
+    if l2 == 0:
+        return np.sqrt((ap**2).sum(axis = 1))
+    perp = ap - np.outer(ap.dot(ab) / l2, ab)
+    return np.sqrt((perp**2).sum(axis = 1))
+
+def relax_array(verts, factor = .75, iterations = 1, pinned = None):
+    '''
+    relax for an N x 3 array, every vert at once each iteration.
+    The first and last verts, and any marked in the bool mask
+    pinned, are left where they are.
+    returns a new array
+    '''
+    verts = np.array(verts, dtype = np.float64).reshape(-1, 3)
+    if len(verts) < 4:
+        print('not enough verts to relax')
+        return verts
+    
+    free = np.ones(len(verts) - 2, dtype = bool)
+    if pinned is not None:
+        free = ~pinned[1:-1]
+    
+    inner = verts[1:-1]
+    for i in range(iterations):
+        d = .5 * (verts[:-2] + verts[2:]) - inner
+        inner[free] += factor * d[free]
+    
+    return verts
+
+def cumulative_lengths(verts):
+    '''
+    arc length from the first vert to each vert of an N x 3 array
+    '''
+    if not len(verts):
+        return np.zeros(0)
+    steps = np.sqrt((np.diff(verts, axis = 0)**2).sum(axis = 1))
+    return np.concatenate(([0], np.cumsum(steps)))
+
+def points_along_path(verts, cumulative, targets):
+    '''
+    the points at arc lengths targets along an N x 3 path, and
+    the index of the path vert before each one
+    '''
+    inds = np.clip(np.searchsorted(cumulative, targets, side = 'right') - 1, 0, max(len(verts) - 2, 0))
+    if len(verts) < 2:
+        return verts[inds], inds
+    
+    seg = cumulative[inds + 1] - cumulative[inds]
+    t = np.zeros(len(targets))
+    ok = seg > 0
+    t[ok] = (targets[ok] - cumulative[inds][ok]) / seg[ok]
+    t = np.clip(t, 0, 1)
+    return verts[inds] + t[:,None] * (verts[inds + 1] - verts[inds]), inds
+
+def smooth_samples(values, width):
+    '''
+    box filter along a path, the ends are averaged over
+    the samples that are there rather than padded
+    '''
+    if len(values) < 3 or width < 2:
+        return np.array(values, dtype = np.float64)
+    box = np.ones(min(width, len(values)))
+    return np.convolve(values, box, 'same') / np.convolve(np.ones(len(values)), box, 'same')
+
+def path_curvature(verts, cumulative):
+    '''
+    discrete curvature at each vert of an N x 3 path, the angle it
+    turns through over the length it is spread across.  The ends are 0
+    '''
+    n = len(verts)
+    curvature = np.zeros(n)
+    if n < 3:
+        return curvature
+
+    steps = np.diff(verts, axis = 0)
+    lens = np.diff(cumulative)
+    ok = lens > 0
+    steps[ok] /= lens[ok][:,None]
+
+    cos = np.clip((steps[:-1] * steps[1:]).sum(axis = 1), -1, 1)
+    spread = .5 * (lens[:-1] + lens[1:])
+    turn = np.arccos(cos)
+    turn[~(ok[:-1] & ok[1:])] = 0
+    curvature[1:-1][spread > 0] = turn[spread > 0] / spread[spread > 0]
+    return curvature
+
+def second_derivative(values, cumulative):
+    '''
+    d2 values / ds2 along a path with uneven spacing, 0 at the ends
+    '''
+    n = len(values)
+    d2 = np.zeros(n)
+    if n < 3:
+        return d2
+
+    ds = np.maximum(np.diff(cumulative), 1e-12)
+    slope = np.diff(values) / ds
+    d2[1:-1] = np.diff(slope) / (.5 * (ds[:-1] + ds[1:]))
+    return d2
+
+def surface_thickness(ob, pts, bvh = None):
+    '''
+    distance straight through the form from each world space surface
+    point, cast in against the surface normal.  nan where the ray
+    gets out without hitting anything (open meshes, thin edges)
+    '''
+    pts = np.asarray(pts, dtype = np.float64).reshape(-1, 3)
+    thickness = np.full(len(pts), np.nan)
+    if not len(pts):
+        return thickness
+
+    mx = np.array(ob.matrix_world)
+    imx = np.array(ob.matrix_world.inverted())
+    locs, normals, faces = closest_points_local(ob, transform_points(imx, pts), bvh)
+
+    lens = np.sqrt((normals**2).sum(axis = 1))
+    ok = (faces != -1) & (lens > 0)
+    normals[ok] /= lens[ok][:,None]
+
+    corners = np.array([tuple(v) for v in ob.bound_box])
+    reach = np.sqrt(((corners.max(axis = 0) - corners.min(axis = 0))**2).sum())
+    starts = locs - 1e-5 * reach * normals
+    targets = locs - reach * normals
+    hits, hit_normals, hit_faces = ray_cast_local(ob, starts[ok], targets[ok], bvh)
+
+    through = np.zeros(len(hits))
+    hit = hit_faces != -1
+    through[hit] = np.sqrt(((transform_points(mx, hits[hit]) - transform_points(mx, locs[ok][hit]))**2).sum(axis = 1))
+    through[~hit] = np.nan
+    thickness[ok] = through
+    return thickness
+
+def ring_density(cumulative, curvature, radii, error, ring_segments):
+    '''
+    how many rings per unit length each point of a path wants.
+
+    A straight span h long cuts across an arc of curvature k by k*h^2/8,
+    and rings interpolated linearly across a changing radius miss it by
+    r''*h^2/8, so each gives a spacing sqrt(8*e/k) for an allowed error
+    e, which is taken as error * the local radius.  Either way the
+    spacing is kept within 1/2 and 2 times the length of a ring edge,
+    so the quads never get more than twice as long as they are wide.
+
+    radii:  cross section radius at each point
+    ring_segments:  verts per ring
+    '''
+    radii = np.maximum(radii, 1e-6)
+    allowed = 8 * error * radii
+
+    bend = np.sqrt(curvature / allowed)
+    swell = np.sqrt(np.abs(second_derivative(radii, cumulative)) / allowed)
+
+    quad = 2 * math.pi * radii / ring_segments
+    density = np.maximum(np.maximum(bend, swell), .5 / quad)
+    return np.minimum(density, 2 / quad)
 
 def relax(verts, factor = .75, in_place = True):
     '''
@@ -544,6 +923,21 @@ def draw_polyline_from_3dpoints(context, points_3d, color, thickness, LINE_TYPE)
         bgl.glLineWidth(1)
     return
     
+def draw_quads_from_points(context, points, color):
+    '''
+    a simple way to draw a set of quads
+    args:
+        points: a list of tuples representing x,y SCREEN coordinate eg [(10,30),(11,31),...]
+        color: tuple (r,g,b,a)
+    '''
+    bgl.glEnable(bgl.GL_BLEND)
+    bgl.glColor4f(*color)
+    bgl.glBegin(bgl.GL_QUADS)
+    for coord in points:  
+        bgl.glVertex2f(*coord)
+    bgl.glEnd()  
+    return
+
 def draw_quads_from_3dpoints(context, points_3d, color):
     '''
     a simple way to draw a set of quads
@@ -626,91 +1020,45 @@ def diagonal_verts(verts):
     return diag
 
 
-def calculate_com_normal(locs):
-    '''
-    computes a center of mass (CoM) and a normal of provided roughly planar locs
-    notes:
-    - uses random sampling
-    - does not assume a particular order of locs
-    - may compute the negative of "true" normal
-    '''
-    com = sum((loc for loc in locs), Vector((0,0,0))) / len(locs)
-    # get locations wrt to com
-    llocs = [loc-com for loc in locs]
-    ac = Vector((0,0,0))
-    first = True
-    for i in range(len(locs)):
-        lp0,lp1 = random.sample(llocs,2)
-        c = lp0.cross(lp1).normalized()
-        if first:
-            ac = c
-            first = False
-        else:
-            if ac.dot(c) < 0:
-                ac -= c
-            else:
-                ac += c
-    return (com, ac.normalized())
-
-#TODO: CREDIT
-#TODO: LINK
-def calculate_best_plane(locs):
-    
-    # calculating the center of masss
-    com = Vector()
-    for loc in locs:
-        com += loc
-    com /= len(locs)
-    x, y, z = com
-    
-    
-    # creating the covariance matrix
-    mat = Matrix(((0.0, 0.0, 0.0),
-                  (0.0, 0.0, 0.0),
-                  (0.0, 0.0, 0.0),
-                 ))
-    
-    for loc in locs:
-        mat[0][0] += (loc[0]-x)**2
-        mat[1][0] += (loc[0]-x)*(loc[1]-y)
-        mat[2][0] += (loc[0]-x)*(loc[2]-z)
-        mat[0][1] += (loc[1]-y)*(loc[0]-x)
-        mat[1][1] += (loc[1]-y)**2
-        mat[2][1] += (loc[1]-y)*(loc[2]-z)
-        mat[0][2] += (loc[2]-z)*(loc[0]-x)
-        mat[1][2] += (loc[2]-z)*(loc[1]-y)
-        mat[2][2] += (loc[2]-z)**2
-    
-    # calculating the normal to the plane
-    normal = False
-    try:
-        mat.invert()
-    except:
-        if sum(mat[0]) == 0.0:
-            normal = Vector((1.0, 0.0, 0.0))
-        elif sum(mat[1]) == 0.0:
-            normal = Vector((0.0, 1.0, 0.0))
-        elif sum(mat[2]) == 0.0:
-            normal = Vector((0.0, 0.0, 1.0))
-    if not normal:
-        # warning! this is different from .normalize()
-        itermax = 500
-        iter = 0
-        vec = Vector((1.0, 1.0, 1.0))
-        vec2 = (mat * vec)/(mat * vec).length
-        while vec != vec2 and iter<itermax:
-            iter+=1
-            vec = vec2
-            vec2 = mat * vec
-            if vec2.length != 0:
-                vec2 /= vec2.length
-        if vec2.length == 0:
-            vec2 = Vector((1.0, 1.0, 1.0))
-        normal = vec2
-    
-    return(com, normal)
-    
-def cross_section(bme, mx, point, normal, debug = True):
+def calculate_best_plane(locs, orient = None):
+    '''
+    least squares plane through locs, see contour_planes.
+    returns the center of mass and normal as Vectors, and the rms
+    distance of locs from the plane
+    '''
+    com, normal, residual = fit_plane(locs, orient)
+    return Vector(com), Vector(normal), residual
+    
+def plane_band_faces(bme, pt, no, bvh = None):
+    '''
+    the BMFaces a plane (pt, no in local coords) might pass through.
+    With the TriangleBVH of bme that's only the faces it actually
+    crosses, found without visiting the rest of the mesh.  Without
+    one, or if bme has changed since the bvh was built, every face
+    '''
+    if bvh is None or not len(bvh) or bvh.n_faces != len(bme.faces):
+        return list(bme.faces)
+    
+    bver = '%03d.%03d.%03d' % (bpy.app.version[0],bpy.app.version[1],bpy.app.version[2])
+    if bver > '002.072.000':
+        bme.faces.ensure_lookup_table()
+    
+    return [bme.faces[int(i)] for i in bvh.faces_crossing_plane(pt, no)]
+
+def plane_band_edges(bme, pt, no, bvh = None):
+    '''
+    the BMEdges a plane might cross, the edges of plane_band_faces.
+    Every edge of the mesh if there is no bvh to narrow it down
+    '''
+    if bvh is None or not len(bvh) or bvh.n_faces != len(bme.faces):
+        return list(bme.edges)
+    
+    edges = set()
+    for f in plane_band_faces(bme, pt, no, bvh):
+        edges.update(f.edges)
+    return sorted(edges, key = lambda ed: ed.index)
+
+def cross_section(bme, mx, point, normal, debug = True, bvh = None):
     '''
     Takes a mesh and associated world matrix of the object and returns a cross secion in local
     space.
@@ -720,6 +1068,8 @@ def cross_section(bme, mx, point, normal, debug = True):
         mx:   World matrix (type Mathutils.Matrix)
         point: any point on the cut plane in world coords (type Mathutils.Vector)
         normal:  plane normal direction (type Mathutisl.Vector)
+        bvh:  TriangleBVH of bme, only the edges around the faces the
+              plane crosses are tested instead of every edge
     '''
     
     times = []
@@ -743,7 +1093,7 @@ def cross_section(bme, mx, point, normal, debug = True):
     
     edge_mapping = {}  #perhaps we should use bmesh becaus it stores the great cycles..answer yup
     
-    for ed in bme.edges:
+    for ed in plane_band_edges(bme, pt, no, bvh):
         
         A = ed.verts[0].co
         B = ed.verts[1].co
@@ -761,7 +1111,7 @@ def cross_section(bme, mx, point, normal, debug = True):
             
             if a_proj == 0:
                
-                edge_mapping[len(verts)] = ed.link_faces
+                edge_mapping[len(verts)] = [f.index for f in ed.link_faces]
                 verts.append(1/2 * (A +B)) #put a midpoing since both are coplanar
 
         else:
@@ -784,14 +1134,18 @@ def cross_section(bme, mx, point, normal, debug = True):
         times.append(time.time())
         print('calced intersections %f sec' % (times[n]-times[n-1]))
        
-    #iterate through smartly to create edge keys          
+    #verts which came from edges of the same face are connected
+    face_verts = {}
     for i in range(0,len(verts)):
-        a_faces = set(edge_mapping[i])
-        for m in range(i,len(verts)):
-            if m != i:
-                b_faces = set(edge_mapping[m])
-                if a_faces & b_faces:
-                    eds.append((i,m))
+        for f in edge_mapping[i]:
+            face_verts.setdefault(f, []).append(i)
+    
+    keys = set()
+    for inds in face_verts.values():
+        for n, i in enumerate(inds):
+            for m in inds[n+1:]:
+                keys.add((i,m))
+    eds = sorted(keys)
     
     if debug:
         n = len(times)
@@ -930,6 +1284,130 @@ def diagonal(bounds):
     
 #adapted from opendentalcad then to pie menus now here
 
+def loop_windings(points, verts, counts):
+    '''
+    winding numbers of 2d points around packed 2d loops, by the
+    crossing rule (+1 crossing upward left of an edge, -1 crossing
+    downward right of one), every point against every edge at once
+    
+    args:
+    points: Q x M x 2, each query point in the space of each loop
+    verts: E x 2, the loops one after the other, closed implicitly
+    counts: verts in each loop, all > 0, adding up to E
+    
+    return:
+        Q x M int array, non zero for points inside
+    '''
+    counts = np.asarray(counts, dtype = np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    loop_id = np.repeat(np.arange(len(counts)), counts)
+    
+    nxt = np.arange(len(verts)) + 1
+    nxt[starts + counts - 1] = starts
+    a = verts
+    b = verts[nxt]
+    
+    q = points[:, loop_id]
+    qx, qy = q[:,:,0], q[:,:,1]
+    is_left = (b[:,0] - a[:,0]) * (qy - a[:,1]) - (qx - a[:,0]) * (b[:,1] - a[:,1])
+    up = (a[:,1] <= qy) & (b[:,1] > qy) & (is_left > 0)
+    down = (a[:,1] > qy) & (b[:,1] <= qy) & (is_left < 0)
+    
+    return np.add.reduceat(up.astype(np.int64) - down, starts, axis = 1)
+
+def plane_bases(nos):
+    '''
+    orthonormal x and y axes (M x 3 each) in the planes of M unit
+    normals, right handed with z along the normal
+    '''
+    nos = np.asarray(nos, dtype = np.float64).reshape(-1, 3)
+    helper = np.zeros(nos.shape)
+    helper[np.arange(len(nos)), np.abs(nos).argmin(axis = 1)] = 1
+    
+    X = helper - (helper * nos).sum(axis = 1)[:,None] * nos
+    X /= np.maximum(np.sqrt((X * X).sum(axis = 1)), 1e-12)[:,None]
+    Y = np.cross(nos, X)
+    return X, Y
+
+def points_inside_loops(points, loops, nos, p_pts = None, threshold = .01, bbox = False):
+    '''
+    classifies every point against every loop in one go.  Each loop
+    and the points are projected into the loop's plane with one
+    matrix product, and inside is a non zero winding number.
+    
+    args:
+       points - Q 3d points to test
+       loops - M loops of 3d verts, closed implicitly
+       nos - M plane normals
+       p_pts - M points on the planes, COM of each loop if None
+       threshold - how far from a plane a point can be and still
+                   be tested against its loop
+       bbox - test against the bounding box of each loop in its
+              plane instead of the loop itself
+                   
+    return: Q x M bool array, True where point is inside loop
+    '''
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 3)
+    inside = np.zeros((len(points), len(loops)), dtype = bool)
+    
+    nos = np.asarray(nos, dtype = np.float64).reshape(-1, 3)
+    lengths = np.sqrt((nos * nos).sum(axis = 1))
+    
+    #loops need 3 verts and a normal to be a loop at all
+    valid = np.array([len(loop) >= 3 for loop in loops], dtype = bool) & (lengths > 0)
+    if not len(points) or not valid.any():
+        return inside
+    
+    use = np.nonzero(valid)[0]
+    counts = np.array([len(loops[i]) for i in use], dtype = np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    verts = np.concatenate([vert_array(loops[i]) for i in use])
+    loop_id = np.repeat(np.arange(len(use)), counts)
+    
+    nos = nos[use] / lengths[use][:,None]
+    if p_pts is None:
+        p_pts = np.add.reduceat(verts, starts, axis = 0) / counts[:,None]
+    else:
+        p_pts = np.asarray(p_pts, dtype = np.float64).reshape(-1, 3)[use]
+    
+    X, Y = plane_bases(nos)
+    axes = np.stack((X, Y), axis = 2)  #M x 3 x 2
+    
+    #loop verts each into their own plane, query points into all of them
+    local = ((verts - p_pts[loop_id])[:,:,None] * axes[loop_id]).sum(axis = 1)
+    flat = np.dot(points, axes.transpose(1, 0, 2).reshape(3, -1)).reshape(len(points), len(use), 2)
+    flat -= (p_pts[:,:,None] * axes).sum(axis = 1)
+    
+    near = np.abs(np.dot(points, nos.T) - (p_pts * nos).sum(axis = 1)) <= threshold
+    
+    if bbox:
+        lo = np.minimum.reduceat(local, starts, axis = 0)
+        hi = np.maximum.reduceat(local, starts, axis = 0)
+        in_loop = ((flat >= lo) & (flat <= hi)).all(axis = 2)
+    else:
+        in_loop = loop_windings(flat, local, counts) != 0
+    
+    inside[:, use] = near & in_loop
+    return inside
+
+def line_plane_crossings(A, B, pt, no):
+    '''
+    intersect_line_plane for N lines at once, the lines through
+    A[i] and B[i] against the plane through pt with normal no
+    
+    returns the N x 3 crossings and a mask of the lines which
+    actually cross (aren't parallel to the plane)
+    '''
+    A = np.asarray(A, dtype = np.float64).reshape(-1, 3)
+    B = np.asarray(B, dtype = np.float64).reshape(-1, 3)
+    no = np.asarray(no, dtype = np.float64)
+    
+    d = B - A
+    denom = np.dot(d, no)
+    hit = np.abs(denom) > 1e-12
+    t = np.where(hit, np.dot(np.asarray(pt, dtype = np.float64) - A, no) / np.where(hit, denom, 1), 0)
+    return A + t[:,None] * d, hit
+
 def point_inside_loop2d(loop, point):
     '''
     args:
@@ -941,32 +1419,12 @@ def point_inside_loop2d(loop, point):
     return:
         True if point is inside loop
     '''    
-    #test arguments type
-    ptype = str(type(point))
-    ltype = str(type(loop[0]))
-    nverts = len(loop)
-           
-    if 'Vector' not in ptype:
-        point = Vector(point)
-        
-    if 'Vector' not in ltype:
-        for i in range(0,nverts):
-            loop[i] = Vector(loop[i])
-        
-    #find a point outside the loop and count intersections
-    out = Vector(outside_loop_2d(loop))
-    intersections = 0
-    for i in range(0,nverts):
-        a = Vector(loop[i-1])
-        b = Vector(loop[i])
-        if intersect_line_line_2d(point,out,a,b):
-            intersections += 1
-    
-    inside = False
-    if math.fmod(intersections,2):
-        inside = True
+    if len(loop) < 3:
+        return False
     
-    return inside
+    verts = np.array([v[:2] for v in loop], dtype = np.float64)
+    point = np.array(point[:2], dtype = np.float64).reshape(1, 1, 2)
+    return bool(loop_windings(point, verts, [len(verts)])[0,0])
 
 def generic_axes_from_plane_normal(p_pt, no):
     '''
@@ -1027,8 +1485,7 @@ def point_inside_loop_almost3D(pt, verts, no, p_pt = None, threshold = .01, debu
     http://blenderartists.org/forum/showthread.php?259085-Brainstorming-for-Virtual-Buttons&highlight=point+inside+loop
     args:
        pt - 3d point to test of type Mathutils.Vector
-       verts - 3d points representing the loop  
-               TODO:  verts[0] == verts[-1] or implied?
+       verts - 3d points representing the loop, closed implicitly
                list with elements of type Mathutils.Vector
        no - plane normal
        plane_pt - a point on the plane.
@@ -1037,6 +1494,8 @@ def point_inside_loop_almost3D(pt, verts, no, p_pt = None, threshold = .01, debu
                    default = .01
                    
        debug - Bool, default False.  Will print performance if True
+       
+    one point against one loop, see points_inside_loops for many
                    
     return: Bool True if point is inside the loop
     '''
@@ -1051,37 +1510,11 @@ def point_inside_loop_almost3D(pt, verts, no, p_pt = None, threshold = .01, debu
         print('normal vector must be non zero')
         return False
     
-    if not p_pt:
-        p_pt = get_com(verts)
-    
-    if distance_point_to_plane(pt, p_pt, no) > threshold:
-        return False
-    
-    (X_prime, Y_prime) = generic_axes_from_plane_normal(p_pt, no)
-    
-    verts_prime = []
-    
-    for v in verts:
-        v_trans = v - p_pt
-        vx = v_trans.dot(X_prime)
-        vy = v_trans.dot(Y_prime)
-        verts_prime.append(Vector((vx, vy)))
-    
-    bounds = bound_box(verts_prime)
-    
-    bound_loop = [Vector((bounds[0][0],bounds[1][0])),
-                  Vector((bounds[0][1],bounds[1][0])),
-                  Vector((bounds[0][1],bounds[1][1])),
-                  Vector((bounds[0][0],bounds[1][1]))]                       
-    #transform the test point into the new plane x,y space
-    pt_trans = pt - p_pt
-    pt_prime = Vector((pt_trans.dot(X_prime), pt_trans.dot(Y_prime)))
+    p_pts = None if p_pt is None else [p_pt]
+    pt_in_loop = bool(points_inside_loops([pt], [verts], [no], p_pts, threshold, bbox)[0,0])
     
-    if bbox:
-        print('intersected the bbox')
-        pt_in_loop = point_inside_loop2d(bound_loop, pt_prime)
-    else:                  
-        pt_in_loop = point_inside_loop2d(verts_prime, pt_prime)
+    if debug:
+        print('point in loop test in %f seconds' % (time.time() - start))
     
     return pt_in_loop
 
@@ -1326,7 +1759,184 @@ def space_evenly_on_path(verts, edges, segments, shift = 0, debug = False):  #pr
         print(eds)
         
     return new_verts, eds
- 
+
+def vert_array(verts):
+    '''
+    N x 3 array of a list of Vectors, or of a VectorArray,
+    whose packed buffer is read straight off
+    '''
+    if getattr(verts, 'stride', None) == 3:
+        return verts.view().astype(np.float64)
+    return np.array(verts, dtype = np.float64).reshape(-1, 3)
+
+def chain_edges(n_verts, cyclic):
+    '''
+    (0,1),(1,2)... for n_verts in a row, closed back to 0 if cyclic
+    '''
+    eds = [(i, i+1) for i in range(n_verts - 1)]
+    if cyclic and n_verts > 2:
+        eds.append((n_verts - 1, 0))
+    return eds
+
+def resample_loop(verts, cyclic, segments, shift = 0, feature = 1):
+    '''
+    space_evenly_on_path, but the length the new verts are spaced
+    along also counts how far the loop turns.  Every radian turned
+    through adds feature * loop length / 2pi, so on a circle it's the
+    same as even spacing while corners and tight bends pull in extra
+    verts at the expense of long flat stretches.
+
+    verts:  N x 3, ordered along the loop
+    returns the new verts as an array, segments of them for a cyclic
+    loop and segments + 1 (end points kept) for an open one
+    '''
+    pts = np.asarray(verts, dtype = np.float64).reshape(-1, 3)
+    if cyclic:
+        pts = np.vstack((pts, pts[:1]))
+
+    steps = np.diff(pts, axis = 0)
+    lens = np.sqrt((steps**2).sum(axis = 1))
+    total = lens.sum()
+    if total == 0 or segments < 1:
+        return pts[:max(segments, 1)].copy()
+
+    ok = lens > 0
+    steps[ok] /= lens[ok][:,None]
+    if cyclic:
+        prev, prev_ok = np.roll(steps, 1, axis = 0), np.roll(ok, 1)
+    else:
+        prev, prev_ok = np.vstack((steps[:1], steps[:-1])), np.concatenate((ok[:1], ok[:-1]))
+    turn = np.arccos(np.clip((prev * steps).sum(axis = 1), -1, 1))  #at the start of each step
+    turn[~(ok & prev_ok)] = 0
+
+    #half of each vert's turn goes either side of it
+    turn_ends = np.roll(turn, -1) if cyclic else np.concatenate((turn[1:], [0]))
+    warped = lens + feature * total / (2 * math.pi) * .5 * (turn + turn_ends)
+    cumulative = np.concatenate(([0], np.cumsum(warped)))
+
+    if cyclic:
+        targets = np.fmod((np.arange(segments) + shift) / segments * cumulative[-1], cumulative[-1])
+        targets[targets < 0] += cumulative[-1]
+    else:
+        targets = np.linspace(0, cumulative[-1], segments + 1)
+
+    return np.column_stack([np.interp(targets, cumulative, pts[:,k]) for k in range(3)])
+
+def polyline_distances(points, verts, cyclic, chunk = 1024):
+    '''
+    distance from each of points to the nearest edge of the
+    polyline through verts
+    '''
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 3)
+    verts = np.asarray(verts, dtype = np.float64).reshape(-1, 3)
+    b = np.roll(verts, -1, axis = 0) if cyclic else verts[1:]
+    a = verts[:len(b)]
+    if not len(a):
+        return np.sqrt(((points - verts[0])**2).sum(axis = 1))
+
+    ab = b - a
+    l2 = np.maximum((ab**2).sum(axis = 1), 1e-24)
+    dists = np.empty(len(points))
+    for i in range(0, len(points), chunk):
+        ap = points[i:i+chunk,None,:] - a[None,:,:]
+        t = np.clip((ap * ab).sum(axis = 2) / l2, 0, 1)
+        perp = ap - t[:,:,None] * ab
+        dists[i:i+chunk] = np.sqrt((perp**2).sum(axis = 2).min(axis = 1))
+    return dists
+
+def resample_error(verts, cyclic, new_verts):
+    '''
+    how far the original loop gets from its resampled version
+    '''
+    if not len(verts) or not len(new_verts):
+        return 0
+    return polyline_distances(verts, new_verts, cyclic).max()
+
+def fewest_loop_segments(verts, cyclic, tolerance, max_segments, shift = 0, min_segments = 3):
+    '''
+    the fewest segments, up to max_segments, that resample_loop can
+    space along verts and stay within tolerance of them.  The error
+    doesn't go down steadily as segments go up (where the new verts
+    land against the corners matters), so every count is tried from
+    min_segments up until one fits.  Each try is one vectorized
+    resample, and max_segments is the loop's ring_segments
+    '''
+    verts = vert_array(verts)
+    
+    for segments in range(min(min_segments, max_segments), max_segments):
+        if resample_error(verts, cyclic, resample_loop(verts, cyclic, segments, shift)) <= tolerance:
+            return segments
+    return max_segments
+
+def match_loop_count(verts, cyclic, n_verts):
+    '''
+    verts evenly respaced to n_verts, from the same first vert, so
+    loops with different counts can be compared vert for vert
+    '''
+    if len(verts) == n_verts or len(verts) < 2:
+        return verts
+    segments = n_verts if cyclic else n_verts - 1
+    return [Vector(v) for v in resample_loop(vert_array(verts), cyclic, segments, feature = 0)]
+
+def loop_params(verts, cyclic):
+    '''
+    how far around the loop each vert is, 0 to 1
+    '''
+    pts = np.asarray(verts, dtype = np.float64).reshape(-1, 3)
+    if cyclic:
+        pts = np.vstack((pts, pts[:1]))
+    cumulative = np.concatenate(([0], np.cumsum(np.sqrt((np.diff(pts, axis = 0)**2).sum(axis = 1)))))
+    if cumulative[-1] == 0:
+        return np.linspace(0, 1, len(cumulative))
+    return cumulative / cumulative[-1]
+
+def stitch_loops(verts_a, verts_b, cyclic):
+    '''
+    Faces to bridge two aligned loops with different vert counts.
+    Walks around both at once, at each step moving along a, along b,
+    or along both (a quad), whichever keeps the two closest in how far
+    around they are.  So the counts can differ by anything and the
+    difference is taken up by triangles spread around the strip.
+
+    a's verts are indexed 0..len(a)-1 and b's follow on after them
+    returns faces, and the (a, b) pairs of every edge across the strip
+    '''
+    na, nb = len(verts_a), len(verts_b)
+    ua = loop_params(verts_a, cyclic)
+    ub = loop_params(verts_b, cyclic)
+    end_a = na if cyclic else na - 1
+    end_b = nb if cyclic else nb - 1
+
+    def a(i):
+        return i % na
+
+    def b(j):
+        return na + j % nb
+
+    faces = []
+    links = [(0, na)]
+    i = j = 0
+    while i < end_a or j < end_b:
+        both = abs(ua[i+1] - ub[j+1]) if i < end_a and j < end_b else float('inf')
+        step_a = abs(ua[i+1] - ub[j]) if i < end_a else float('inf')
+        step_b = abs(ua[i] - ub[j+1]) if j < end_b else float('inf')
+
+        if both <= step_a and both <= step_b:
+            faces.append((a(i), a(i+1), b(j+1), b(j)))
+            i += 1
+            j += 1
+        elif step_a <= step_b:
+            faces.append((a(i), a(i+1), b(j)))
+            i += 1
+        else:
+            faces.append((a(i), b(j+1), b(j)))
+            j += 1
+        links.append((a(i), b(j)))
+
+    if cyclic:
+        links.pop()  #back where it started
+    return faces, links
+
 def list_shift(seq, n):
     n = n % len(seq)
     return seq[n:] + seq[:n]
@@ -1425,7 +2035,7 @@ def point_in_tri(P, A, B, C):
     #Check if point is in triangle
     return (u >= 0) & (v >= 0) & (u + v < 1)
 
-def com_mid_ray_test(new_cut, established_cut, obj, search_factor = .5):
+def com_mid_ray_test(new_cut, established_cut, obj, search_factor = .5, bvh = None):
     '''
     function used to test intial validity of a connection
     between two cuts.
@@ -1435,6 +2045,7 @@ def com_mid_ray_test(new_cut, established_cut, obj, search_factor = .5):
         existing_cut: ContourCutLine
         obj: The retopo object
         search_factor:  percentage of object bbox diagonal to search
+        bvh:  TriangleBVH of obj, if there is one
         aim:  False or angle that new cut COM must fall within compared
               to existing plane normal.  Eg...pi/4 would be a 45 degree
               aiming cone
@@ -1467,9 +2078,9 @@ def com_mid_ray_test(new_cut, established_cut, obj, search_factor = .5):
     search_radius = 100
     imx = obj.matrix_world.inverted()     
             
-    hit = obj.ray_cast(imx * (C + search_radius * ray), imx * (C - search_radius * ray))
+    hit = ray_cast_local(obj, [imx * (C + search_radius * ray)], [imx * (C - search_radius * ray)], bvh)
             
-    if hit[2] != -1:
+    if hit[2][0] != -1:
         return True
     else:
         return False
@@ -1650,105 +2261,172 @@ def nearest_point(test_vert, vert_list):
     find the closest point to a test vert from a
     list of vertices
     
-    Brute force
-    Not fast
-    not smart
+    Brute force, but all at once.  For repeated queries
+    against the same verts use a contour_kdtree.KDTree
     
     return index in list
     '''    
     
-    lens = [None]*len(vert_list)
-    
-    for i,v in enumerate(vert_list):
-        R = test_vert - v
-        lens[i] = R.length
-        
-    smallest = min(lens)
-    n = lens.index(smallest)
+    d2 = ((vert_array(vert_list) - np.asarray(test_vert, dtype = np.float64))**2).sum(axis = 1)
+    return int(d2.argmin())
     
-    return n
+def path_segments(path, cyclic):
+    '''
+    start and end of every edge of a vert path as two N x 3
+    arrays, the closing edge included if it's cyclic
+    '''
+    pts = np.asarray(path, dtype = np.float64).reshape(-1, 3)
+    if cyclic and len(pts) > 2:
+        return pts, np.roll(pts, -1, axis = 0)
+    return pts[:-1], pts[1:]
+
+def grid_cells(lo, hi, origin, cell, dims):
+    '''
+    the grid cells every box from lo to hi touches, in a grid of
+    dims cells from origin.  returns the index of the box each cell
+    belongs to and one integer key per cell
+    '''
+    c0 = np.floor((lo - origin) / cell).astype(np.int64)
+    c1 = np.floor((hi - origin) / cell).astype(np.int64)
+    span = c1 - c0 + 1
+    n_cells = span.prod(axis = 1)
+
+    owner = np.repeat(np.arange(len(lo)), n_cells)
+    #position of each cell within its box's span, x fastest
+    k = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+    sx, sy = span[owner, 0], span[owner, 1]
+    cells = c0[owner] + np.column_stack((k % sx, (k // sx) % sy, k // (sx * sy)))
+
+    keys = (cells[:,2] * dims[1] + cells[:,1]) * dims[0] + cells[:,0]
+    return owner, keys
+
+def closest_between_segments(p1, q1, p2, q2):
+    '''
+    closest points between row matched segments p1-q1 and p2-q2
+    returns the parameter along each segment and the distance
+    '''
+    d1 = q1 - p1
+    d2 = q2 - p2
+    r = p1 - p2
+    a = (d1 * d1).sum(axis = 1)
+    e = (d2 * d2).sum(axis = 1)
+    b = (d1 * d2).sum(axis = 1)
+    c = (d1 * r).sum(axis = 1)
+    f = (d2 * r).sum(axis = 1)
+
+    a_safe = np.where(a > 0, a, 1)
+    e_safe = np.where(e > 0, e, 1)
+    denom = a * e - b * b
+
+    s = np.zeros(len(a))
+    ok = denom > 1e-12 * a * e
+    s[ok] = np.clip((b[ok] * f[ok] - c[ok] * e[ok]) / denom[ok], 0, 1)
+    t = np.where(e > 0, (b * s + f) / e_safe, 0)
+
+    low = t < 0
+    t[low] = 0
+    s[low] = np.clip(-c[low] / a_safe[low], 0, 1)
+    high = t > 1
+    t[high] = 1
+    s[high] = np.clip((b[high] - c[high]) / a_safe[high], 0, 1)
+    s[a == 0] = 0
+
+    gap = (p1 + s[:,None] * d1) - (p2 + t[:,None] * d2)
+    return s, t, np.sqrt((gap**2).sum(axis = 1))
+
+#below this many edge pairs intersect_paths tests them all
+all_pairs_limit = 2**16
+
+def grid_pairs(p1, q1, p2, q2, threshold):
+    '''
+    the (i, j) pairs of edges p1-q1 and p2-q2 whose boxes, grown by
+    threshold, share a cell of a uniform grid.
     
-def intersect_paths(path1, path2, cyclic1 = False, cyclic2 = False, threshold = .00001):
+    Cells start about an edge long.  A few long edges among many short
+    ones would each cover a huge number of those, so the cell is
+    doubled until all the boxes together cover no more than a few
+    cells per edge.
     '''
-    intersects vert paths
+    lo1, hi1 = np.minimum(p1, q1) - threshold, np.maximum(p1, q1) + threshold
+    lo2, hi2 = np.minimum(p2, q2) - threshold, np.maximum(p2, q2) + threshold
+    lo, hi = np.vstack((lo1, lo2)), np.vstack((hi1, hi2))
+    
+    origin = lo.min(axis = 0)
+    extent = hi.max(axis = 0) - origin
+    lens = np.sqrt(((hi - lo)**2).sum(axis = 1))
+    cell = max(np.median(lens), np.sqrt((extent**2).sum()) / 1024, 2 * threshold)
     
-    returns a list of intersections (verts)
-    returns a list of vert index pairs that corresponds to the
-    first vert of the edge in path1 and path 2 where the intersection
-    occurs
+    budget = 8 * len(lo)
+    while True:
+        span = np.floor((hi - origin) / cell) - np.floor((lo - origin) / cell) + 1
+        if span.prod(axis = 1).sum() <= budget:
+            break
+        cell *= 2
+    dims = np.floor(extent / cell).astype(np.int64) + 1
+    
+    owner1, keys1 = grid_cells(lo1, hi1, origin, cell, dims)
+    owner2, keys2 = grid_cells(lo2, hi2, origin, cell, dims)
     
-    eg...if the 10th of path 1 intersectts with the 5th edge of path 2
+    #join the two on cell key
+    order = np.argsort(keys2, kind = 'mergesort')
+    keys2, owner2 = keys2[order], owner2[order]
+    first = np.searchsorted(keys2, keys1, side = 'left')
+    last = np.searchsorted(keys2, keys1, side = 'right')
+    n_pairs = last - first
     
-    return [[intersection verst],[inds],[inds]]
+    i = np.repeat(owner1, n_pairs)
+    k = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+    j = owner2[np.repeat(first, n_pairs) + k]
     
-    Special cases are not handled well.  Eg..dont instersect two
-    clover leaf paths!
+    #edges sharing more than one cell
+    pairs = np.unique(i * len(p2) + j)
+    return pairs // len(p2), pairs % len(p2)
 
+def intersect_paths(path1, path2, cyclic1 = False, cyclic2 = False, threshold = .00001):
     '''
+    intersects vert paths, where their edges come within threshold
+    of each other.
     
-    intersections = []
-    inds_1 = []
-    inds_2 = []
+    Short paths just test every pair of edges at once.  Otherwise the
+    edges of both paths are binned into a uniform grid and only the
+    pairs which share a cell are tested, all at once.  Each crossing
+    is reported once, one that lands on a vert belongs to the edge
+    that starts there.
     
-    for i in range(0,len(path1) + 1*cyclic1 - 1):
-        
-        n = int(math.fmod(i+1, len(path1)))
-        v1 = path1[n]
-        v2 = path1[i]
-        for j in range(0,len(path2) + 1*cyclic2 - 1):
-            
-            m = int(math.fmod(j+1, len(path2)))
-            v3 = path2[m]
-            v4 = path2[j]
-            
-            #closes point on path1 edge, closes_point on path 2 edge
-            
-            intersect = intersect_line_line(v1,v2,v3,v4)
-            
-            if intersect:
-                #make sure the intersection is within the segment
-                inter_1 = intersect[0]
-                verif1 = intersect_point_line(inter_1, v1,v2)
-                
-                inter_2 = intersect[1]
-                verif2 = intersect_point_line(inter_1, v3,v4)
-            
-                diff = inter_2 - inter_1
-                if diff.length < threshold and verif1[1] > 0 and verif2[1] > 0 and verif1[1] < 1 and verif2[1] < 1:
-                    intersections.append(.5 * (inter_1 + inter_2))
-                    inds_1.append(i)
-                    inds_2.append(j)
-    
-    if len(set(inds_1)) != len(inds_1):
-        print('    ')
-        print('HELP, HELP, HELP, HELP, HELP, HELP, HELP, HELP, HELP,')
-        print('there are multiple of the same index in intersection 1')
-        print(inds_1)
-        print(inds_2)
-        print(intersections)
-        doubles = find_doubles(inds_1)
-        ind = inds_1.index(doubles[0],1)
-        
-        inds_1.pop(ind)
-        inds_2.pop(ind)
-        intersections.pop(ind)
-        
-    if len(set(inds_2)) != len(inds_2):
-        print('    ')
-        print('HELP, HELP, HELP, HELP, HELP, HELP, HELP, HELP, HELP,')
-        print('HELP, there are multipl of the same index in intersection 2')
-        print(inds_2)
-        print(inds_1)
-        print(intersections)
-        
-        doubles = find_doubles(inds_2)
-        ind = inds_2.index(doubles[0],1)
-        
-        inds_1.pop(ind)
-        inds_2.pop(ind)
-        intersections.pop(ind)
-        
-    return intersections, inds_1, inds_2
+    returns [[intersection verts],[inds],[inds],[params],[params]]
+    inds are the first vert of the edge in path1 and path2 where
+    each intersection occurs, params how far along that edge it is,
+    sorted along path1
+    
+    eg...if the 10th edge of path 1 crosses the 5th edge of path 2
+    halfway along each, inds 10 and 5, params .5 and .5
+    '''
+    p1, q1 = path_segments(path1, cyclic1)
+    p2, q2 = path_segments(path2, cyclic2)
+    if not len(p1) or not len(p2):
+        return [], [], [], [], []
+    
+    if len(p1) * len(p2) <= all_pairs_limit:
+        i = np.repeat(np.arange(len(p1)), len(p2))
+        j = np.tile(np.arange(len(p2)), len(p1))
+    else:
+        i, j = grid_pairs(p1, q1, p2, q2, threshold)
+    
+    s, t, dist = closest_between_segments(p1[i], q1[i], p2[j], q2[j])
+    
+    #a crossing at a vert belongs to the edge starting there,
+    #except at the very end of an open path
+    hit = dist < threshold
+    hit &= (s < 1) | ((i == len(p1) - 1) & (not cyclic1 or len(p1) < 3))
+    hit &= (t < 1) | ((j == len(p2) - 1) & (not cyclic2 or len(p2) < 3))
+    i, j, s, t = i[hit], j[hit], s[hit], t[hit]
+    
+    order = np.lexsort((s, i))
+    i, j, s, t = i[order], j[order], s[order], t[order]
+    points = .5 * ((p1[i] + s[:,None] * (q1[i] - p1[i])) + (p2[j] + t[:,None] * (q2[j] - p2[j])))
+    
+    intersections = [Vector(v) for v in points]
+    return intersections, i.tolist(), j.tolist(), s.tolist(), t.tolist()
                         
 def  fit_path_to_endpoints(path,v0,v1):
     '''
@@ -2212,7 +2890,7 @@ def cross_section_2_seeds(bme, mx, point, normal, pt_a, seed_index_a, pt_b, seed
 def cross_section_seed_ver0(bme, mx, 
                        point, normal, 
                        seed_index, 
-                       max_tests = 10000, debug = True):
+                       max_tests = 10000, debug = True, bvh = None):
     '''
     Takes a mesh and associated world matrix of the object and returns a cross secion in local
     space.
@@ -2226,6 +2904,7 @@ def cross_section_seed_ver0(bme, mx,
         self_stop: a normal vector which defines a plane to stop cutting
         direction: Vector which the cut should start traveling.
         exclude_edges: list of edge indices (usually already tested from previous iterations)
+        bvh:  TriangleBVH of bme, the ngon fallback only looks at faces the plane crosses
     '''
     
     times = []
@@ -2253,8 +2932,9 @@ def cross_section_seed_ver0(bme, mx,
     
         #perhaps this should be done before we pass bme to this op?
         #we may perhaps need to re raycast the new faces?    
+        #only ngons the plane crosses can be walked through
         ngons = []
-        for f in bme.faces:
+        for f in plane_band_faces(bme, pt, no, bvh):
             if len(f.verts) >  4:
                 ngons.append(f)
         
@@ -2432,11 +3112,12 @@ def find_distant_bmedge_crossing_plane(pt, no, edges, epsilon, eind_from, co_fro
         if d > d_max: d_max,edge_max,i_max = d,edge,i
     return (edge_max,i_max)
 
-def cross_section_walker(bme, pt, no, find_from, eind_from, co_from, epsilon):
+def cross_section_walker(bme, pt, no, find_from, eind_from, co_from, epsilon, faces = None):
     '''
     returns tuple (verts,looped) by walking around a bmesh near the given plane
     verts is list of verts as the intersections of edges and cutting plane (in order)
     looped is bool indicating if walk wrapped around bmesh
+    faces: optional list, the index of every face walked through is appended
     '''
 
     # returned values
@@ -2454,6 +3135,7 @@ def cross_section_walker(bme, pt, no, find_from, eind_from, co_from, epsilon):
 
     f_cur = next(f for f in bme.edges[eind_from].link_faces if f.index != find_from)
     find_current = f_cur.index
+    if faces is not None: faces.append(find_current)
     
     while True:
         # find farthest point
@@ -2476,6 +3158,7 @@ def cross_section_walker(bme, pt, no, find_from, eind_from, co_from, epsilon):
         
         # leave breadcrumb
         finds_dict[find_next] = len(finds_dict)
+        if faces is not None: faces.append(find_next)
         
         find_from = find_current
         eind_from = eind_next
@@ -2489,7 +3172,11 @@ def cross_section_walker(bme, pt, no, find_from, eind_from, co_from, epsilon):
 def cross_section_seed_ver1(bme, mx, 
                        point, normal, 
                        seed_index, 
-                       max_tests = 10000, debug = True):
+                       max_tests = 10000, debug = True, faces = None):
+    '''
+    faces: optional list to collect the indices of the faces the
+    cross section passes through (used to warm start the next cut)
+    '''
     
     # data to be returned
     verts,edges = [],[]
@@ -2540,8 +3227,10 @@ def cross_section_seed_ver1(bme, mx,
             d = (ei0[1] - ei1[1]).length
             if d > d_max: d_max,ei0_max,ei1_max = d,ei0,ei1
     
+    if faces is not None: faces.append(seed_index)
+    
     # start walking one way around bmesh
-    verts0,looped = cross_section_walker(bme, pt, no, seed_index, ei0_max[0].index, ei0_max[1], epsilon)
+    verts0,looped = cross_section_walker(bme, pt, no, seed_index, ei0_max[0].index, ei0_max[1], epsilon, faces)
     
     if looped:
         # looped around on self, so we're done!
@@ -2552,7 +3241,7 @@ def cross_section_seed_ver1(bme, mx,
         return (verts, edges)
     
     # did not loop around, so start walking the other way
-    verts1,looped = cross_section_walker(bme, pt, no, seed_index, ei1_max[0].index, ei1_max[1], epsilon)
+    verts1,looped = cross_section_walker(bme, pt, no, seed_index, ei1_max[0].index, ei1_max[1], epsilon, faces)
     
     if looped:
         # looped around on self!?
@@ -2575,7 +3264,7 @@ def cross_section_seed_ver1(bme, mx,
 def cross_section_seed(bme, mx, 
                        point, normal, 
                        seed_index, 
-                       max_tests = 10000, debug = True, method = False):
+                       max_tests = 10000, debug = True, method = False, faces = None, bvh = None):
     '''
     Takes a mesh and associated world matrix of the object and returns a cross secion in local
     space.
@@ -2589,15 +3278,17 @@ def cross_section_seed(bme, mx,
         self_stop: a normal vector which defines a plane to stop cutting
         direction: Vector which the cut should start traveling.
         exclude_edges: list of edge indices (usually already tested from previous iterations)
+        faces: optional list, collects the faces crossed (new method only)
+        bvh:  TriangleBVH of bme, if there is one (old method only)
     '''
     
     start = time.time()
     
     if not method:
-        ret = cross_section_seed_ver0(bme, mx, point, normal, seed_index, max_tests, debug)
+        ret = cross_section_seed_ver0(bme, mx, point, normal, seed_index, max_tests, debug, bvh)
 
     else:
-        ret = cross_section_seed_ver1(bme, mx, point, normal, seed_index, max_tests, debug)
+        ret = cross_section_seed_ver1(bme, mx, point, normal, seed_index, max_tests, debug, faces)
     
     calc_time = time.time()
     
@@ -2609,6 +3300,64 @@ def cross_section_seed(bme, mx,
     
     return ret
 
+def find_warm_seed(bme, mx, point, normal, prev_faces, max_rings = 3, epsilon = 0.0000000001):
+    '''
+    Looks for a seed face for a plane that only moved a little, starting
+    from the faces the previous cross section went through and growing
+    outward a few rings of neighbors at a time.  Cost is proportional
+    to the length of the old loop rather than the size of the mesh.
+    
+    args:
+        bme: Blender BMesh
+        mx: world matrix of the object
+        point, normal: the new cut plane, world coords
+        prev_faces: face indices crossed by the old cross section
+        max_rings: how many rings of neighbors to search before giving up
+        
+    return:
+        index of the crossed face closest to point, or None if the
+        plane has moved off of the old loop's neighborhood
+    '''
+    imx = mx.inverted()
+    pt  = imx * point
+    no  = (imx.to_3x3() * normal).normalized()
+    
+    bver = '%03d.%03d.%03d' % (bpy.app.version[0],bpy.app.version[1],bpy.app.version[2])
+    if bver > '002.072.000':
+        bme.faces.ensure_lookup_table();
+    
+    n_faces = len(bme.faces)
+    front = set(i for i in prev_faces if i < n_faces)
+    seen = set(front)
+    
+    for ring in range(max_rings + 1):
+        best, best_d = None, None
+        for find in front:
+            f = bme.faces[find]
+            ld = [no.dot(v.co - pt) for v in f.verts]
+            if all(d > epsilon for d in ld) or all(d < -epsilon for d in ld):
+                continue
+            d = (f.calc_center_median() - pt).length
+            if best_d == None or d < best_d:
+                best, best_d = find, d
+        
+        if best != None:
+            return best
+        
+        # grow the search by one ring of neighbors
+        grow = set()
+        for find in front:
+            for ed in bme.faces[find].edges:
+                for f in ed.link_faces:
+                    if f.index not in seen:
+                        grow.add(f.index)
+        if not grow:
+            break
+        seen |= grow
+        front = grow
+        
+    return None
+
 def cross_section_seed_direction(bme, mx, 
                                  point, normal, 
                                  seed_index, direction, 